@@ -17,6 +17,116 @@ def execute_rag_query(query, **kwargs):
     pipeline.build_pipeline()
     return pipeline.run()
 
+def execute_rag_queries(queries, batch_size=None, **kwargs):
+    """
+    Answers a list of queries, embedding and retrieving them in batches of batch_size queries (defaults to the
+    query_batch_size setting). The responses are returned in the order of the input queries.
+    """
+    from pragmatic.pipelines.engine import RagQueryEngine
+
+    settings = produce_custom_settings(kwargs)
+    with RagQueryEngine(settings) as engine:
+        return engine.run_batch(queries, batch_size=batch_size)
+
+def create_rag_query_engine(**kwargs):
+    """
+    Creates a warm, reusable and thread-safe RAG query engine. Unlike execute_rag_query, which builds a new pipeline
+    for each query, the engine loads its models and connects to the document store only once. Call its close method
+    (or use it as a context manager) to release its worker threads.
+    """
+    from pragmatic.pipelines.engine import RagQueryEngine
+
+    settings = produce_custom_settings(kwargs)
+    engine = RagQueryEngine(settings)
+    engine.warm_up()
+    return engine
+
+def measure_embedding_recall_drift(queries, documents, top_k=10, **kwargs):
+    """
+    Measures how well the configured embedding_backend and embedding_model_precision preserve the nearest neighbors
+    found with the float32 PyTorch version of the embedding model. The documents can be given as strings or Documents.
+    Returns the recall@top_k relative to the baseline and the mean similarity of the two embeddings of each document.
+    """
+    from haystack import Document
+    from pragmatic.haystack.embedders import SentenceTransformersChunkEmbedder, SentenceTransformersQueryEmbedder, \
+        produce_embedding_backend_args
+    from pragmatic.optimizations.embedding_profile import measure_recall_drift
+
+    settings = produce_custom_settings(kwargs)
+    baseline_settings = dict(settings, embedding_backend="torch", embedding_model_precision="float32")
+    documents = [doc if isinstance(doc, Document) else Document(content=doc) for doc in documents]
+
+    embedder_pairs = []
+    for current_settings in [baseline_settings, settings]:
+        query_embedder = SentenceTransformersQueryEmbedder(
+            model=settings["embedding_model_path"], progress_bar=False,
+            **produce_embedding_backend_args(current_settings, current_settings["query_embedding_batch_size"]))
+        chunk_embedder = SentenceTransformersChunkEmbedder(
+            model=settings["embedding_model_path"], progress_bar=False,
+            **produce_embedding_backend_args(current_settings, current_settings["indexing_embedding_batch_size"]))
+        query_embedder.warm_up()
+        chunk_embedder.warm_up()
+        embedder_pairs.append((query_embedder, chunk_embedder))
+    return measure_recall_drift(embedder_pairs[0], embedder_pairs[1], queries, documents, top_k=top_k)
+
+def measure_embedding_dimension_recall(queries, documents, dimensions, relevant_document_indices=None, top_k=10,
+                                       **kwargs):
+    """
+    Measures how well the embeddings of the configured (Matryoshka) embedding model truncated to each of the given
+    dimensions preserve the top_k documents of the queries found with the full embeddings. If the index of the relevant
+    document of every query is given, the recall@top_k of each dimension is reported as well.
+    """
+    from dataclasses import replace
+    from haystack import Document
+    from pragmatic.haystack.embedders import SentenceTransformersChunkEmbedder, SentenceTransformersQueryEmbedder, \
+        produce_embedding_backend_args
+    from pragmatic.optimizations.matryoshka import measure_recall_by_dimension
+
+    settings = produce_custom_settings(kwargs)
+    query_embedder = SentenceTransformersQueryEmbedder(
+        model=settings["embedding_model_path"], progress_bar=False,
+        **produce_embedding_backend_args(settings, settings["query_embedding_batch_size"]))
+    chunk_embedder = SentenceTransformersChunkEmbedder(
+        model=settings["embedding_model_path"], progress_bar=False,
+        **produce_embedding_backend_args(settings, settings["indexing_embedding_batch_size"]))
+    query_embedder.warm_up()
+    chunk_embedder.warm_up()
+    # the embeddings are computed in full and truncated afterwards
+    query_embeddings = query_embedder.run_batch(list(queries))["embeddings"]
+    embedded_documents = chunk_embedder.run(
+        [Document(content=doc) if isinstance(doc, str) else replace(doc, embedding=None) for doc in documents])
+    return measure_recall_by_dimension(query_embeddings, [doc.embedding for doc in embedded_documents["documents"]],
+                                       dimensions, relevant_document_indices=relevant_document_indices, top_k=top_k)
+
+def run_benchmark(**kwargs):
+    """
+    Benchmarks the indexing and the query stages of the pipelines defined by the given settings on a synthetic corpus
+    (or the one at bench_corpus_path), using Milvus Lite and a local stub LLM. Returns a JSON-serializable report.
+    """
+    from pragmatic.pipelines.benchmark import Benchmark
+
+    settings = produce_custom_settings(kwargs)
+    return Benchmark(settings).run()
+
+def create_rag_server_app(**kwargs):
+    """
+    Creates an ASGI application serving the query, batch query and indexing endpoints over warm pipelines, which can
+    be run by any ASGI server (e.g., uvicorn).
+    """
+    from pragmatic.pipelines.server import RagServer
+
+    settings = produce_custom_settings(kwargs)
+    return RagServer(settings)
+
+def serve_rag_api(**kwargs):
+    """
+    Serves the RAG API on server_host:server_port via uvicorn until interrupted.
+    """
+    from pragmatic.pipelines.server import serve
+
+    settings = produce_custom_settings(kwargs)
+    serve(settings)
+
 def evaluate_rag_pipeline(**kwargs):
     from pragmatic.pipelines.evaluation import Evaluator
 
@@ -27,5 +137,12 @@ def evaluate_rag_pipeline(**kwargs):
 
 __all__ = ["index_path_for_rag",
            "execute_rag_query",
+           "execute_rag_queries",
+           "create_rag_query_engine",
+           "measure_embedding_recall_drift",
+           "measure_embedding_dimension_recall",
+           "run_benchmark",
+           "create_rag_server_app",
+           "serve_rag_api",
            # "evaluate_rag_pipeline"
            ]
@@ -0,0 +1,124 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from haystack import component
+from haystack.components.generators import OpenAIGenerator
+from haystack.dataclasses import StreamingChunk
+from openai import AsyncOpenAI
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class AsyncOpenAIGenerator(OpenAIGenerator):
+    """
+    An OpenAIGenerator that can additionally be invoked from an asyncio event loop without blocking it. The synchronous
+    run method can be used in a regular Haystack pipeline. Unlike in the base class, a streamed reply is aborted as soon
+    as the streaming callback raises an exception (e.g., because the consumer of the stream went away): the HTTP stream
+    is closed, so that the LLM server stops generating. The streamed chunks and replies are built with the public
+    Haystack dataclasses only, so that the component does not depend on the internals of OpenAIGenerator.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # the component decorator re-creates the class, hence the explicit base class initialization
+        OpenAIGenerator.__init__(self, *args, **kwargs)
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key.resolve_value(),
+            organization=self.organization,
+            base_url=self.api_base_url,
+            timeout=self.client.timeout,
+            max_retries=self.client.max_retries,
+        )
+
+    def _produce_messages(self, prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        actual_system_prompt = system_prompt if system_prompt is not None else self.system_prompt
+        messages = [{"role": "system", "content": actual_system_prompt}] if actual_system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(self, prompt: str, system_prompt: Optional[str] = None,
+            streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+            generation_kwargs: Optional[Dict[str, Any]] = None):
+        streaming_callback = streaming_callback or self.streaming_callback
+        if streaming_callback is None:
+            return OpenAIGenerator.run(self, prompt=prompt, system_prompt=system_prompt,
+                                       generation_kwargs=generation_kwargs)
+
+        actual_generation_kwargs = {**self.generation_kwargs, **(generation_kwargs or {})}
+        if actual_generation_kwargs.get("n") is not None and actual_generation_kwargs["n"] > 1:
+            raise ValueError("Cannot stream multiple responses, please set n=1.")
+
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._produce_messages(prompt, system_prompt),
+            stream=True,
+            **actual_generation_kwargs,
+        )
+        chunks = []
+        meta = {"model": self.model, "index": 0, "finish_reason": None, "usage": {}}
+        try:
+            for completion_chunk in stream:
+                meta["model"] = completion_chunk.model
+                if completion_chunk.usage:
+                    meta["usage"] = dict(completion_chunk.usage)
+                if not completion_chunk.choices:
+                    continue
+                choice = completion_chunk.choices[0]
+                meta["index"] = choice.index
+                meta["finish_reason"] = choice.finish_reason or meta["finish_reason"]
+                chunk = StreamingChunk(content=choice.delta.content or "",
+                                       meta={"model": completion_chunk.model, "index": choice.index,
+                                             "finish_reason": choice.finish_reason})
+                chunks.append(chunk)
+                streaming_callback(chunk)
+        finally:
+            stream.close()
+
+        if not chunks:
+            raise ValueError("The LLM returned an empty stream.")
+        if meta["finish_reason"] in ["length", "content_filter"]:
+            logger.warning(f"The streamed reply was truncated due to finish_reason={meta['finish_reason']}")
+        return {"replies": ["".join(chunk.content for chunk in chunks)], "meta": [meta]}
+
+    async def generate_async(self, prompt: str, system_prompt: Optional[str] = None,
+                             generation_kwargs: Optional[Dict[str, Any]] = None):
+        """
+        Asynchronously generates the replies to the given prompt. The output format is identical to that of run.
+        """
+        completion = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._produce_messages(prompt, system_prompt),
+            stream=False,
+            **{**self.generation_kwargs, **(generation_kwargs or {})},
+        )
+        replies = [choice.message.content for choice in completion.choices]
+        meta = [{"model": completion.model,
+                 "index": choice.index,
+                 "finish_reason": choice.finish_reason,
+                 "usage": dict(completion.usage or {})} for choice in completion.choices]
+        return {"replies": replies, "meta": meta}
+
+    async def stream_async(self, prompt: str, system_prompt: Optional[str] = None,
+                           generation_kwargs: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Asynchronously generates a single reply to the given prompt, yielding the reply chunks as they arrive.
+        Closing the iterator early closes the underlying HTTP stream.
+        """
+        actual_generation_kwargs = {**self.generation_kwargs, **(generation_kwargs or {})}
+        if actual_generation_kwargs.get("n") is not None and actual_generation_kwargs["n"] > 1:
+            raise ValueError("Cannot stream multiple responses, please set n=1.")
+
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._produce_messages(prompt, system_prompt),
+            stream=True,
+            **actual_generation_kwargs,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
@@ -0,0 +1,93 @@
+from queue import Queue
+from threading import Thread
+from typing import List
+
+from haystack import Document, component
+from haystack.document_stores.types import DuplicatePolicy
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class BackgroundDocumentWriter:
+    """
+    A DocumentWriter that writes the documents from a background thread, so that the pipeline can already process
+    the next batch of documents while the current one is being inserted into the document store.
+
+    At most max_pending_batches batches wait for being written. When this limit is reached, the pipeline is blocked
+    until the background thread catches up, which bounds the memory consumption of the indexing process.
+    Deletions submitted via delete_documents and callables submitted via call_when_written are executed in order
+    with the writes.
+    Call flush to wait until all the submitted operations are completed.
+    """
+
+    def __init__(self, document_store, max_pending_batches: int = 1, policy: DuplicatePolicy = DuplicatePolicy.NONE):
+        self.document_store = document_store
+        self.policy = policy
+        self._queue = Queue(maxsize=max_pending_batches)
+        self._thread = None
+        self._documents_written = 0
+        self._error = None
+
+    def warm_up(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._process_operations, daemon=True)
+            self._thread.start()
+
+    def _process_operations(self):
+        while True:
+            operation, payload = self._queue.get()
+            try:
+                if operation == "write":
+                    self._documents_written += self.document_store.write_documents(payload, policy=self.policy)
+                elif operation == "delete":
+                    self.document_store.delete_documents(payload)
+                elif operation == "call" and self._error is None:
+                    # the callables depend on the success of the preceding operations
+                    payload()
+            except Exception as e:
+                logger.error(f"Background {operation} operation failed: {e}")
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    @component.output_types(documents_written=int)
+    def run(self, documents: List[Document]):
+        """
+        Submits the documents for writing and returns as soon as there is room in the queue of pending batches.
+        The returned count refers to the documents accepted for writing.
+        """
+        self._raise_pending_error()
+        self.warm_up()
+        if documents:
+            self._queue.put(("write", documents))
+        return {"documents_written": len(documents)}
+
+    def delete_documents(self, document_ids: List[str]):
+        self._raise_pending_error()
+        self.warm_up()
+        self._queue.put(("delete", document_ids))
+
+    def call_when_written(self, callback):
+        """
+        Schedules the given callable to be executed once all the previously submitted operations are completed.
+        """
+        self._raise_pending_error()
+        self.warm_up()
+        self._queue.put(("call", callback))
+
+    def flush(self) -> int:
+        """
+        Waits for all the submitted operations to complete and returns the total number of the written documents.
+        """
+        self._queue.join()
+        self._raise_pending_error()
+        return self._documents_written
@@ -0,0 +1,209 @@
+import json
+import os
+import re
+from collections import Counter
+from threading import Lock
+from typing import List
+
+import numpy as np
+from haystack import Document
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# tokens may contain inner separators, so that CLI flags (--all-namespaces), versions (4.12.1), paths and error codes
+# (ERR_CONN-42) are kept intact; their parts are indexed as separate tokens as well
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+TOKEN_PART_SEPARATOR_PATTERN = re.compile(r"[-./:_]")
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in TOKEN_PART_SEPARATOR_PATTERN.split(token) if part)
+    return tokens
+
+
+class BM25Index(object):
+    """
+    An Okapi BM25 inverted index stored in a compact array-backed format. The postings of all terms are kept in two
+    contiguous arrays (the document indices and the term frequencies) sliced by a per-term offsets array, in the spirit
+    of the CSR sparse matrix format. Scoring a query amounts to a few vectorized updates of a dense score array (one
+    per query term) followed by a top-k selection.
+
+    The index directory contains the following files:
+        postings.<N>.npz    - the offsets, document indices, term frequencies and document lengths
+        vocabulary.<N>.json - the indexed terms, ordered by their term IDs
+        documents.<N>.jsonl - the IDs, contents and metadata of the indexed documents
+        index.json          - the current generation number N, atomically replaced by each save
+
+    Each save writes a new generation of the files, so that the index instances of the running RAG pipelines keep
+    using the previous generation until they detect the change of index.json and reload the index.
+    """
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = Lock()
+        self._loaded_version = None
+        self._generation = 0
+        self._state = None
+        self._reload_if_changed()
+
+    def _get_file_path(self, file_name):
+        return os.path.join(self.path, file_name)
+
+    def _get_stored_version(self):
+        try:
+            header_stat = os.stat(self._get_file_path("index.json"))
+        except FileNotFoundError:
+            return None
+        return header_stat.st_ino, header_stat.st_mtime_ns
+
+    def exists(self):
+        return self._get_stored_version() is not None
+
+    def _reload_if_changed(self):
+        version = self._get_stored_version()
+        if version == self._loaded_version:
+            return
+
+        with self._lock:
+            if version is None:
+                self._state, self._generation, self._loaded_version = None, 0, None
+                return
+
+            with open(self._get_file_path("index.json")) as header_file:
+                generation = json.load(header_file)["generation"]
+            with np.load(self._get_file_path(f"postings.{generation}.npz")) as postings:
+                offsets = postings["offsets"]
+                doc_indices = postings["doc_indices"]
+                term_freqs = postings["term_freqs"].astype(np.float32)
+                doc_lengths = postings["doc_lengths"].astype(np.float32)
+            with open(self._get_file_path(f"vocabulary.{generation}.json")) as vocabulary_file:
+                vocabulary = json.load(vocabulary_file)
+            with open(self._get_file_path(f"documents.{generation}.jsonl")) as documents_file:
+                documents = [json.loads(line) for line in documents_file]
+
+            # the BM25 term weights only depend on the term frequencies and the document lengths, so they are
+            # precomputed for all postings once
+            num_documents = len(documents)
+            average_doc_length = float(doc_lengths.mean()) if num_documents > 0 else 0.0
+            length_norms = self.k1 * (1 - self.b + self.b * doc_lengths / max(average_doc_length, 1e-9))
+            weights = term_freqs * (self.k1 + 1) / (term_freqs + length_norms[doc_indices])
+            doc_freqs = np.diff(offsets).astype(np.float32)
+            idf = np.log1p((num_documents - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+            self._state = {
+                "term_ids": {term: term_id for term_id, term in enumerate(vocabulary)},
+                "offsets": offsets,
+                "doc_indices": doc_indices,
+                "weights": weights.astype(np.float32),
+                "idf": idf.astype(np.float32),
+                "documents": documents,
+            }
+            self._generation = generation
+            self._loaded_version = version
+            logger.debug(f"Loaded a BM25 index of {num_documents} documents from {self.path}")
+
+    def get_documents(self):
+        """
+        Returns the records (IDs, contents and metadata) of all the indexed documents.
+        """
+        self._reload_if_changed()
+        return list(self._state["documents"]) if self._state is not None else []
+
+    def count_documents(self):
+        self._reload_if_changed()
+        return len(self._state["documents"]) if self._state is not None else 0
+
+    def save(self, records):
+        """
+        Builds the index of the given document records (dicts with the id, content and meta keys) and stores it as
+        a new generation of the index files.
+        """
+        vocabulary = {}
+        postings = []  # (term ID, document index, term frequency) triples
+        doc_lengths = np.zeros(len(records), dtype=np.int32)
+        for doc_index, record in enumerate(records):
+            tokens = tokenize(record["content"] or "")
+            doc_lengths[doc_index] = len(tokens)
+            for token, frequency in Counter(tokens).items():
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                postings.append((term_id, doc_index, frequency))
+
+        postings_array = np.asarray(postings, dtype=np.int64).reshape(-1, 3)
+        postings_array = postings_array[np.lexsort((postings_array[:, 1], postings_array[:, 0]))]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(postings_array[:, 0], minlength=len(vocabulary)), out=offsets[1:])
+
+        os.makedirs(self.path, exist_ok=True)
+        previous_generation = self._read_generation()
+        generation = previous_generation + 1
+        np.savez(self._get_file_path(f"postings.{generation}.npz"),
+                 offsets=offsets,
+                 doc_indices=postings_array[:, 1].astype(np.int32),
+                 term_freqs=postings_array[:, 2].astype(np.int32),
+                 doc_lengths=doc_lengths)
+        with open(self._get_file_path(f"vocabulary.{generation}.json"), "w") as vocabulary_file:
+            json.dump(list(vocabulary), vocabulary_file)
+        with open(self._get_file_path(f"documents.{generation}.jsonl"), "w") as documents_file:
+            for record in records:
+                documents_file.write(json.dumps(record, default=str) + "\n")
+
+        tmp_path = self._get_file_path("index.json.tmp")
+        with open(tmp_path, "w") as header_file:
+            json.dump({"generation": generation, "num_documents": len(records)}, header_file)
+        os.replace(tmp_path, self._get_file_path("index.json"))
+
+        if previous_generation > 0:
+            for file_name in [f"postings.{previous_generation}.npz", f"vocabulary.{previous_generation}.json",
+                              f"documents.{previous_generation}.jsonl"]:
+                os.remove(self._get_file_path(file_name))
+        logger.info(f"Saved a BM25 index of {len(records)} documents and {len(vocabulary)} terms to {self.path}")
+
+    def _read_generation(self):
+        try:
+            with open(self._get_file_path("index.json")) as header_file:
+                return json.load(header_file)["generation"]
+        except FileNotFoundError:
+            return 0
+
+    def search(self, queries: List[str], top_k: int) -> List[List[Document]]:
+        """
+        Returns the top_k documents with the highest BM25 scores for each of the queries. Only the documents sharing
+        at least one term with the query are returned.
+        """
+        self._reload_if_changed()
+        state = self._state
+        if state is None or not state["documents"]:
+            return [[] for _ in queries]
+
+        results = []
+        for query in queries:
+            term_ids = {state["term_ids"][token] for token in tokenize(query) if token in state["term_ids"]}
+            scores = np.zeros(len(state["documents"]), dtype=np.float32)
+            for term_id in term_ids:
+                start, end = state["offsets"][term_id], state["offsets"][term_id + 1]
+                # a document occurs at most once in the postings of a term, so the fancy-indexed update is safe
+                scores[state["doc_indices"][start:end]] += state["idf"][term_id] * state["weights"][start:end]
+
+            matching_count = int(np.count_nonzero(scores))
+            actual_top_k = min(top_k, matching_count)
+            if actual_top_k == 0:
+                results.append([])
+                continue
+            top_indices = np.argpartition(-scores, actual_top_k - 1)[:actual_top_k]
+            top_indices = top_indices[np.argsort(-scores[top_indices])]
+            results.append([self._produce_document(state["documents"][doc_index], float(scores[doc_index]))
+                            for doc_index in top_indices.tolist()])
+        return results
+
+    @staticmethod
+    def _produce_document(record, score):
+        return Document(id=record["id"], content=record["content"], meta=dict(record["meta"]), score=score)
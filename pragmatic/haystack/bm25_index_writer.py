@@ -0,0 +1,55 @@
+from typing import List
+
+from haystack import Document, component
+
+from pragmatic.haystack.bm25_index import BM25Index
+
+
+@component
+class BM25IndexWriter:
+    """
+    Maintains the BM25 index of the chunks written to the dense collection. The chunks passed to run and the
+    deletions are applied to an in-memory copy of the indexed documents, and the index is rebuilt and stored once
+    flush is called at the end of the indexing run.
+    """
+
+    def __init__(self, index_path: str, drop_old: bool = False):
+        self.index_path = index_path
+        self.drop_old = drop_old
+        self._records = None
+        self._is_modified = False
+
+    def warm_up(self):
+        if self._records is not None:
+            return
+        index = BM25Index(self.index_path)
+        if self.drop_old:
+            self._records = {}
+            # the index of the dropped collection has to be cleared even if no documents are written
+            self._is_modified = index.exists()
+        else:
+            self._records = {record["id"]: record for record in index.get_documents()}
+
+    @component.output_types(documents_indexed=int)
+    def run(self, documents: List[Document]):
+        self.warm_up()
+        for doc in documents:
+            self._records[doc.id] = {"id": doc.id, "content": doc.content, "meta": doc.meta}
+        self._is_modified = self._is_modified or bool(documents)
+        return {"documents_indexed": len(documents)}
+
+    def delete_documents(self, document_ids: List[str]):
+        self.warm_up()
+        for document_id in document_ids:
+            if self._records.pop(document_id, None) is not None:
+                self._is_modified = True
+
+    def flush(self) -> int:
+        """
+        Stores the index if it was modified and returns the number of the indexed documents.
+        """
+        self.warm_up()
+        if self._is_modified:
+            BM25Index(self.index_path).save(list(self._records.values()))
+            self._is_modified = False
+        return len(self._records)
@@ -0,0 +1,24 @@
+from typing import Dict, List, Optional
+
+from haystack import Document, component
+
+from pragmatic.haystack.bm25_index import BM25Index
+
+
+@component
+class BM25IndexRetriever:
+    """
+    Retrieves the documents with the highest BM25 scores from a BM25Index. The top_k can be overridden on a per-run
+    basis, and multiple queries can be scored at once via run_batch.
+    """
+
+    def __init__(self, index: BM25Index, top_k: int = 10):
+        self.index = index
+        self.top_k = top_k
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, top_k: Optional[int] = None) -> Dict[str, List[Document]]:
+        return {"documents": self.index.search([query], top_k if top_k is not None else self.top_k)[0]}
+
+    def run_batch(self, queries: List[str], top_k: Optional[int] = None) -> Dict[str, List[List[Document]]]:
+        return {"documents": self.index.search(queries, top_k if top_k is not None else self.top_k)}
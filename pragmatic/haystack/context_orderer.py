@@ -0,0 +1,46 @@
+import math
+from typing import List
+
+from haystack import Document, component
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_ORDERS = ["id", "score_bucket"]
+
+
+@component
+class ContextOrderer:
+    """
+    Places the documents of the prompt in a deterministic order, so that the prompts of the queries retrieving the same
+    or overlapping documents share a long common prefix, which the prefix cache of the LLM server (e.g., the automatic
+    prefix caching of vLLM) can reuse instead of recomputing.
+
+    With order "id", the documents are sorted by their ids. With order "score_bucket", they are sorted from the
+    highest to the lowest bucket of score_bucket_size-wide score ranges and by their ids within a bucket, which keeps
+    the most relevant documents first while ignoring the small score differences between the queries. The documents
+    without a score share the lowest bucket, so if no document has a score, the order degrades to "id" (which is logged
+    as a warning).
+    """
+
+    def __init__(self, order: str = "id", score_bucket_size: float = 0.1):
+        if order not in CONTEXT_ORDERS:
+            raise ValueError(f"Unsupported context order: {order}")
+        if order == "score_bucket" and score_bucket_size <= 0:
+            raise ValueError("The score bucket size must be positive")
+        self.order = order
+        self.score_bucket_size = score_bucket_size
+
+    def _produce_sort_key(self, document):
+        if self.order == "id":
+            return document.id
+        # documents without a score share the lowest bucket
+        bucket = math.floor(document.score / self.score_bucket_size) if document.score is not None else -math.inf
+        return -bucket, document.id
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if self.order == "score_bucket" and documents and all(doc.score is None for doc in documents):
+            logger.warning("None of the documents has a score, the score_bucket order falls back to the id order")
+        return {"documents": sorted(documents, key=self._produce_sort_key)}
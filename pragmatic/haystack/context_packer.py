@@ -0,0 +1,158 @@
+import hashlib
+import math
+import re
+from dataclasses import replace
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from haystack import Document, component
+
+from pragmatic.optimizations.embedding_cache import normalize_text
+from pragmatic.optimizations.tokenizers import get_shared_tokenizer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the average number of characters per token assumed when the tokenizer of the LLM is not available
+APPROXIMATE_CHARS_PER_TOKEN = 4
+SHINGLE_SIZE = 3
+
+
+def _produce_shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _compute_jaccard_similarity(first_shingles, second_shingles):
+    if not first_shingles or not second_shingles:
+        return 0.0
+    return len(first_shingles & second_shingles) / len(first_shingles | second_shingles)
+
+
+@component
+class ContextPacker:
+    """
+    Fits the documents placed in the prompt into a token budget counted with the tokenizer of the LLM. The documents
+    are considered from the highest to the lowest score: exact duplicates (up to whitespace and case) and near
+    duplicates (whose word 3-gram Jaccard similarity with an already packed document reaches
+    near_duplicate_threshold) are dropped, and the remaining ones are packed as long as they fit. A document exceeding
+    the remaining budget is truncated if at least min_passage_tokens tokens of it fit, and skipped otherwise.
+
+    The packed documents keep their input order. The report output lists the numbers of the removed documents and the
+    tokens saved by the packing of the current request, and get_stats accumulates them over all the requests.
+    """
+
+    def __init__(self, tokenizer: str, max_tokens: int = 2048, near_duplicate_threshold: Optional[float] = 0.8,
+                 min_passage_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.min_passage_tokens = min_passage_tokens
+
+        self._tokenizer = None
+        self._warm_up_lock = Lock()
+        self._stats_lock = Lock()
+        self._stats = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0, "duplicates_removed": 0}
+
+    def warm_up(self):
+        with self._warm_up_lock:
+            if self._tokenizer is not None:
+                return
+            try:
+                self._tokenizer = get_shared_tokenizer(self.tokenizer)
+            except Exception as e:
+                # e.g., the LLM is served under a name that does not identify a Hugging Face model
+                logger.warning(f"Failed to load the tokenizer of {self.tokenizer}, the tokens will be approximated "
+                               f"as {APPROXIMATE_CHARS_PER_TOKEN} characters each: {e}")
+                self._tokenizer = False
+
+    def _count_tokens(self, texts):
+        if not self._tokenizer:
+            return [math.ceil(len(text) / APPROXIMATE_CHARS_PER_TOKEN) for text in texts]
+        return [len(input_ids) for input_ids in self._tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _truncate(self, text, num_tokens):
+        """
+        Returns the prefix of the given text consisting of its first num_tokens tokens.
+        """
+        if not self._tokenizer:
+            return text[:num_tokens * APPROXIMATE_CHARS_PER_TOKEN]
+        if self._tokenizer.is_fast:
+            offsets = self._tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            return text[:offsets[num_tokens - 1][1]]
+        input_ids = self._tokenizer(text, add_special_tokens=False)["input_ids"]
+        return self._tokenizer.decode(input_ids[:num_tokens])
+
+    def _remove_duplicates(self, documents, order):
+        """
+        Returns the indices of the documents to pack, from the highest to the lowest score.
+        """
+        unique_indices = []
+        seen_hashes = set()
+        packed_shingles = []
+        for i in order:
+            content_hash = hashlib.sha256(normalize_text(documents[i].content or "").lower().encode()).digest()
+            if content_hash in seen_hashes:
+                continue
+            seen_hashes.add(content_hash)
+            if self.near_duplicate_threshold is not None:
+                shingles = _produce_shingles(documents[i].content or "")
+                if any(_compute_jaccard_similarity(shingles, other_shingles) >= self.near_duplicate_threshold
+                       for other_shingles in packed_shingles):
+                    continue
+                packed_shingles.append(shingles)
+            unique_indices.append(i)
+        return unique_indices
+
+    @component.output_types(documents=List[Document], report=Dict[str, Any])
+    def run(self, documents: List[Document], max_tokens: Optional[int] = None):
+        self.warm_up()
+        budget = max_tokens if max_tokens is not None else self.max_tokens
+
+        # without scores, the documents are assumed to be ranked already
+        order = list(range(len(documents)))
+        if all(doc.score is not None for doc in documents):
+            order.sort(key=lambda i: documents[i].score, reverse=True)
+        token_counts = self._count_tokens([doc.content or "" for doc in documents])
+        unique_indices = self._remove_duplicates(documents, order)
+
+        packed_documents = {}
+        remaining_tokens = budget
+        num_truncated = 0
+        for i in unique_indices:
+            if token_counts[i] <= remaining_tokens:
+                packed_documents[i] = documents[i]
+                remaining_tokens -= token_counts[i]
+            elif remaining_tokens >= self.min_passage_tokens:
+                truncated_content = self._truncate(documents[i].content, remaining_tokens)
+                packed_documents[i] = replace(documents[i], content=truncated_content,
+                                              meta={**documents[i].meta, "truncated": True})
+                remaining_tokens = 0
+                num_truncated += 1
+
+        tokens_in = sum(token_counts)
+        tokens_out = budget - remaining_tokens
+        report = {
+            "documents_in": len(documents),
+            "documents_out": len(packed_documents),
+            "duplicates_removed": len(documents) - len(unique_indices),
+            "documents_truncated": num_truncated,
+            "documents_dropped": len(unique_indices) - len(packed_documents),
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": tokens_in - tokens_out,
+        }
+        logger.debug(f"Context packing report: {report}")
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            for key in ["tokens_in", "tokens_out", "tokens_saved", "duplicates_removed"]:
+                self._stats[key] += report[key]
+
+        return {"documents": [packed_documents[i] for i in sorted(packed_documents)], "report": report}
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
@@ -1,4 +1,5 @@
-from typing import Any, Dict, List
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
 
 from docling_core.types import DoclingDocument
 
@@ -7,20 +8,41 @@ from haystack.core.serialization import default_from_dict, default_to_dict
 
 from docling.chunking import HybridChunker
 
+from pragmatic.optimizations.chunk_cache import ChunkCache, compute_chunk_cache_key
+from pragmatic.optimizations.tokenizers import get_shared_tokenizer
+
 
 @component
 class DoclingDocumentSplitter:
+    """
+    Splits converted Docling documents with the HybridChunker of Docling.
+
+    If cache_path is set, the chunks of each document are cached on disk under the hash of its content, the tokenizer
+    and max_tokens, so that an unchanged document is neither parsed nor chunked again. The chunker (and the tokenizer,
+    which is shared with the other components using the same model) is only loaded once a document misses the cache.
+    """
 
     SUPPORTED_CONTENT_FORMATS = ['json']
 
-    def __init__(self, embedding_model_id=None, content_format=None, max_tokens=None):
-        self.__chunker = HybridChunker(tokenizer=embedding_model_id, max_tokens=max_tokens)
+    def __init__(self, embedding_model_id=None, content_format=None, max_tokens=None, cache_path: Optional[str] = None):
         self.__embedding_model_id = embedding_model_id
+        self.__max_tokens = max_tokens
+        self.__cache_path = cache_path
+        self.__chunker = None
+        self.__chunker_lock = Lock()
+        self.__cache = ChunkCache(cache_path) if cache_path is not None else None
 
         if content_format not in self.SUPPORTED_CONTENT_FORMATS:
             raise ValueError(f"Only the following input formats are currently supported: {self.SUPPORTED_CONTENT_FORMATS}.")
         self.__content_format = content_format
 
+    def _get_chunker(self):
+        with self.__chunker_lock:
+            if self.__chunker is None:
+                self.__chunker = HybridChunker(tokenizer=get_shared_tokenizer(self.__embedding_model_id),
+                                               max_tokens=self.__max_tokens)
+            return self.__chunker
+
     @component.output_types(documents=List[Document])
     def run(self, documents: List[Document]):
         if not isinstance(documents, list) or (documents and not isinstance(documents[0], Document)):
@@ -31,31 +53,57 @@ class DoclingDocumentSplitter:
             if doc.content is None:
                 raise ValueError(f"Missing content for document ID {doc.id}.")
 
-            chunks = self._split_with_docling(doc.content)
-            current_split_docs = [Document(content=chunk) for chunk in chunks]
-            split_docs.extend(current_split_docs)
+            # the chunks inherit the metadata of the source document (e.g., its file path)
+            split_docs.extend(Document(content=chunk, meta=dict(doc.meta))
+                              for chunk in self.iter_chunks(doc.content))
 
         return {"documents": split_docs}
 
-    def _split_with_docling(self, text: str) -> List[str]:
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """
+        Yields the serialized chunks of the given document one by one, from the cache if possible.
+        """
+        if self.__cache is None:
+            yield from self._split_with_docling(text)
+            return
+
+        cache_key = compute_chunk_cache_key(text, tokenizer=self.__embedding_model_id, max_tokens=self.__max_tokens,
+                                            content_format=self.__content_format)
+        cached_chunks = self.__cache.load(cache_key)
+        if cached_chunks is not None:
+            yield from cached_chunks
+            return
+
+        chunks = []
+        for chunk in self._split_with_docling(text):
+            chunks.append(chunk)
+            yield chunk
+        # only the chunks of a completely split document are cached
+        self.__cache.store(cache_key, chunks)
+
+    def _split_with_docling(self, text: str) -> Iterator[str]:
         if self.__content_format == 'json':
             document = DoclingDocument.model_validate_json(text)
         else:
             raise ValueError(f"Unexpected content format {self.__content_format}")
 
-        chunk_iter = self.__chunker.chunk(dl_doc=document)
-        chunks = list(chunk_iter)
-        return [self.__chunker.serialize(chunk=chunk) for chunk in chunks]
+        chunker = self._get_chunker()
+        for chunk in chunker.chunk(dl_doc=document):
+            yield chunker.serialize(chunk=chunk)
+
+    def get_cache_stats(self):
+        return self.__cache.get_stats() if self.__cache is not None else None
 
     def to_dict(self) -> Dict[str, Any]:
         """
         Serializes the component to a dictionary.
         """
-        return default_to_dict(self, embedding_model_id=self.__embedding_model_id, content_format=self.__content_format)
+        return default_to_dict(self, embedding_model_id=self.__embedding_model_id, content_format=self.__content_format,
+                               max_tokens=self.__max_tokens, cache_path=self.__cache_path)
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "DoclingDocumentSplitter":
         """
         Deserializes the component from a dictionary.
         """
-        return default_from_dict(cls, data)
\ No newline at end of file
+        return default_from_dict(cls, data)
@@ -0,0 +1,274 @@
+import os
+from threading import Lock
+from typing import List, Optional
+
+from haystack import Document, component
+from haystack.components.embedders import SentenceTransformersDocumentEmbedder, SentenceTransformersTextEmbedder
+
+from pragmatic.optimizations.embedding_cache import compute_cache_namespace, get_embedding_cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ["torch", "onnx", "openvino"]
+EMBEDDING_MODEL_PRECISIONS = ["float32", "bfloat16", "int8"]
+
+# the file names used by sentence-transformers for the int8 quantized exports of a model
+ONNX_INT8_FILE_NAME = "onnx/model_qint8_avx512_vnni.onnx"
+OPENVINO_INT8_FILE_NAME = "openvino/openvino_model_qint8_quantized.xml"
+
+
+def _get_local_model_version(model):
+    # a locally stored model (e.g., a fine-tuned one) may be overwritten in place, which must invalidate its cache
+    if not os.path.isdir(model):
+        return None
+    return max((os.path.getmtime(entry.path) for entry in os.scandir(model) if entry.is_file()), default=None)
+
+
+def produce_embedding_backend_args(settings, batch_size):
+    return {"inference_backend": settings["embedding_backend"],
+            "model_precision": settings["embedding_model_precision"],
+            "batch_size": batch_size}
+
+
+def produce_embedding_dimension_args(settings):
+    if settings["embedding_dimension"] is None:
+        return {}
+    # the leading components of a Matryoshka embedding are renormalized to make up a valid embedding on their own
+    return {"truncate_dim": settings["embedding_dimension"], "normalize_embeddings": True}
+
+
+def produce_embedding_cache_args(settings):
+    if not settings["embedding_cache_enabled"]:
+        return {}
+    return {"embedding_cache_path": settings["embedding_cache_path"],
+            "embedding_cache_max_size_mb": settings["embedding_cache_max_size_mb"]}
+
+
+class EmbeddingCacheMixin:
+    """
+    Adds a persistent embedding cache to a SentenceTransformers-based embedder. Only the texts missing from the cache
+    are passed to the model. The cache is partitioned by the model and the parameters affecting the output vectors,
+    so the indexing and the query embedders of the same model share their entries.
+    """
+
+    def _init_embedding_cache(self, embedding_cache_path: Optional[str], embedding_cache_max_size_mb: int):
+        self.embedding_cache_path = embedding_cache_path
+        self.embedding_cache_max_size_mb = embedding_cache_max_size_mb
+        self._embedding_cache = None
+
+    def _warm_up_embedding_cache(self):
+        if self.embedding_cache_path is None or self._embedding_cache is not None:
+            return
+        namespace = compute_cache_namespace(model=self.model,
+                                            model_version=_get_local_model_version(self.model),
+                                            inference_backend=self.inference_backend,
+                                            model_precision=self.model_precision,
+                                            normalize_embeddings=self.normalize_embeddings,
+                                            precision=self.precision,
+                                            truncate_dim=self.truncate_dim)
+        self._embedding_cache = get_embedding_cache(self.embedding_cache_path, namespace,
+                                                    self.embedding_cache_max_size_mb)
+
+    def _embed_texts(self, texts_to_embed: List[str]):
+        if self.embedding_backend is None:
+            raise RuntimeError("The embedding model has not been loaded. Please call warm_up() before running.")
+
+        def embed(texts):
+            return self.embedding_backend.embed(
+                texts,
+                batch_size=self.batch_size,
+                show_progress_bar=self.progress_bar,
+                normalize_embeddings=self.normalize_embeddings,
+                precision=self.precision,
+            )
+
+        if self._embedding_cache is None:
+            return embed(texts_to_embed)
+
+        embeddings = self._embedding_cache.get_many(texts_to_embed)
+        missing_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing_indices:
+            missing_texts = [texts_to_embed[i] for i in missing_indices]
+            new_embeddings = embed(missing_texts)
+            self._embedding_cache.put_many(missing_texts, new_embeddings)
+            for i, embedding in zip(missing_indices, new_embeddings):
+                embeddings[i] = embedding
+        return embeddings
+
+
+def _load_optimized_model(model, device, inference_backend, model_precision, truncate_dim, trust_remote_code):
+    from sentence_transformers import SentenceTransformer
+
+    model_kwargs = {}
+    if model_precision == "int8" and inference_backend == "onnx":
+        if os.path.isdir(model) and not os.path.isfile(os.path.join(model, ONNX_INT8_FILE_NAME)):
+            # the quantized model is exported next to the original one once and reused afterwards
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            logger.info(f"Exporting an int8 quantized ONNX version of {model}")
+            export_dynamic_quantized_onnx_model(SentenceTransformer(model, device=device, backend="onnx"),
+                                                "avx512_vnni", model)
+        model_kwargs["file_name"] = ONNX_INT8_FILE_NAME
+    elif model_precision == "int8" and inference_backend == "openvino":
+        # static quantization requires a calibration dataset, hence the model has to be quantized in advance
+        if os.path.isdir(model) and not os.path.isfile(os.path.join(model, OPENVINO_INT8_FILE_NAME)):
+            raise ValueError(f"No int8 OpenVINO model found at {os.path.join(model, OPENVINO_INT8_FILE_NAME)}, please "
+                             f"create it with sentence_transformers.export_static_quantized_openvino_model")
+        model_kwargs["file_name"] = OPENVINO_INT8_FILE_NAME
+    elif model_precision == "bfloat16":
+        if inference_backend != "torch":
+            raise ValueError(f"The bfloat16 precision is not supported by the {inference_backend} backend")
+        import torch
+        model_kwargs["torch_dtype"] = torch.bfloat16
+
+    model_obj = SentenceTransformer(model, device=device, backend=inference_backend, truncate_dim=truncate_dim,
+                                    trust_remote_code=trust_remote_code, model_kwargs=model_kwargs or None)
+    if model_precision == "int8" and inference_backend == "torch":
+        import torch
+        # the weights of the linear layers are quantized ahead of time and the activations on the fly
+        model_obj = torch.ao.quantization.quantize_dynamic(model_obj, {torch.nn.Linear}, dtype=torch.qint8)
+    return model_obj
+
+
+class OptimizedEmbeddingBackend:
+    """
+    A drop-in replacement of the Haystack SentenceTransformers embedding backend running the model with ONNX Runtime,
+    OpenVINO or int8 / bfloat16 PyTorch.
+    """
+
+    def __init__(self, model, device, inference_backend, model_precision, truncate_dim=None, trust_remote_code=False):
+        self.model = _load_optimized_model(model, device, inference_backend, model_precision, truncate_dim,
+                                           trust_remote_code)
+
+    def embed(self, data: List[str], **kwargs) -> List[List[float]]:
+        return self.model.encode(data, **kwargs).tolist()
+
+
+# the optimized backends are shared by all the embedders of the process, similarly to the Haystack ones
+_optimized_backends = {}
+_optimized_backends_lock = Lock()
+
+
+def get_optimized_embedding_backend(model, device, inference_backend, model_precision, truncate_dim=None,
+                                    trust_remote_code=False):
+    backend_id = (model, device, inference_backend, model_precision, truncate_dim)
+    with _optimized_backends_lock:
+        if backend_id not in _optimized_backends:
+            _optimized_backends[backend_id] = OptimizedEmbeddingBackend(model, device, inference_backend,
+                                                                        model_precision, truncate_dim,
+                                                                        trust_remote_code)
+        return _optimized_backends[backend_id]
+
+
+class InferenceBackendMixin:
+    """
+    Allows running a SentenceTransformers-based embedder with an optimized CPU runtime (ONNX Runtime or OpenVINO)
+    and/or with a reduced model precision instead of plain float32 PyTorch.
+    """
+
+    def _init_inference_backend(self, inference_backend: str, model_precision: str):
+        if inference_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {inference_backend}")
+        if model_precision not in EMBEDDING_MODEL_PRECISIONS:
+            raise ValueError(f"Unsupported embedding model precision: {model_precision}")
+        self.inference_backend = inference_backend
+        self.model_precision = model_precision
+
+    def _uses_optimized_backend(self):
+        return self.inference_backend != "torch" or self.model_precision != "float32"
+
+    def _warm_up_inference_backend(self):
+        # the default backend is created by the warm_up of the base embedder
+        if self.embedding_backend is not None or not self._uses_optimized_backend():
+            return
+        self.embedding_backend = get_optimized_embedding_backend(model=self.model,
+                                                                 device=self.device.to_torch_str(),
+                                                                 inference_backend=self.inference_backend,
+                                                                 model_precision=self.model_precision,
+                                                                 truncate_dim=self.truncate_dim,
+                                                                 trust_remote_code=self.trust_remote_code)
+
+    def produce_embedding_profile(self, probe_texts: List[str]):
+        """
+        Describes the vectors produced by the embedder, including the embeddings of the given probe texts, so that
+        the vectors of another embedder can be verified to be comparable with them.
+        """
+        probe_embeddings = self._embed_texts(probe_texts)
+        return {
+            "model": self.model,
+            "inference_backend": self.inference_backend,
+            "model_precision": self.model_precision,
+            "normalize_embeddings": self.normalize_embeddings,
+            "precision": self.precision,
+            "dimension": len(probe_embeddings[0]),
+            "probe_embeddings": [list(map(float, embedding)) for embedding in probe_embeddings],
+        }
+
+
+@component
+class SentenceTransformersQueryEmbedder(InferenceBackendMixin, EmbeddingCacheMixin, SentenceTransformersTextEmbedder):
+    """
+    A SentenceTransformersTextEmbedder that can additionally embed a list of queries in batched forward passes
+    and optionally reuses the embeddings stored in a persistent embedding cache.
+    """
+
+    def __init__(self, *args, inference_backend: str = "torch", model_precision: str = "float32",
+                 embedding_cache_path: Optional[str] = None, embedding_cache_max_size_mb: int = 1024, **kwargs):
+        # the base initializer is called explicitly since the component decorator replaces the class
+        SentenceTransformersTextEmbedder.__init__(self, *args, **kwargs)
+        self._init_inference_backend(inference_backend, model_precision)
+        self._init_embedding_cache(embedding_cache_path, embedding_cache_max_size_mb)
+
+    def warm_up(self):
+        self._warm_up_inference_backend()
+        SentenceTransformersTextEmbedder.warm_up(self)
+        self._warm_up_embedding_cache()
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        if not isinstance(text, str):
+            raise TypeError("SentenceTransformersQueryEmbedder expects a string as input.")
+        return {"embedding": self._embed_texts([self.prefix + text + self.suffix])[0]}
+
+    def run_batch(self, texts: List[str]):
+        """
+        Embeds a list of query strings. The returned embeddings follow the order of the input texts.
+        """
+        if not isinstance(texts, list) or (texts and not isinstance(texts[0], str)):
+            raise TypeError("SentenceTransformersQueryEmbedder expects a list of strings as input.")
+        return {"embeddings": self._embed_texts([self.prefix + text + self.suffix for text in texts])}
+
+
+@component
+class SentenceTransformersChunkEmbedder(InferenceBackendMixin, EmbeddingCacheMixin, SentenceTransformersDocumentEmbedder):
+    """
+    A SentenceTransformersDocumentEmbedder that reuses the embeddings of previously seen chunks stored in a persistent
+    embedding cache, so that re-indexing an unchanged or partially changed corpus skips most of the model calls.
+    """
+
+    def __init__(self, *args, inference_backend: str = "torch", model_precision: str = "float32",
+                 embedding_cache_path: Optional[str] = None, embedding_cache_max_size_mb: int = 1024, **kwargs):
+        SentenceTransformersDocumentEmbedder.__init__(self, *args, **kwargs)
+        self._init_inference_backend(inference_backend, model_precision)
+        self._init_embedding_cache(embedding_cache_path, embedding_cache_max_size_mb)
+
+    def warm_up(self):
+        self._warm_up_inference_backend()
+        SentenceTransformersDocumentEmbedder.warm_up(self)
+        self._warm_up_embedding_cache()
+
+    def _produce_text_to_embed(self, document: Document):
+        meta_values_to_embed = [str(document.meta[key]) for key in self.meta_fields_to_embed
+                                if key in document.meta and document.meta[key]]
+        return self.prefix + self.embedding_separator.join(meta_values_to_embed + [document.content or ""]) + self.suffix
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        if not isinstance(documents, list) or (documents and not isinstance(documents[0], Document)):
+            raise TypeError("SentenceTransformersChunkEmbedder expects a list of Documents as input.")
+
+        embeddings = self._embed_texts([self._produce_text_to_embed(doc) for doc in documents])
+        for doc, embedding in zip(documents, embeddings):
+            doc.embedding = embedding
+        return {"documents": documents}
@@ -0,0 +1,22 @@
+from typing import Dict, List, Optional
+
+from haystack import Document, component
+
+
+@component
+class IndexedChunkFilter:
+    """
+    Filters out the chunks that are already present in the document store, so that only the new chunks are embedded
+    and written. The IDs of all incoming chunks are returned as well, both as a whole and grouped by the file_path
+    metadata of the chunks, so that the caller can detect stale chunks.
+    """
+
+    @component.output_types(documents=List[Document], chunk_ids=List[str], file_chunk_ids=Dict[str, List[str]])
+    def run(self, documents: List[Document], indexed_chunk_ids: Optional[List[str]] = None):
+        indexed_chunk_ids = set(indexed_chunk_ids or [])
+        new_documents = [doc for doc in documents if doc.id not in indexed_chunk_ids]
+        file_chunk_ids = {}
+        for doc in documents:
+            file_chunk_ids.setdefault(doc.meta.get("file_path"), []).append(doc.id)
+        return {"documents": new_documents, "chunk_ids": [doc.id for doc in documents],
+                "file_chunk_ids": file_chunk_ids}
@@ -0,0 +1,131 @@
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, component, default_to_dict
+from milvus_haystack import MilvusDocumentStore, MilvusEmbeddingRetriever
+from milvus_haystack.filters import parse_filters
+
+
+@component
+class MilvusSearchRetriever(MilvusEmbeddingRetriever):
+    """
+    A MilvusEmbeddingRetriever whose top_k, filters and search parameters can be overridden on a per-run basis, which
+    allows a single warm pipeline to serve queries with different retrieval parameters. Multiple query embeddings can
+    be searched for in a single Milvus request via run_batch.
+
+    The searches are executed with the consistency level of the document store rather than with the one the
+    collection was created with.
+
+    With a quantized index (e.g., IVF_SQ8), rescore_oversampling can be set to retrieve top_k * rescore_oversampling
+    candidates and rescore them with their full-precision vectors, which Milvus keeps next to the index.
+    """
+
+    def __init__(self, document_store: MilvusDocumentStore, filters: Optional[Dict[str, Any]] = None, top_k: int = 10,
+                 rescore_oversampling: Optional[float] = None):
+        MilvusEmbeddingRetriever.__init__(self, document_store=document_store, filters=filters, top_k=top_k)
+        self.rescore_oversampling = rescore_oversampling
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, document_store=self.document_store.to_dict(), filters=self.filters,
+                               top_k=self.top_k, rescore_oversampling=self.rescore_oversampling)
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], top_k: Optional[int] = None,
+            filters: Optional[Dict[str, Any]] = None,
+            search_params: Optional[Dict[str, Any]] = None) -> Dict[str, List[Document]]:
+        return {"documents": self._search([query_embedding], top_k, filters, search_params)[0]}
+
+    def run_batch(self, query_embeddings: List[List[float]], top_k: Optional[int] = None,
+                  filters: Optional[Dict[str, Any]] = None,
+                  search_params: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Document]]]:
+        """
+        Retrieves the documents for a list of query embeddings using a single multi-vector search request.
+        The returned lists of documents follow the order of the input embeddings.
+        """
+        return {"documents": self._search(query_embeddings, top_k, filters, search_params)}
+
+    def _produce_search_params(self, search_params):
+        """
+        Overrides the index-specific parameters (e.g., ef or nprobe) of the document store's search parameters.
+        """
+        base_search_params = self.document_store.search_params or {}
+        if not search_params:
+            return base_search_params
+        return {**base_search_params, "params": {**base_search_params.get("params", {}), **search_params}}
+
+    def _search(self, query_embeddings, top_k, filters, search_params):
+        document_store = self.document_store
+        if document_store.col is None or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        actual_filters = filters if filters is not None else self.filters
+        actual_top_k = top_k if top_k is not None else self.top_k
+        actual_search_params = self._produce_search_params(search_params)
+        limit = actual_top_k
+        if self.rescore_oversampling is not None:
+            limit = max(actual_top_k, math.ceil(actual_top_k * self.rescore_oversampling))
+        output_fields = document_store.fields[:]
+        result = document_store.col.search(
+            data=query_embeddings,
+            anns_field=document_store._vector_field,
+            param=actual_search_params,
+            limit=limit,
+            expr=parse_filters(actual_filters) if actual_filters else None,
+            output_fields=output_fields,
+            consistency_level=document_store.consistency_level,
+            timeout=None,
+        )
+
+        metric_type = actual_search_params.get("metric_type")
+        docs = []
+        for hits in result:
+            query_docs = []
+            for hit in hits:
+                doc = document_store._parse_document({field: hit.entity.get(field) for field in output_fields})
+                # milvus_haystack leaves the score unset, while the ranking-dependent components rely on it
+                doc.score = self._produce_score(hit.distance, metric_type)
+                query_docs.append(doc)
+            docs.append(query_docs)
+        if self.rescore_oversampling is not None:
+            docs = [self._rescore(query_embedding, query_docs, actual_top_k, metric_type)
+                    for query_embedding, query_docs in zip(query_embeddings, docs)]
+        return docs
+
+    @staticmethod
+    def _produce_score(distance, metric_type):
+        """
+        Converts the distance reported by Milvus into a score where higher is better: the L2 distance is negated, while
+        the IP and COSINE distances already are similarities.
+        """
+        if distance is None:
+            return None
+        return -float(distance) if (metric_type or "L2").upper() == "L2" else float(distance)
+
+    @staticmethod
+    def _rescore(query_embedding, documents, top_k, metric_type):
+        """
+        Orders the candidate documents by the exact similarity of their full-precision vectors to the query, and keeps
+        the top_k of them with their exact scores. As everywhere else in the pipeline, a higher score is better, so with
+        the L2 metric the score is the negated squared distance.
+        """
+        documents = [doc for doc in documents if doc.embedding is not None]
+        if not documents:
+            return []
+        embeddings = np.asarray([doc.embedding for doc in documents], dtype=np.float32)
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        metric_type = (metric_type or "L2").upper()
+        if metric_type == "L2":
+            scores = -((embeddings - query_embedding) ** 2).sum(axis=1)
+        else:
+            if metric_type == "COSINE":
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                query_embedding /= max(float(np.linalg.norm(query_embedding)), 1e-12)
+            scores = embeddings @ query_embedding
+        order = np.argsort(-scores, kind="stable")
+
+        rescored_documents = []
+        for index in order[:top_k].tolist():
+            documents[index].score = float(scores[index])
+            rescored_documents.append(documents[index])
+        return rescored_documents
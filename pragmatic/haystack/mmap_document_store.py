@@ -0,0 +1,394 @@
+import json
+import os
+import shutil
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from haystack import Document, default_from_dict, default_to_dict
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils.filters import document_matches_filter
+
+from pragmatic.optimizations.quantization import DEFAULT_RESCORE_OVERSAMPLING, QUANTIZATION_PRECISIONS, \
+    SCORING_BLOCK_SIZE, compute_exact_scores, compute_quantization_ranges, compute_quantized_scores, \
+    get_quantized_dimension, produce_quantization_report, quantize_embeddings, rescore_top_rows, select_top_rows
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ["float32", "float16"]
+SUPPORTED_SIMILARITIES = ["cosine", "dot_product"]
+
+
+class MemoryMappedDocumentStore:
+    """
+    A dependency-light, in-process document store intended for small corpora. The embeddings are kept in a contiguous
+    float32 or float16 matrix stored as a memory-mapped .npy file, and the documents themselves in a JSON Lines file
+    whose i-th line corresponds to the i-th matrix row. The search is exact (a NumPy matrix-vector product followed by
+    a top-k selection).
+
+    The files are laid out as follows:
+        embeddings.<N>.npy  - the embedding matrix, preallocated with spare rows that are filled by the subsequent writes
+        documents.<N>.jsonl - the IDs, contents and metadata of the documents, appended on each write
+        store.json          - the number of valid rows, the names of the current data files and the matrix parameters,
+                              atomically replaced after each write
+
+    The data files are only modified beyond the valid rows. When they have to be rewritten (the matrix is full, or
+    documents are deleted or overwritten), new files are created under a new generation number N. Since store.json is
+    replaced after the data files are complete, a store instance in another process never observes a partial write.
+    Such instances reload the data when they detect a change of store.json.
+    Deleting or overwriting documents rewrites the files and is therefore considerably slower than appending.
+
+    With quantization set to int8 or binary, a compact copy of the matrix (quantized.<N>.npy, 4 or 32 times smaller
+    than a float32 matrix) is maintained as well. The search then scans the compact matrix and rescores an oversampled
+    set of candidates with their rows of the full-precision matrix, which is otherwise left on disk. The int8 ranges
+    are calibrated on the first written embeddings and recalibrated on all the stored ones whenever the files are
+    rewritten, the values outside of them being clipped in the meantime.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", similarity: str = "cosine", drop_old: bool = False,
+                 quantization: Optional[str] = None):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding data type: {dtype}")
+        if similarity not in SUPPORTED_SIMILARITIES:
+            raise ValueError(f"Unsupported similarity function: {similarity}")
+        if quantization is not None and quantization not in QUANTIZATION_PRECISIONS:
+            raise ValueError(f"Unsupported quantization precision: {quantization}")
+
+        self.path = path
+        self.dtype = dtype
+        self.similarity = similarity
+        self.quantization = quantization
+        self._lock = Lock()
+
+        self._embeddings = None
+        self._quantized = None
+        self._quantization_ranges = None
+        self._documents = []
+        self._row_by_id = {}
+        self._loaded_version = None
+        self._header = None
+
+        if drop_old and os.path.isdir(path):
+            shutil.rmtree(path)
+        self._reload_if_changed()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, path=self.path, dtype=self.dtype, similarity=self.similarity,
+                               quantization=self.quantization)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemoryMappedDocumentStore":
+        return default_from_dict(cls, data)
+
+    def _get_file_path(self, file_name):
+        return os.path.join(self.path, file_name)
+
+    def _read_header(self):
+        try:
+            with open(self._get_file_path("store.json")) as header_file:
+                return json.load(header_file)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self, header):
+        tmp_path = self._get_file_path("store.json.tmp")
+        with open(tmp_path, "w") as header_file:
+            json.dump(header, header_file)
+        os.replace(tmp_path, self._get_file_path("store.json"))
+        self._loaded_version = self._get_stored_version()
+
+        # the data files of the previous generations may still be mapped by other instances, which keep them alive
+        if self._header is not None:
+            for file_key in ["embeddings_file", "documents_file", "quantized_file"]:
+                if self._header.get(file_key) is not None and self._header[file_key] != header[file_key]:
+                    os.remove(self._get_file_path(self._header[file_key]))
+        self._header = header
+
+    def _produce_header(self, count, embeddings_file=None, documents_file=None, documents_size=None,
+                        generation=None, quantized_file=None):
+        current_header = self._header or {}
+        return {
+            "count": count,
+            "dtype": self.dtype,
+            "similarity": self.similarity,
+            "quantization": self.quantization,
+            "generation": generation if generation is not None else current_header["generation"],
+            "embeddings_file": embeddings_file or current_header["embeddings_file"],
+            "documents_file": documents_file or current_header["documents_file"],
+            "documents_size": documents_size if documents_size is not None else current_header["documents_size"],
+            "quantized_file": quantized_file or current_header.get("quantized_file"),
+            "quantization_ranges": self._quantization_ranges.tolist()
+            if self._quantization_ranges is not None else None,
+        }
+
+    def _next_generation(self):
+        return self._header["generation"] + 1 if self._header is not None else 1
+
+    def _get_stored_version(self):
+        try:
+            header_stat = os.stat(self._get_file_path("store.json"))
+        except FileNotFoundError:
+            return None
+        # the header file is replaced on each write, so its inode changes even if the modification time does not
+        return header_stat.st_ino, header_stat.st_mtime_ns
+
+    def _reload_if_changed(self):
+        version = self._get_stored_version()
+        if version == self._loaded_version:
+            return
+
+        with self._lock:
+            header = self._read_header()
+            if header is None:
+                self._embeddings, self._documents, self._row_by_id = None, [], {}
+                self._quantized, self._quantization_ranges = None, None
+                self._loaded_version, self._header = None, None
+                return
+            if (header["dtype"] != self.dtype or header["similarity"] != self.similarity or
+                    header.get("quantization") != self.quantization):
+                raise ValueError(f"The vector store at {self.path} was created with dtype {header['dtype']}, "
+                                 f"similarity {header['similarity']} and quantization {header.get('quantization')}, "
+                                 f"which does not match the current settings.")
+
+            count = header["count"]
+            documents = []
+            with open(self._get_file_path(header["documents_file"])) as documents_file:
+                for line in documents_file:
+                    if len(documents) == count:
+                        break
+                    documents.append(json.loads(line))
+
+            self._embeddings = np.load(self._get_file_path(header["embeddings_file"]), mmap_mode="r+")
+            if self.quantization is not None:
+                self._quantized = np.load(self._get_file_path(header["quantized_file"]), mmap_mode="r+")
+                self._quantization_ranges = np.asarray(header["quantization_ranges"], dtype=np.float32) \
+                    if header.get("quantization_ranges") is not None else None
+            self._documents = documents
+            self._row_by_id = {doc["id"]: row for row, doc in enumerate(documents)}
+            self._loaded_version = version
+            self._header = header
+            logger.debug(f"Loaded {count} documents from {self.path}")
+
+    def count_documents(self) -> int:
+        self._reload_if_changed()
+        return len(self._documents)
+
+    def filter_documents(self, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        self._reload_if_changed()
+        documents = [self._produce_document(row) for row in range(len(self._documents))]
+        if not filters:
+            return documents
+        return [doc for doc in documents if document_matches_filter(filters, doc)]
+
+    def _produce_document(self, row, score=None, return_embedding=False, embeddings=None, documents=None):
+        embeddings = embeddings if embeddings is not None else self._embeddings
+        doc = (documents if documents is not None else self._documents)[row]
+        embedding = embeddings[row].astype(np.float32).tolist() if return_embedding else None
+        return Document(id=doc["id"], content=doc["content"], meta=dict(doc["meta"]), score=score,
+                        embedding=embedding)
+
+    def _prepare_embeddings(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.similarity == "cosine":
+            norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+            embeddings = embeddings / np.where(norms > 0, norms, 1)
+        return embeddings
+
+    def write_documents(self, documents: List[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE) -> int:
+        """
+        Appends the documents to the store. With the NONE (default) and OVERWRITE policies, the documents whose IDs
+        are already present replace the stored ones.
+        """
+        self._reload_if_changed()
+        for doc in documents:
+            if doc.embedding is None:
+                raise ValueError(f"Document {doc.id} has no embedding and cannot be written to {self.path}")
+
+        # within a single batch, the last occurrence of an ID wins
+        new_documents = list({doc.id: doc for doc in documents}.values())
+        duplicate_ids = [doc.id for doc in new_documents if doc.id in self._row_by_id]
+        if duplicate_ids:
+            if policy == DuplicatePolicy.FAIL:
+                raise DuplicateDocumentError(f"IDs {duplicate_ids} already exist in the document store.")
+            if policy == DuplicatePolicy.SKIP:
+                new_documents = [doc for doc in new_documents if doc.id not in self._row_by_id]
+            else:
+                self.delete_documents(duplicate_ids)
+        if not new_documents:
+            return 0
+
+        with self._lock:
+            embeddings = self._prepare_embeddings([doc.embedding for doc in new_documents])
+            count = len(self._documents)
+            self._ensure_capacity(count + len(new_documents), embeddings.shape[1])
+
+            self._embeddings[count:count + len(new_documents)] = embeddings
+            self._embeddings.flush()
+            if self.quantization is not None:
+                if self._quantization_ranges is None:
+                    self._quantization_ranges = compute_quantization_ranges(embeddings, self.quantization)
+                self._quantized[count:count + len(new_documents)] = quantize_embeddings(
+                    embeddings, self.quantization, self._quantization_ranges)
+                self._quantized.flush()
+            records = [{"id": doc.id, "content": doc.content, "meta": doc.meta} for doc in new_documents]
+            with open(self._get_file_path(self._header["documents_file"]), "r+b") as documents_file:
+                # the data beyond the valid rows may remain from a write interrupted before updating the header
+                documents_file.seek(self._header["documents_size"])
+                documents_file.truncate()
+                documents_file.write(self._serialize_records(records))
+                documents_size = documents_file.tell()
+
+            for row, record in enumerate(records, start=count):
+                self._row_by_id[record["id"]] = row
+            self._documents.extend(records)
+            self._write_header(self._produce_header(len(self._documents), documents_size=documents_size))
+        return len(new_documents)
+
+    @staticmethod
+    def _serialize_records(records):
+        return "".join(json.dumps(record, default=str) + "\n" for record in records).encode()
+
+    def _write_documents_file(self, generation, records):
+        documents_file_name = f"documents.{generation}.jsonl"
+        with open(self._get_file_path(documents_file_name), "wb") as documents_file:
+            documents_file.write(self._serialize_records(records))
+            return documents_file_name, documents_file.tell()
+
+    def _ensure_capacity(self, required_rows, dimension):
+        if self._embeddings is not None:
+            if self._embeddings.shape[1] != dimension:
+                raise ValueError(f"Cannot write {dimension}-dimensional embeddings to {self.path}, "
+                                 f"which holds {self._embeddings.shape[1]}-dimensional embeddings")
+            if self._embeddings.shape[0] >= required_rows:
+                return
+
+        # the matrix grows geometrically to amortize the cost of copying it
+        current_rows = self._embeddings.shape[0] if self._embeddings is not None else 0
+        generation = self._next_generation()
+        embeddings_file, quantized_file = self._create_matrix(generation, max(required_rows, 2 * current_rows, 1024),
+                                                              dimension, np.arange(len(self._documents)))
+        documents_file, documents_size = None, None
+        if self._header is None:
+            documents_file, documents_size = self._write_documents_file(generation, [])
+        self._write_header(self._produce_header(len(self._documents), embeddings_file=embeddings_file,
+                                                documents_file=documents_file, documents_size=documents_size,
+                                                generation=generation, quantized_file=quantized_file))
+
+    def _create_matrix(self, generation, capacity, dimension, rows_to_copy):
+        """
+        Writes a new matrix of the given capacity containing the given rows of the current one, and its quantized
+        counterpart if the quantization is enabled. The new matrices replace the current ones in this instance, while
+        the other instances keep using the current ones until they detect the header change.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        embeddings_file_name = f"embeddings.{generation}.npy"
+        new_embeddings = np.lib.format.open_memmap(self._get_file_path(embeddings_file_name), mode="w+",
+                                                   dtype=self.dtype, shape=(capacity, dimension))
+        if self._embeddings is not None and len(rows_to_copy) > 0:
+            new_embeddings[:len(rows_to_copy)] = self._embeddings[rows_to_copy]
+        new_embeddings.flush()
+        self._embeddings = new_embeddings
+        if self.quantization is None:
+            return embeddings_file_name, None
+
+        quantized_file_name = f"quantized.{generation}.npy"
+        quantized_dtype = np.int8 if self.quantization == "int8" else np.uint8
+        quantized_dimension = get_quantized_dimension(dimension, self.quantization)
+        new_quantized = np.lib.format.open_memmap(self._get_file_path(quantized_file_name), mode="w+",
+                                                  dtype=quantized_dtype, shape=(capacity, quantized_dimension))
+        if len(rows_to_copy) > 0:
+            # the rewrite is used to recalibrate the ranges on all the stored embeddings
+            self._quantization_ranges = compute_quantization_ranges(new_embeddings[:len(rows_to_copy)],
+                                                                    self.quantization)
+            for block_start in range(0, len(rows_to_copy), SCORING_BLOCK_SIZE):
+                block_end = min(block_start + SCORING_BLOCK_SIZE, len(rows_to_copy))
+                new_quantized[block_start:block_end] = quantize_embeddings(
+                    new_embeddings[block_start:block_end], self.quantization, self._quantization_ranges)
+        new_quantized.flush()
+        self._quantized = new_quantized
+        return embeddings_file_name, quantized_file_name
+
+    def delete_documents(self, document_ids: List[str]) -> None:
+        self._reload_if_changed()
+        with self._lock:
+            ids_to_delete = set(document_ids)
+            kept_rows = [row for row, doc in enumerate(self._documents) if doc["id"] not in ids_to_delete]
+            if len(kept_rows) == len(self._documents):
+                return
+
+            generation = self._next_generation()
+            embeddings_file, quantized_file = self._create_matrix(generation, self._embeddings.shape[0],
+                                                                  self._embeddings.shape[1],
+                                                                  np.asarray(kept_rows, dtype=np.int64))
+            self._documents = [self._documents[row] for row in kept_rows]
+            self._row_by_id = {doc["id"]: row for row, doc in enumerate(self._documents)}
+            documents_file, documents_size = self._write_documents_file(generation, self._documents)
+            self._write_header(self._produce_header(len(self._documents), embeddings_file=embeddings_file,
+                                                    documents_file=documents_file, documents_size=documents_size,
+                                                    generation=generation, quantized_file=quantized_file))
+
+    def embedding_retrieval(self, query_embeddings: List[List[float]], top_k: int = 10,
+                            filters: Optional[Dict[str, Any]] = None, return_embedding: bool = False,
+                            rescore_oversampling: Optional[float] = DEFAULT_RESCORE_OVERSAMPLING
+                            ) -> List[List[Document]]:
+        """
+        Retrieves the top_k most similar documents for each of the query embeddings. If the quantization is enabled,
+        the top_k * rescore_oversampling candidates found in the quantized matrix are rescored with their
+        full-precision embeddings, or returned with their approximate scores if rescore_oversampling is None.
+        """
+        self._reload_if_changed()
+        # the writes either fill the rows beyond the current count or replace the matrix and the document list, so a
+        # consistent snapshot can be searched without holding the lock
+        with self._lock:
+            embeddings, documents = self._embeddings, self._documents
+            quantized, quantization_ranges = self._quantized, self._quantization_ranges
+            count = len(documents)
+        if count == 0 or not query_embeddings:
+            return [[] for _ in query_embeddings]
+
+        prepared_query_embeddings = self._prepare_embeddings(query_embeddings)
+        if self.quantization is not None:
+            scores = compute_quantized_scores(quantized[:count], prepared_query_embeddings, self.quantization,
+                                              quantization_ranges)
+        else:
+            scores = compute_exact_scores(embeddings[:count], prepared_query_embeddings)
+        if filters:
+            matching_rows = np.fromiter((document_matches_filter(filters, self._produce_document(
+                row, embeddings=embeddings, documents=documents)) for row in range(count)), dtype=bool, count=count)
+            scores[~matching_rows] = -np.inf
+            actual_top_k = min(top_k, int(matching_rows.sum()))
+        else:
+            actual_top_k = min(top_k, count)
+
+        results = []
+        for query_scores, query_embedding in zip(scores.T, prepared_query_embeddings):
+            if self.quantization is not None:
+                top_rows, top_scores = rescore_top_rows(embeddings[:count], query_scores, query_embedding,
+                                                        actual_top_k, rescore_oversampling=rescore_oversampling)
+            else:
+                top_rows = select_top_rows(query_scores, actual_top_k)
+                top_scores = query_scores[top_rows]
+            results.append([self._produce_document(row, score=float(score), return_embedding=return_embedding,
+                                                   embeddings=embeddings, documents=documents)
+                            for row, score in zip(top_rows.tolist(), top_scores.tolist())])
+        return results
+
+    def produce_quantization_report(self, top_k: int = 10,
+                                    rescore_oversampling: Optional[float] = DEFAULT_RESCORE_OVERSAMPLING,
+                                    num_queries: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Reports the memory saved by the quantized matrix and the recall@top_k of the quantized search relative to the
+        exact one, using a sample of the stored embeddings as the queries. Returns None if the quantization is
+        disabled or the store is empty.
+        """
+        self._reload_if_changed()
+        with self._lock:
+            embeddings, quantization_ranges, count = self._embeddings, self._quantization_ranges, len(self._documents)
+        if self.quantization is None or count == 0:
+            return None
+        return produce_quantization_report(embeddings[:count], self.quantization, top_k=top_k,
+                                           rescore_oversampling=rescore_oversampling, num_queries=num_queries,
+                                           ranges=quantization_ranges)
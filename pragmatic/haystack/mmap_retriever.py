@@ -0,0 +1,57 @@
+from typing import Any, Dict, List, Optional
+
+from haystack import Document, component, default_from_dict, default_to_dict
+
+from pragmatic.haystack.mmap_document_store import MemoryMappedDocumentStore
+from pragmatic.optimizations.quantization import DEFAULT_RESCORE_OVERSAMPLING
+
+
+@component
+class MemoryMappedEmbeddingRetriever:
+    """
+    Retrieves the most similar documents from a MemoryMappedDocumentStore using an exact search. The top_k and filters
+    can be overridden on a per-run basis, and multiple query embeddings can be searched for at once via run_batch.
+    If the store is quantized, top_k * rescore_oversampling candidates are rescored with the full-precision embeddings.
+    """
+
+    def __init__(self, document_store: MemoryMappedDocumentStore, top_k: int = 10,
+                 filters: Optional[Dict[str, Any]] = None, return_embedding: bool = False,
+                 rescore_oversampling: Optional[float] = DEFAULT_RESCORE_OVERSAMPLING):
+        if not isinstance(document_store, MemoryMappedDocumentStore):
+            raise ValueError("document_store must be an instance of MemoryMappedDocumentStore")
+        self.document_store = document_store
+        self.top_k = top_k
+        self.filters = filters
+        self.return_embedding = return_embedding
+        self.rescore_oversampling = rescore_oversampling
+
+    def to_dict(self) -> Dict[str, Any]:
+        return default_to_dict(self, document_store=self.document_store.to_dict(), top_k=self.top_k,
+                               filters=self.filters, return_embedding=self.return_embedding,
+                               rescore_oversampling=self.rescore_oversampling)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemoryMappedEmbeddingRetriever":
+        data["init_parameters"]["document_store"] = MemoryMappedDocumentStore.from_dict(
+            data["init_parameters"]["document_store"])
+        return default_from_dict(cls, data)
+
+    @component.output_types(documents=List[Document])
+    def run(self, query_embedding: List[float], top_k: Optional[int] = None,
+            filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[Document]]:
+        return {"documents": self.run_batch([query_embedding], top_k=top_k, filters=filters)["documents"][0]}
+
+    def run_batch(self, query_embeddings: List[List[float]], top_k: Optional[int] = None,
+                  filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Document]]]:
+        """
+        Retrieves the documents for a list of query embeddings using a single matrix-matrix product.
+        The returned lists of documents follow the order of the input embeddings.
+        """
+        docs = self.document_store.embedding_retrieval(
+            query_embeddings=query_embeddings,
+            top_k=top_k if top_k is not None else self.top_k,
+            filters=filters if filters is not None else self.filters,
+            return_embedding=self.return_embedding,
+            rescore_oversampling=self.rescore_oversampling,
+        )
+        return {"documents": docs}
@@ -0,0 +1,77 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from haystack import Document, component
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@component
+class ParallelFileConverter:
+    """
+    Converts a list of files into Haystack documents using a pool of worker processes, one file per task.
+
+    The conversion of a single file is performed by convert_function, which must be a picklable module-level function
+    accepting a file path and returning a list of documents. The optional initializer is executed once in every worker
+    process, e.g., to load the conversion models.
+
+    The output documents follow the order of the input files regardless of the order in which the workers finish.
+    A failure to convert a file does not abort the run - the failed files are reported via the failures output.
+    With a single worker, the files are converted one by one in the current process.
+    """
+
+    def __init__(self, convert_function: Callable[[str], List[Document]], num_workers: int,
+                 initializer: Optional[Callable] = None, initargs: Tuple[Any, ...] = ()):
+        self._convert_function = convert_function
+        self._num_workers = num_workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self._executor = None
+
+    def _uses_worker_processes(self):
+        return self._num_workers > 1
+
+    def warm_up(self):
+        if not self._uses_worker_processes():
+            if self._initializer is not None and self._initargs is not None:
+                self._initializer(*self._initargs)
+                # the initializer is only executed once
+                self._initargs = None
+            return
+        if self._executor is None:
+            # the workers are spawned rather than forked, since forking a process with initialized torch and tokenizer
+            # thread pools is not safe
+            self._executor = ProcessPoolExecutor(max_workers=self._num_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=self._initializer,
+                                                 initargs=self._initargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @component.output_types(documents=List[Document], failures=Dict[str, str])
+    def run(self, sources: List[str]):
+        self.warm_up()
+
+        if self._uses_worker_processes():
+            tasks = [(str(source), self._executor.submit(self._convert_function, str(source)).result)
+                     for source in sources]
+        else:
+            tasks = [(str(source), partial(self._convert_function, str(source))) for source in sources]
+
+        documents = []
+        failures = {}
+        for source, task in tasks:
+            try:
+                documents.extend(task())
+            except Exception as e:
+                logger.error(f"Failed to convert {source}: {e}")
+                failures[source] = f"{type(e).__name__}: {e}"
+
+        return {"documents": documents, "failures": failures}
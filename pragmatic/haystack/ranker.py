@@ -0,0 +1,136 @@
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import replace
+from threading import Lock
+from typing import List, Optional
+
+from haystack import Document, component
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+RANKER_BACKENDS = ["torch", "int8", "onnx"]
+
+
+def _load_sequence_classification_model(model, backend):
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise ImportError("The onnx ranker backend requires optimum[onnxruntime] to be installed") from e
+        # models without ONNX weights are exported on the fly
+        has_onnx_weights = os.path.isdir(model) and any(file.endswith(".onnx") for file in os.listdir(model))
+        return ORTModelForSequenceClassification.from_pretrained(model, export=not has_onnx_weights)
+
+    import torch
+    from transformers import AutoModelForSequenceClassification
+    model_obj = AutoModelForSequenceClassification.from_pretrained(model).eval()
+    if backend == "int8":
+        # the weights of the linear layers are quantized ahead of time and the activations on the fly
+        model_obj = torch.ao.quantization.quantize_dynamic(model_obj, {torch.nn.Linear}, dtype=torch.qint8)
+    return model_obj
+
+
+@component
+class CrossEncoderRanker:
+    """
+    Reranks documents by their relevance to the query as estimated by a cross-encoder model, optimized for running on
+    CPUs. All (query, document) pairs are scored in a single forward pass (or in batches of batch_size pairs of similar
+    lengths), the documents are truncated so that each pair fits into max_tokens, and the model can be executed via
+    ONNX Runtime or with int8 dynamically quantized linear layers.
+
+    The scores are cached per (query hash, document ID) pair, so the documents retrieved again for a repeated query are
+    not rescored. The document IDs are derived from the contents, hence a reindexed document never reuses a stale score.
+    """
+
+    def __init__(self, model: str, backend: str = "torch", top_k: int = 10, max_tokens: int = 512,
+                 batch_size: Optional[int] = None, score_cache_size: int = 10000, scale_score: bool = True):
+        if backend not in RANKER_BACKENDS:
+            raise ValueError(f"Unsupported ranker backend: {backend}")
+        self.model = model
+        self.backend = backend
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.score_cache_size = score_cache_size
+        self.scale_score = scale_score
+
+        self._tokenizer = None
+        self._model = None
+        self._warm_up_lock = Lock()
+        self._score_cache = OrderedDict()
+        self._score_cache_lock = Lock()
+
+    def warm_up(self):
+        with self._warm_up_lock:
+            if self._model is not None:
+                return
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model)
+            self._model = _load_sequence_classification_model(self.model, self.backend)
+            logger.info(f"Loaded the ranking model {self.model} with the {self.backend} backend")
+
+    def _get_cached_scores(self, keys):
+        with self._score_cache_lock:
+            scores = []
+            for key in keys:
+                score = self._score_cache.get(key)
+                if score is not None:
+                    self._score_cache.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def _cache_scores(self, keys, scores):
+        if self.score_cache_size <= 0:
+            return
+        with self._score_cache_lock:
+            for key, score in zip(keys, scores):
+                self._score_cache[key] = score
+                self._score_cache.move_to_end(key)
+            while len(self._score_cache) > self.score_cache_size:
+                self._score_cache.popitem(last=False)
+
+    def _score_pairs(self, query, passages):
+        import torch
+
+        # passages of similar lengths are batched together to minimize the padding
+        order = sorted(range(len(passages)), key=lambda i: len(passages[i]))
+        batch_size = self.batch_size or len(passages)
+        scores = [0.0] * len(passages)
+        for batch_start in range(0, len(order), batch_size):
+            batch_indices = order[batch_start:batch_start + batch_size]
+            features = self._tokenizer([query] * len(batch_indices), [passages[i] for i in batch_indices],
+                                       padding=True, truncation="only_second", max_length=self.max_tokens,
+                                       return_tensors="pt")
+            with torch.inference_mode():
+                logits = self._model(**features).logits
+            # single-logit cross-encoders output a relevance logit, binary classifiers a (negative, positive) pair
+            batch_scores = logits[:, 0] if logits.shape[-1] == 1 else logits[:, -1]
+            if self.scale_score:
+                batch_scores = torch.sigmoid(batch_scores)
+            for i, score in zip(batch_indices, batch_scores.float().tolist()):
+                scores[i] = score
+        return scores
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, documents: List[Document], top_k: Optional[int] = None):
+        if not documents:
+            return {"documents": []}
+        self.warm_up()
+
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        keys = [(query_hash, doc.id) for doc in documents]
+        scores = self._get_cached_scores(keys)
+        missing_indices = [i for i, score in enumerate(scores) if score is None]
+        if missing_indices:
+            new_scores = self._score_pairs(query, [documents[i].content or "" for i in missing_indices])
+            self._cache_scores([keys[i] for i in missing_indices], new_scores)
+            for i, score in zip(missing_indices, new_scores):
+                scores[i] = score
+        logger.debug(f"Scored {len(missing_indices)} out of {len(documents)} documents, the rest were cached")
+
+        ranked_documents = sorted((replace(doc, score=score) for doc, score in zip(documents, scores)),
+                                  key=lambda doc: doc.score, reverse=True)
+        return {"documents": ranked_documents[:top_k if top_k is not None else self.top_k]}
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import secrets
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compute_chunk_cache_key(content, **chunking_params):
+    """
+    Produces the key of the chunks of the given document content split with the given parameters (e.g., the tokenizer
+    and the maximal number of tokens per chunk).
+    """
+    content_hash = hashlib.sha256(content.encode()).hexdigest()
+    return hashlib.sha256(json.dumps({"content": content_hash, **chunking_params}, sort_keys=True,
+                                     default=str).encode()).hexdigest()
+
+
+class ChunkCache(object):
+    """
+    A persistent cache of the chunks produced by splitting documents, stored as a JSON file per document under
+    cache_dir. The files are replaced atomically, so that the cache can be shared by concurrent processes, e.g., the
+    conversion worker processes of the indexing pipeline.
+    """
+
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+        self._num_hits = 0
+        self._num_misses = 0
+
+    def _get_path(self, key):
+        # the files are spread over subdirectories to keep the directories small
+        return os.path.join(self._cache_dir, key[:2], f"{key}.json")
+
+    def load(self, key):
+        """
+        Returns the cached chunks stored under the given key, or None if there are none.
+        """
+        try:
+            with open(self._get_path(key), "r") as cache_file:
+                chunks = json.load(cache_file)
+        except FileNotFoundError:
+            self._num_misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read the cached chunks {key}, the document will be split again: {e}")
+            self._num_misses += 1
+            return None
+        self._num_hits += 1
+        return chunks
+
+    def store(self, key, chunks):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump(chunks, cache_file)
+        os.replace(tmp_path, path)
+
+    def get_stats(self):
+        return {"hits": self._num_hits, "misses": self._num_misses}
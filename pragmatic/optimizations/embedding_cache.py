@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 32  # the size of a sha256 digest
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def compute_text_key(text):
+    return hashlib.sha256(normalize_text(text).encode()).digest()
+
+
+def compute_cache_namespace(**embedding_params):
+    """
+    Produces the name of the cache partition for the given embedding model and the parameters affecting its output.
+    """
+    return hashlib.sha256(json.dumps(embedding_params, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+class EmbeddingCache(object):
+    """
+    A persistent, content-addressed cache of text embeddings produced by a single embedding model.
+
+    The cache is stored as three memory-mapped NumPy arrays of a fixed capacity: the sha256 digests of the normalized
+    texts (as raw bytes), the embeddings as a contiguous float32 matrix and the logical time of the last access of each
+    entry, which is zero for the empty slots. The capacity is derived from the configured maximal size. When the cache
+    is full, the least recently used entries are overwritten.
+
+    The cache is single-writer: the index of the occupied slots is kept in memory, so a cache directory is owned by
+    one process at a time through an exclusive file lock. A process failing to acquire the lock works without the
+    cache, i.e., every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, cache_dir, max_size_mb):
+        self._cache_dir = cache_dir
+        self._max_size_bytes = int(max_size_mb * (1 << 20))
+        self._lock = Lock()
+
+        self._keys = None
+        self._embeddings = None
+        self._last_used = None
+        self._slots = {}
+        self._free_slots = []
+        self._clock = 0
+
+        self._lock_file = None
+        self._disabled = not self._acquire_file_lock()
+        if not self._disabled and os.path.isfile(self._get_array_path("embeddings")):
+            self._open()
+
+    def _get_array_path(self, array_name):
+        return os.path.join(self._cache_dir, f"{array_name}.npy")
+
+    def _acquire_file_lock(self):
+        if fcntl is None:
+            return True
+        os.makedirs(self._cache_dir, exist_ok=True)
+        self._lock_file = open(os.path.join(self._cache_dir, "lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.warning(f"The embedding cache at {self._cache_dir} is used by another process, "
+                           f"proceeding without the cache")
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def _open(self):
+        keys = np.load(self._get_array_path("keys"), mmap_mode="r+")
+        if keys.dtype != np.uint8 or keys.ndim != 2 or keys.shape[1] != KEY_SIZE:
+            logger.warning(f"Discarding the embedding cache at {self._cache_dir} stored in an outdated format")
+            del keys
+            os.remove(self._get_array_path("embeddings"))
+            return
+        self._keys = keys
+        self._embeddings = np.load(self._get_array_path("embeddings"), mmap_mode="r+")
+        self._last_used = np.load(self._get_array_path("last_used"), mmap_mode="r+")
+
+        occupied = np.asarray(self._last_used) > 0
+        self._slots = {self._keys[slot].tobytes(): slot for slot in np.flatnonzero(occupied).tolist()}
+        self._free_slots = np.flatnonzero(~occupied).tolist()
+        self._clock = int(self._last_used.max()) if len(self._last_used) > 0 else 0
+        logger.info(f"Loaded {len(self._slots)} cached embeddings from {self._cache_dir}")
+
+    def _create(self, dimension):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        capacity = max(1, self._max_size_bytes // (dimension * 4 + KEY_SIZE + 8))
+        open_memmap = np.lib.format.open_memmap
+        self._keys = open_memmap(self._get_array_path("keys"), mode="w+", dtype=np.uint8, shape=(capacity, KEY_SIZE))
+        self._last_used = open_memmap(self._get_array_path("last_used"), mode="w+", dtype=np.int64, shape=(capacity,))
+        # the embeddings are created last, since their presence marks the cache as initialized
+        self._embeddings = open_memmap(self._get_array_path("embeddings"), mode="w+", dtype=np.float32,
+                                       shape=(capacity, dimension))
+        self._slots = {}
+        self._free_slots = list(range(capacity))
+
+    def _evict(self, count):
+        occupied_slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        if count < len(occupied_slots):
+            occupied_slots = occupied_slots[np.argpartition(self._last_used[occupied_slots], count - 1)[:count]]
+        for slot in occupied_slots.tolist():
+            del self._slots[self._keys[slot].tobytes()]
+            self._keys[slot] = 0
+            self._last_used[slot] = 0
+            self._free_slots.append(slot)
+
+    def get_many(self, texts):
+        """
+        Returns the cached embeddings of the given texts (as lists of floats), with None for each cache miss.
+        """
+        if self._disabled:
+            return [None] * len(texts)
+        with self._lock:
+            result = []
+            for text in texts:
+                slot = self._slots.get(compute_text_key(text))
+                if slot is None:
+                    result.append(None)
+                    continue
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                result.append(self._embeddings[slot].tolist())
+            return result
+
+    def put_many(self, texts, embeddings):
+        if not texts or self._disabled:
+            return
+        with self._lock:
+            if self._embeddings is None:
+                self._create(len(embeddings[0]))
+
+            capacity = len(self._keys)
+            entries = list(zip(texts, embeddings))[-capacity:]
+            new_entries = [(compute_text_key(text), embedding) for text, embedding in entries]
+            new_entries = [(key, embedding) for key, embedding in new_entries if key not in self._slots]
+
+            missing_slots = len(new_entries) - len(self._free_slots)
+            if missing_slots > 0:
+                # evict at least a tenth of the cache at once to amortize the eviction cost
+                self._evict(min(capacity, max(missing_slots, capacity // 10)))
+
+            for key, embedding in new_entries:
+                if key in self._slots:
+                    # the same text appears more than once in the batch
+                    continue
+                slot = self._free_slots.pop()
+                self._clock += 1
+                self._embeddings[slot] = embedding
+                self._last_used[slot] = self._clock
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._slots[key] = slot
+
+            self._keys.flush()
+            self._embeddings.flush()
+            self._last_used.flush()
+
+
+_embedding_caches = {}
+_embedding_caches_lock = Lock()
+
+
+def get_embedding_cache(cache_path, namespace, max_size_mb):
+    """
+    Returns the process-wide cache instance for the given partition, creating or loading it if needed.
+    """
+    cache_dir = os.path.join(cache_path, namespace)
+    with _embedding_caches_lock:
+        if cache_dir not in _embedding_caches:
+            _embedding_caches[cache_dir] = EmbeddingCache(cache_dir, max_size_mb)
+        return _embedding_caches[cache_dir]
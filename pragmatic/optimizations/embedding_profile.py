@@ -0,0 +1,124 @@
+import json
+import os
+from dataclasses import replace
+from threading import Lock
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a few short texts of different kinds embedded by both the indexing and the query embedders - comparing their
+# embeddings reveals a different model, pooling, normalization or an overly lossy quantization
+EMBEDDING_PROBE_TEXTS = [
+    "How do I install the command line tools on macOS?",
+    "The pod is stuck in the CrashLoopBackOff state after the upgrade to version 4.12.",
+    "Quarterly revenue grew by 12 percent compared to the same period last year.",
+    "kubectl get pods --all-namespaces -o wide",
+]
+
+_profiles_lock = Lock()
+
+
+def _load_profiles(profile_path):
+    try:
+        with open(profile_path) as profile_file:
+            return json.load(profile_file)
+    except FileNotFoundError:
+        return {}
+
+
+def load_embedding_profile(profile_path, document_store_id):
+    """
+    Returns the profile of the embedder used for indexing the given collection or None if it was never recorded.
+    """
+    with _profiles_lock:
+        return _load_profiles(profile_path).get(document_store_id)
+
+
+def save_embedding_profile(profile_path, document_store_id, profile):
+    with _profiles_lock:
+        profiles = _load_profiles(profile_path)
+        profiles[document_store_id] = profile
+        profile_dir = os.path.dirname(os.path.abspath(profile_path))
+        os.makedirs(profile_dir, exist_ok=True)
+        tmp_path = f"{profile_path}.tmp"
+        with open(tmp_path, "w") as profile_file:
+            json.dump(profiles, profile_file)
+        os.replace(tmp_path, profile_path)
+
+
+def compute_probe_similarity(profile, other_profile):
+    """
+    Returns the lowest cosine similarity between the probe embeddings of two embedding profiles.
+    """
+    embeddings = np.asarray(profile["probe_embeddings"], dtype=np.float32)
+    other_embeddings = np.asarray(other_profile["probe_embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(other_embeddings, axis=1)
+    similarities = np.sum(embeddings * other_embeddings, axis=1) / np.maximum(norms, 1e-12)
+    return float(similarities.min())
+
+
+def verify_embedding_compatibility(index_profile, query_profile, min_similarity):
+    """
+    Raises a ValueError if the vectors described by query_profile (produced by a query embedder or by an indexing
+    embedder adding documents to an existing collection) cannot be compared with the vectors described by
+    index_profile, i.e., if their dimensions or output precisions differ or if the same probe texts are embedded into
+    substantially different vectors.
+    """
+    if index_profile["dimension"] != query_profile["dimension"]:
+        raise ValueError(f"The new embeddings have {query_profile['dimension']} dimensions while the collection was "
+                         f"indexed with {index_profile['dimension']}-dimensional embeddings")
+    if index_profile["precision"] != query_profile["precision"]:
+        raise ValueError(f"The new embeddings are produced with the {query_profile['precision']} precision while "
+                         f"the collection was indexed with {index_profile['precision']} embeddings")
+
+    similarity = compute_probe_similarity(index_profile, query_profile)
+    description = (f"{query_profile['model']} ({query_profile['inference_backend']}, "
+                   f"{query_profile['model_precision']}) vs. {index_profile['model']} "
+                   f"({index_profile['inference_backend']}, {index_profile['model_precision']})")
+    if similarity < min_similarity:
+        raise ValueError(f"The new embeddings are incompatible with the indexed ones: {description} - the probe "
+                         f"similarity is {similarity:.4f}, below the minimum of {min_similarity}. Please reindex the "
+                         f"documents or use the embedding settings the collection was indexed with")
+    logger.info(f"The new embeddings are compatible with the indexed ones: {description} - "
+                f"the probe similarity is {similarity:.4f}")
+
+
+def _normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def measure_recall_drift(baseline_embedders, embedders, queries, documents, top_k=10):
+    """
+    Compares the nearest neighbors of the queries among the documents as found by two (query embedder, chunk embedder)
+    pairs, typically the float32 PyTorch baseline and an optimized backend.
+
+    Returns:
+        dict: The mean and the lowest recall@top_k of the optimized embedders relative to the baseline (the fraction of
+              the baseline's top_k neighbors they retrieve as well) and the mean cosine similarity between the two
+              embeddings of the same document.
+    """
+    actual_top_k = min(top_k, len(documents))
+    neighbors = []
+    document_embeddings = []
+    for query_embedder, chunk_embedder in [baseline_embedders, embedders]:
+        # the chunk embedder sets the embeddings in place, so the documents are copied
+        embedded_documents = chunk_embedder.run([replace(doc, embedding=None) for doc in documents])["documents"]
+        current_document_embeddings = _normalize_rows([doc.embedding for doc in embedded_documents])
+        query_embeddings = _normalize_rows(query_embedder.run_batch(list(queries))["embeddings"])
+        scores = query_embeddings @ current_document_embeddings.T
+        neighbors.append(np.argsort(-scores, axis=1)[:, :actual_top_k])
+        document_embeddings.append(current_document_embeddings)
+
+    recalls = [len(set(baseline_neighbors.tolist()) & set(current_neighbors.tolist())) / actual_top_k
+               for baseline_neighbors, current_neighbors in zip(*neighbors)]
+    return {
+        f"recall@{actual_top_k}": float(np.mean(recalls)),
+        "min_recall": float(np.min(recalls)),
+        "mean_document_similarity": float(np.mean(np.sum(document_embeddings[0] * document_embeddings[1], axis=1))),
+        "num_queries": len(queries),
+        "num_documents": len(documents),
+    }
@@ -1,14 +1,27 @@
-from datasets import load_dataset, Dataset
+from datasets import load_dataset, Dataset, DatasetDict
 from sentence_transformers import (
     SentenceTransformer,
     SentenceTransformerTrainer,
     SentenceTransformerTrainingArguments,
 )
-from sentence_transformers.losses import CoSENTLoss
+from sentence_transformers.losses import CoSENTLoss, MatryoshkaLoss
 
+import json
 import os
 from typing import Union, Dict
 
+import logging
+
+from pragmatic.optimizations.matryoshka import measure_recall_by_dimension
+
+logger = logging.getLogger(__name__)
+
+# the held-out pairs used for the recall-vs-dimension report are capped to keep its cost negligible
+MAX_HELD_OUT_PAIRS = 2000
+# a held-out pair is considered relevant if its score is at least this fraction of the highest score
+HELD_OUT_POSITIVE_SCORE_FRACTION = 0.8
+DIMENSION_REPORT_FILE_NAME = "dimension_report.json"
+
 
 def finetune_embedding_model(settings):
     model = SentenceTransformer(settings["initial_embedding_model_path"])
@@ -16,8 +29,27 @@ def finetune_embedding_model(settings):
     # we assume each dataset entry to contain a pair of sentences and a float similarity score
     dataset = load_dataset_from_source(settings["embedding_model_finetuning_dataset_path"],
                                        settings["embedding_model_finetuning_dataset_subset_name"])
+    # the local CSV and JSON files are loaded as a single "train" split, while the other dataset dicts are trained on
+    # as they are
+    if isinstance(dataset, DatasetDict) and "train" in dataset:
+        dataset = dataset["train"]
+
+    matryoshka_dimensions = settings["embedding_model_finetuning_matryoshka_dimensions"]
+
+    # the dimension report is only produced for the Matryoshka training, so the other runs use the whole dataset
+    held_out_dataset = None
+    held_out_fraction = settings["embedding_model_finetuning_held_out_fraction"]
+    if held_out_fraction and matryoshka_dimensions and isinstance(dataset, DatasetDict):
+        logger.warning("The fine-tuning dataset has no train split to hold out pairs from - skipping the dimension report")
+    elif held_out_fraction and matryoshka_dimensions:
+        split = dataset.train_test_split(test_size=held_out_fraction, seed=0)
+        dataset, held_out_dataset = split["train"], split["test"]
 
     loss = CoSENTLoss(model)
+    if matryoshka_dimensions:
+        # the loss is computed on each of the truncated embeddings as well, so that their leading components alone
+        # carry most of the semantics and the embeddings can be truncated at indexing and query time
+        loss = MatryoshkaLoss(model, loss, matryoshka_dims=matryoshka_dimensions)
 
     finetuning_args = SentenceTransformerTrainingArguments(output_dir=os.path.dirname(settings["embedding_model_path"]),
                                                            **settings["embedding_model_finetuning_parameters"])
@@ -27,6 +59,37 @@ def finetune_embedding_model(settings):
 
     model.save_pretrained(settings["embedding_model_path"])
 
+    if held_out_dataset is not None:
+        report = produce_dimension_report(model, held_out_dataset, matryoshka_dimensions)
+        with open(os.path.join(settings["embedding_model_path"], DIMENSION_REPORT_FILE_NAME), "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Recall of the fine-tuned model by embedding dimension: {report}")
+
+
+def produce_dimension_report(model, held_out_dataset, dimensions, top_k=10):
+    """
+    Measures the retrieval quality of the given model truncated to each of the given dimensions on the held-out pairs:
+    the first sentence of each relevant pair is used as a query whose relevant document is its second sentence, and
+    the second sentences of all the held-out pairs form the searched documents.
+    """
+    held_out_dataset = held_out_dataset.select(range(min(len(held_out_dataset), MAX_HELD_OUT_PAIRS)))
+    query_column, document_column = held_out_dataset.column_names[:2]
+    score_column = "score" if "score" in held_out_dataset.column_names else held_out_dataset.column_names[-1]
+
+    documents = held_out_dataset[document_column]
+    scores = held_out_dataset[score_column]
+    relevant_pairs = [i for i, score in enumerate(scores) if score >= HELD_OUT_POSITIVE_SCORE_FRACTION * max(scores)]
+    if not relevant_pairs:
+        return {}
+    queries = [held_out_dataset[query_column][i] for i in relevant_pairs]
+
+    # the truncation is applied to the full embeddings, so the model is queried only once
+    query_embeddings = model.encode(queries)
+    document_embeddings = model.encode(documents)
+    report = measure_recall_by_dimension(query_embeddings, document_embeddings, dimensions,
+                                         relevant_document_indices=relevant_pairs, top_k=top_k)
+    return {"num_queries": len(queries), "num_documents": len(documents), "dimensions": report}
+
 
 def load_dataset_from_source(data_source: Union[str, Dict[str, list]], subset: str = None) -> Dataset:
     if isinstance(data_source, str):
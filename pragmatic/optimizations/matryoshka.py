@@ -0,0 +1,55 @@
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def truncate_and_normalize(embeddings, dimension=None):
+    """
+    Keeps the leading dimension components of the given embeddings (all of them if None) and rescales the truncated
+    embeddings to unit length, as done for the embeddings of a Matryoshka model at indexing and query time.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dimension is not None:
+        embeddings = embeddings[:, :dimension]
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def _find_top_k(query_embeddings, document_embeddings, top_k):
+    scores = query_embeddings @ document_embeddings.T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+def measure_recall_by_dimension(query_embeddings, document_embeddings, dimensions, relevant_document_indices=None,
+                                top_k=10):
+    """
+    Measures the retrieval quality of the given full-dimensional embeddings truncated to each of the given dimensions.
+
+    For each dimension, reports the overlap of the top_k documents of every query with its top_k documents found with
+    the full embeddings and, if the index of the relevant document of every query is given, the recall@top_k, i.e.,
+    the fraction of the queries whose relevant document is among their top_k documents. The memory of the vectors
+    relative to the full dimension is reported as well.
+    """
+    full_dimension = len(document_embeddings[0])
+    actual_top_k = min(top_k, len(document_embeddings))
+    full_neighbors = _find_top_k(truncate_and_normalize(query_embeddings), truncate_and_normalize(document_embeddings),
+                                 actual_top_k)
+
+    report = {}
+    for dimension in sorted(set(dimensions), reverse=True):
+        if dimension > full_dimension:
+            raise ValueError(f"Cannot truncate {full_dimension}-dimensional embeddings to {dimension} dimensions")
+        neighbors = _find_top_k(truncate_and_normalize(query_embeddings, dimension),
+                                truncate_and_normalize(document_embeddings, dimension), actual_top_k)
+        dimension_report = {
+            "relative_memory": dimension / full_dimension,
+            f"overlap@{actual_top_k}": float(np.mean([len(set(current.tolist()) & set(full.tolist())) / actual_top_k
+                                                       for current, full in zip(neighbors, full_neighbors)])),
+        }
+        if relevant_document_indices is not None:
+            dimension_report[f"recall@{actual_top_k}"] = float(np.mean(
+                [relevant_index in current.tolist()
+                 for current, relevant_index in zip(neighbors, relevant_document_indices)]))
+        report[dimension] = dimension_report
+    return report
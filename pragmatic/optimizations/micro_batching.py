@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher(object):
+    """
+    Coalesces the items submitted concurrently from multiple threads into batches processed by a single call of
+    process_batch, which receives a list of items and returns the list of their results in the same order.
+
+    A batch is dispatched once max_batch_size items are pending or window seconds after its first item arrived,
+    whichever happens first, so that a submitted item waits at most window seconds (plus the processing of the
+    preceding batch) before being processed. The items arriving while a batch is processed form the next batch.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, window=0.005, name="micro-batcher"):
+        self._process_batch = process_batch
+        self._max_batch_size = max_batch_size
+        self._window = window
+        self._name = name
+
+        self._condition = Condition()
+        self._pending = []
+        self._thread = None
+
+        self._stats_lock = Lock()
+        self._num_batches = 0
+        self._num_items = 0
+
+    def submit(self, item):
+        """
+        Blocks until the batch containing the given item is processed and returns the result of the item. An exception
+        raised while processing the batch is re-raised in all the threads whose items it contained.
+        """
+        future = Future()
+        with self._condition:
+            if self._thread is None:
+                self._thread = Thread(target=self._dispatch_batches, name=self._name, daemon=True)
+                self._thread.start()
+            self._pending.append((item, future))
+            self._condition.notify()
+        return future.result()
+
+    def _collect_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = time.monotonic() + self._window
+            while len(self._pending) < self._max_batch_size:
+                remaining_time = deadline - time.monotonic()
+                if remaining_time <= 0:
+                    break
+                self._condition.wait(remaining_time)
+            batch = self._pending[:self._max_batch_size]
+            del self._pending[:self._max_batch_size]
+            return batch
+
+    def _dispatch_batches(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                results = self._process_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} results, got {len(results)}")
+            except Exception as e:
+                logger.debug(f"Failed to process a batch of {len(batch)} items: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._num_batches += 1
+                self._num_items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self._num_batches,
+                "items": self._num_items,
+                "mean_batch_size": self._num_items / self._num_batches if self._num_batches > 0 else 0.0,
+            }
@@ -0,0 +1,103 @@
+import re
+import urllib.request
+from threading import Lock
+from urllib.parse import urlsplit, urlunsplit
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the counters of vLLM V1 and the hit rate gauge of vLLM V0
+VLLM_PREFIX_CACHE_QUERIES_METRIC = "vllm:prefix_cache_queries_total"
+VLLM_PREFIX_CACHE_HITS_METRIC = "vllm:prefix_cache_hits_total"
+VLLM_PREFIX_CACHE_HIT_RATE_METRIC = "vllm:gpu_prefix_cache_hit_rate"
+
+
+def _get_field(obj, name):
+    # the usage is either a plain dictionary or an object of the OpenAI client (possibly nested in a dictionary)
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def get_prompt_token_usage(usage):
+    """
+    Returns the number of the prompt tokens and the number of those served from the prefix cache, as reported in the
+    usage of an OpenAI-compatible completion. The latter is None if the server does not report it (vLLM does so when
+    started with --enable-prompt-tokens-details).
+    """
+    prompt_tokens = _get_field(usage, "prompt_tokens")
+    cached_tokens = _get_field(_get_field(usage, "prompt_tokens_details"), "cached_tokens")
+    return prompt_tokens, cached_tokens
+
+
+class PrefixCacheStats(object):
+    """
+    Accumulates the prompt tokens and the prompt tokens served from the prefix cache of the LLM server over the
+    completions whose usage reports them.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._num_completions = 0
+        self._num_reported_completions = 0
+        self._prompt_tokens = 0
+        self._cached_prompt_tokens = 0
+
+    def record(self, llm_result):
+        # the choices of a single completion share its usage
+        meta = (llm_result.get("meta") or [{}])[0] if isinstance(llm_result, dict) else {}
+        prompt_tokens, cached_tokens = get_prompt_token_usage(meta.get("usage"))
+        with self._lock:
+            self._num_completions += 1
+            if prompt_tokens is not None and cached_tokens is not None:
+                self._num_reported_completions += 1
+                self._prompt_tokens += prompt_tokens
+                self._cached_prompt_tokens += cached_tokens
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "completions": self._num_completions,
+                "reported_completions": self._num_reported_completions,
+                "prompt_tokens": self._prompt_tokens,
+                "cached_prompt_tokens": self._cached_prompt_tokens,
+                "hit_rate": self._cached_prompt_tokens / self._prompt_tokens if self._prompt_tokens > 0 else None,
+            }
+
+
+def _parse_metric_values(metrics_text, metric_name):
+    pattern = re.compile(rf"^{re.escape(metric_name)}(?:{{[^}}]*}})?\s+(\S+)", re.MULTILINE)
+    return [float(value) for value in pattern.findall(metrics_text)]
+
+
+def fetch_vllm_prefix_cache_metrics(llm_base_url, timeout=5):
+    """
+    Reads the prefix cache metrics from the Prometheus endpoint of the vLLM server behind the given OpenAI API base URL
+    (e.g., http://vllm-service:8000/v1). Returns the numbers of the queried and the hit tokens (vLLM V1) or the hit
+    rate alone (vLLM V0), or None if the metrics are not available.
+    """
+    parts = urlsplit(llm_base_url)
+    path = parts.path.rstrip("/")
+    if path.endswith("/v1"):
+        path = path[:-len("/v1")]
+    metrics_url = urlunsplit((parts.scheme, parts.netloc, f"{path}/metrics", "", ""))
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=timeout) as response:
+            metrics_text = response.read().decode("utf-8")
+    except Exception as e:
+        logger.debug(f"Failed to read the metrics of the LLM server from {metrics_url}: {e}")
+        return None
+
+    queries = _parse_metric_values(metrics_text, VLLM_PREFIX_CACHE_QUERIES_METRIC)
+    hits = _parse_metric_values(metrics_text, VLLM_PREFIX_CACHE_HITS_METRIC)
+    if queries and hits:
+        # summed over the label sets, e.g., the models or the engines of the server
+        return {"queried_tokens": sum(queries), "hit_tokens": sum(hits),
+                "hit_rate": sum(hits) / sum(queries) if sum(queries) > 0 else None}
+    hit_rates = _parse_metric_values(metrics_text, VLLM_PREFIX_CACHE_HIT_RATE_METRIC)
+    if hit_rates:
+        return {"hit_rate": sum(hit_rates) / len(hit_rates)}
+    return None
@@ -0,0 +1,223 @@
+import math
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_PRECISIONS = ["int8", "binary"]
+DEFAULT_RESCORE_OVERSAMPLING = 4
+
+# the number of matrix rows converted to float32 at once when scoring a compressed matrix
+SCORING_BLOCK_SIZE = 4096
+
+# the number of set bits of every byte value, used to compute the Hamming distances of binary embeddings
+_BIT_COUNTS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _verify_precision(precision):
+    if precision not in QUANTIZATION_PRECISIONS:
+        raise ValueError(f"Unsupported quantization precision: {precision}, "
+                         f"use one of {QUANTIZATION_PRECISIONS}")
+
+
+def get_quantized_dimension(dimension, precision):
+    """
+    Returns the number of bytes of a single quantized embedding of the given dimension.
+    """
+    _verify_precision(precision)
+    return dimension if precision == "int8" else math.ceil(dimension / 8)
+
+
+def compute_quantization_ranges(embeddings, precision):
+    """
+    Computes the per-dimension [minimum, maximum] ranges the int8 quantization maps to its 256 levels, as a [2,
+    dimension] matrix. Binary quantization only keeps the signs of the components and requires no ranges (None).
+    """
+    _verify_precision(precision)
+    if precision != "int8":
+        return None
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return np.stack([embeddings.min(axis=0), embeddings.max(axis=0)])
+
+
+def _get_int8_steps(ranges):
+    steps = (ranges[1] - ranges[0]) / 255
+    return np.where(steps > 0, steps, 1).astype(np.float32)
+
+
+def quantize_embeddings(embeddings, precision, ranges=None):
+    """
+    Quantizes the given embeddings to int8 (one byte per component, scaled to the given ranges, the values outside
+    of which are clipped) or to binary (one bit per component keeping its sign, packed into bytes).
+    """
+    _verify_precision(precision)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if precision == "binary":
+        return np.packbits(embeddings > 0, axis=-1)
+
+    levels = np.rint((embeddings - ranges[0]) / _get_int8_steps(ranges)) - 128
+    return np.clip(levels, -128, 127).astype(np.int8)
+
+
+def compute_quantized_scores(quantized, query_embeddings, precision, ranges=None):
+    """
+    Returns the [number of embeddings, number of queries] matrix of the approximate dot products of the quantized
+    embeddings with the full-precision query embeddings. For binary embeddings, these are the dot products of the
+    component signs of both sides (the number of dimensions minus twice their Hamming distance).
+    """
+    _verify_precision(precision)
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    count = quantized.shape[0]
+    scores = np.empty((count, query_embeddings.shape[0]), dtype=np.float32)
+
+    if precision == "binary":
+        num_bits = quantized.shape[1] * 8
+        query_bits = np.packbits(query_embeddings > 0, axis=-1)
+        for query_index, query in enumerate(query_bits):
+            for block_start in range(0, count, SCORING_BLOCK_SIZE):
+                block_end = min(block_start + SCORING_BLOCK_SIZE, count)
+                distances = _BIT_COUNTS[np.bitwise_xor(quantized[block_start:block_end], query)].sum(axis=1,
+                                                                                                    dtype=np.int32)
+                scores[block_start:block_end, query_index] = num_bits - 2 * distances
+        return scores
+
+    # the embeddings are approximated by minimum + (level + 128) * step, so that the level products only have to be
+    # scaled by the steps of the query components and shifted by a constant per query
+    steps = _get_int8_steps(ranges)
+    scaled_queries = query_embeddings * steps
+    offsets = query_embeddings @ (ranges[0] + 128 * steps)
+    for block_start in range(0, count, SCORING_BLOCK_SIZE):
+        block_end = min(block_start + SCORING_BLOCK_SIZE, count)
+        scores[block_start:block_end] = quantized[block_start:block_end].astype(np.float32) @ scaled_queries.T + offsets
+    return scores
+
+
+def compute_exact_scores(embeddings, query_embeddings):
+    """
+    Returns the [number of embeddings, number of queries] matrix of the dot products in float32.
+    """
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    count = embeddings.shape[0]
+    if embeddings.dtype == np.float32:
+        return embeddings @ query_embeddings.T
+
+    # NumPy has no BLAS-backed float16 matrix product, so the matrix is converted block by block
+    scores = np.empty((count, query_embeddings.shape[0]), dtype=np.float32)
+    for block_start in range(0, count, SCORING_BLOCK_SIZE):
+        block_end = min(block_start + SCORING_BLOCK_SIZE, count)
+        scores[block_start:block_end] = embeddings[block_start:block_end].astype(np.float32) @ query_embeddings.T
+    return scores
+
+
+def select_top_rows(scores, top_k):
+    """
+    Returns the indices of the top_k highest scores, ordered from the highest one.
+    """
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top_rows = np.argpartition(-scores, top_k - 1)[:top_k]
+    return top_rows[np.argsort(-scores[top_rows], kind="stable")]
+
+
+def rescore_top_rows(embeddings, approximate_scores, query_embedding, top_k,
+                     rescore_oversampling=DEFAULT_RESCORE_OVERSAMPLING):
+    """
+    Selects the top_k rows for a query given the approximate scores of all the rows (-inf for the excluded ones).
+
+    If rescore_oversampling is set, the top_k * rescore_oversampling rows with the best approximate scores are
+    rescored with their full-precision embeddings, and the best top_k of them are returned with their exact scores.
+    Only these candidate rows of the embedding matrix are read, so a memory-mapped matrix mostly stays on disk.
+    Otherwise, the rows are returned with their approximate scores.
+    """
+    num_rows = int(np.isfinite(approximate_scores).sum())
+    top_k = min(top_k, num_rows)
+    if rescore_oversampling is None:
+        top_rows = select_top_rows(approximate_scores, top_k)
+        return top_rows, approximate_scores[top_rows]
+
+    num_candidates = min(max(top_k, math.ceil(top_k * rescore_oversampling)), num_rows)
+    # the candidates are read in the order of the rows, which keeps the reads of a memory-mapped matrix sequential
+    candidate_rows = np.sort(select_top_rows(approximate_scores, num_candidates))
+    exact_scores = embeddings[candidate_rows].astype(np.float32) @ np.asarray(query_embedding, dtype=np.float32)
+    top_candidates = select_top_rows(exact_scores, top_k)
+    return candidate_rows[top_candidates], exact_scores[top_candidates]
+
+
+def estimate_quantization_memory(num_vectors, dimension, precision, full_precision_itemsize=4):
+    """
+    Compares the size of the full-precision vectors with the size of their quantized counterparts.
+    """
+    full_precision_bytes = num_vectors * dimension * full_precision_itemsize
+    quantized_bytes = num_vectors * get_quantized_dimension(dimension, precision)
+    return {
+        "full_precision_bytes": full_precision_bytes,
+        "quantized_bytes": quantized_bytes,
+        "memory_saved_bytes": full_precision_bytes - quantized_bytes,
+        "memory_saved_fraction": 1 - quantized_bytes / full_precision_bytes if full_precision_bytes else 0.0,
+    }
+
+
+def measure_quantization_recall(embeddings, precision, top_k=10, rescore_oversampling=DEFAULT_RESCORE_OVERSAMPLING,
+                                num_queries=100, ranges=None, seed=0):
+    """
+    Measures the recall@top_k of the quantized search relative to the exact search over the given (normalized, if the
+    similarity is cosine) embeddings, both with the approximate scores alone and after rescoring the oversampled
+    candidates. A sample of num_queries of the embeddings is used as the queries, each excluding itself from its
+    results. If no ranges are given, the int8 ranges are calibrated on the embeddings.
+    """
+    count = embeddings.shape[0]
+    actual_top_k = min(top_k, count - 1)
+    report = {f"coarse_recall@{top_k}": None, f"rescored_recall@{top_k}": None, f"recall@{top_k}_delta": None}
+    if actual_top_k <= 0:
+        return report
+
+    query_rows = np.sort(np.random.default_rng(seed).choice(count, size=min(num_queries, count), replace=False))
+    query_embeddings = np.asarray(embeddings[query_rows], dtype=np.float32)
+    if ranges is None:
+        ranges = compute_quantization_ranges(embeddings, precision)
+    quantized = quantize_embeddings(embeddings, precision, ranges)
+
+    exact_scores = compute_exact_scores(embeddings, query_embeddings)
+    approximate_scores = compute_quantized_scores(quantized, query_embeddings, precision, ranges)
+    query_indices = np.arange(len(query_rows))
+    exact_scores[query_rows, query_indices] = -np.inf
+    approximate_scores[query_rows, query_indices] = -np.inf
+
+    coarse_recalls, rescored_recalls = [], []
+    for query_index, query_embedding in enumerate(query_embeddings):
+        exact_rows = set(select_top_rows(exact_scores[:, query_index], actual_top_k).tolist())
+        coarse_rows, _ = rescore_top_rows(embeddings, approximate_scores[:, query_index], query_embedding,
+                                          actual_top_k, rescore_oversampling=None)
+        rescored_rows, _ = rescore_top_rows(embeddings, approximate_scores[:, query_index], query_embedding,
+                                            actual_top_k, rescore_oversampling=rescore_oversampling)
+        coarse_recalls.append(len(exact_rows & set(coarse_rows.tolist())) / actual_top_k)
+        rescored_recalls.append(len(exact_rows & set(rescored_rows.tolist())) / actual_top_k)
+
+    # the exact search has a recall of 1 by definition, so the difference is the recall lost by the quantization
+    rescored_recall = float(np.mean(rescored_recalls))
+    report.update({f"coarse_recall@{top_k}": float(np.mean(coarse_recalls)),
+                   f"rescored_recall@{top_k}": rescored_recall,
+                   f"recall@{top_k}_delta": rescored_recall - 1.0})
+    return report
+
+
+def produce_quantization_report(embeddings, precision, num_vectors=None, top_k=10,
+                                rescore_oversampling=DEFAULT_RESCORE_OVERSAMPLING, num_queries=100, ranges=None):
+    """
+    Reports the memory saved by quantizing num_vectors vectors (the given embeddings if None, which may also be a
+    sample of the vectors) and the recall@top_k of the quantized search measured on the given embeddings.
+    """
+    num_vectors = num_vectors if num_vectors is not None else embeddings.shape[0]
+    report = {
+        "precision": precision,
+        "rescore_oversampling": rescore_oversampling,
+        "num_vectors": num_vectors,
+        **estimate_quantization_memory(num_vectors, embeddings.shape[1], precision, embeddings.dtype.itemsize),
+    }
+    if embeddings.shape[0] > 0:
+        report.update(measure_quantization_recall(embeddings, precision, top_k=top_k,
+                                                  rescore_oversampling=rescore_oversampling,
+                                                  num_queries=num_queries, ranges=ranges))
+    return report
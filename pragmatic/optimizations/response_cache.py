@@ -0,0 +1,134 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from weakref import WeakSet
+
+import numpy as np
+
+from pragmatic.optimizations.embedding_cache import normalize_text
+
+_ResponseCacheEntry = namedtuple("_ResponseCacheEntry", ["context_key", "query_embedding", "response", "expires_at"])
+
+
+def compute_context_key(document_ids, run_overrides=None, query=None):
+    """
+    Produces the key identifying the context of a response: the documents placed in the prompt and the per-run
+    overrides of the settings, which include the generation parameters and the settings shaping the prompt (e.g., the
+    token budget of the context, under which the same documents may be truncated differently). When no query embedding
+    is available (e.g., with sparse retrieval), the normalized query text becomes a part of the key, so that only
+    identical queries can share a response.
+    """
+    context = {
+        "document_ids": list(document_ids),
+        "run_overrides": run_overrides or {},
+        "query": normalize_text(query) if query is not None else None,
+    }
+    return hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _normalize_embedding(embedding):
+    if embedding is None:
+        return None
+    embedding = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm > 0 else embedding
+
+
+class SemanticResponseCache(object):
+    """
+    An in-memory cache of LLM responses. A cached response is returned for a query whose embedding has a cosine
+    similarity of at least similarity_threshold with the embedding of the cached query and whose context key (see
+    compute_context_key) is identical to that of the cached query.
+
+    The entries expire ttl seconds after being stored (never if ttl is None). Beyond max_entries entries, the least
+    recently used ones are evicted.
+    """
+
+    def __init__(self, similarity_threshold, ttl, max_entries):
+        self._similarity_threshold = similarity_threshold
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = Lock()
+
+        self._entries = OrderedDict()  # ordered from the least to the most recently used entry
+        self._entry_ids_by_context = {}
+        self._next_entry_id = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _remove_entry(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        context_entry_ids = self._entry_ids_by_context[entry.context_key]
+        context_entry_ids.discard(entry_id)
+        if not context_entry_ids:
+            del self._entry_ids_by_context[entry.context_key]
+
+    def lookup(self, context_key, query_embedding=None):
+        """
+        Returns the cached response matching the given query embedding and context, or None on a cache miss.
+        """
+        query_embedding = _normalize_embedding(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_entry_id = None
+            best_similarity = -np.inf
+            for entry_id in list(self._entry_ids_by_context.get(context_key, ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at is not None and entry.expires_at <= now:
+                    self._remove_entry(entry_id)
+                    continue
+                if query_embedding is None or entry.query_embedding is None:
+                    similarity = 1.0 if query_embedding is None and entry.query_embedding is None else -np.inf
+                else:
+                    similarity = float(np.dot(query_embedding, entry.query_embedding))
+                if similarity >= self._similarity_threshold and similarity > best_similarity:
+                    best_entry_id, best_similarity = entry_id, similarity
+
+            if best_entry_id is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(best_entry_id)
+            return self._entries[best_entry_id].response
+
+    def store(self, context_key, query_embedding, response):
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        entry = _ResponseCacheEntry(context_key, _normalize_embedding(query_embedding), response, expires_at)
+        with self._lock:
+            entry_id = self._next_entry_id
+            self._next_entry_id += 1
+            self._entries[entry_id] = entry
+            self._entry_ids_by_context.setdefault(context_key, set()).add(entry_id)
+            while len(self._entries) > self._max_entries:
+                self._remove_entry(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._entry_ids_by_context.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+# the response caches of the live RAG pipelines, grouped by the document store they answer from
+_response_caches = {}
+_response_caches_lock = Lock()
+
+
+def register_response_cache(document_store_id, response_cache):
+    with _response_caches_lock:
+        _response_caches.setdefault(document_store_id, WeakSet()).add(response_cache)
+
+
+def invalidate_response_caches(document_store_id):
+    """
+    Clears the response caches of all the RAG pipelines in this process that answer from the given document store.
+    """
+    with _response_caches_lock:
+        response_caches = list(_response_caches.get(document_store_id, ()))
+    for response_cache in response_caches:
+        response_cache.clear()
@@ -0,0 +1,21 @@
+from threading import Lock
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tokenizers = {}
+_tokenizers_lock = Lock()
+
+
+def get_shared_tokenizer(model_id):
+    """
+    Returns the Hugging Face tokenizer of the given model. The tokenizer is loaded once per process and shared by all
+    the components requesting it.
+    """
+    with _tokenizers_lock:
+        if model_id not in _tokenizers:
+            from transformers import AutoTokenizer
+            _tokenizers[model_id] = AutoTokenizer.from_pretrained(model_id)
+            logger.debug(f"Loaded the tokenizer of {model_id}")
+        return _tokenizers[model_id]
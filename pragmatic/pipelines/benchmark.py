@@ -0,0 +1,327 @@
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from threading import Lock
+
+import numpy as np
+
+from pragmatic.pipelines.stub_llm import StubLLMServer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the pipeline components whose execution times are reported under each stage
+INDEXING_STAGES = {
+    "converter": "conversion",
+    "cleaner": "cleaning",
+    "splitter": "chunking",
+    "embedder": "embedding",
+    "writer": "writing",
+    "sparse_indexer": "sparse_indexing",
+}
+QUERY_STAGES = {
+    "embedder": "embed",
+    "retriever": "retrieve",
+    "sparse_retriever": "retrieve",
+    "dense_retriever": "retrieve",
+    "document_joiner": "retrieve",
+    "ranker": "rerank",
+    "prompt_builder": "prompt_build",
+    "llm": "generate",
+}
+
+# the settings describing the benchmarked configuration, included in the report
+REPORTED_SETTINGS = [
+    "vector_db_type",
+    "retriever_type",
+    "embedding_model_path",
+    "embedding_backend",
+    "embedding_model_precision",
+    "chunking_method",
+    "max_tokens_per_chunk",
+    "milvus_index_type",
+    "milvus_metric_type",
+    "top_k",
+    "ranker_enabled",
+    "ranker_backend",
+    "ranking_model",
+    "indexing_num_workers",
+]
+
+SYNTHETIC_TOPICS = {
+    "installation": ["install", "package", "binary", "download", "archive", "path", "version", "macos", "linux"],
+    "networking": ["route", "ingress", "service", "port", "dns", "proxy", "certificate", "endpoint", "traffic"],
+    "storage": ["volume", "claim", "snapshot", "backup", "disk", "capacity", "filesystem", "replica", "mount"],
+    "monitoring": ["metric", "alert", "dashboard", "scrape", "latency", "threshold", "exporter", "log", "trace"],
+    "security": ["role", "binding", "secret", "token", "policy", "audit", "permission", "scanner", "identity"],
+    "scheduling": ["node", "pod", "affinity", "taint", "toleration", "quota", "priority", "eviction", "resource"],
+}
+SYNTHETIC_FILLER_WORDS = ["the", "a", "cluster", "operator", "configure", "when", "each", "with", "after", "before",
+                          "default", "requires", "update", "command", "option", "value", "using", "between"]
+
+
+def generate_synthetic_corpus(output_dir, num_documents, paragraphs_per_document, seed=0):
+    """
+    Writes num_documents Docling JSON documents of technical-looking text into output_dir, the format expected by the
+    default indexing settings. Returns the paths of the written files.
+    """
+    from docling_core.types import DoclingDocument
+    from docling_core.types.doc import DocItemLabel
+
+    rng = random.Random(seed)
+    topics = list(SYNTHETIC_TOPICS)
+    os.makedirs(output_dir, exist_ok=True)
+    file_paths = []
+    for doc_index in range(num_documents):
+        topic = topics[doc_index % len(topics)]
+        document = DoclingDocument(name=f"synthetic_{doc_index}")
+        document.add_heading(text=f"{topic.capitalize()} guide {doc_index}", level=1)
+        for paragraph_index in range(paragraphs_per_document):
+            if paragraph_index % 5 == 0:
+                document.add_heading(text=f"{topic.capitalize()} section {paragraph_index // 5}", level=2)
+            words = [rng.choice(SYNTHETIC_TOPICS[topic]) if rng.random() < 0.4 else rng.choice(SYNTHETIC_FILLER_WORDS)
+                     for _ in range(rng.randint(20, 50))]
+            document.add_text(label=DocItemLabel.PARAGRAPH, text=" ".join(words).capitalize() + ".")
+        file_path = os.path.join(output_dir, f"synthetic_{doc_index}.json")
+        with open(file_path, "w") as output_file:
+            output_file.write(document.model_dump_json())
+        file_paths.append(file_path)
+    return file_paths
+
+
+def sample_queries(documents, num_queries, seed=0):
+    """
+    Produces keyword queries from random words of random documents, so that every query has relevant documents.
+    """
+    rng = random.Random(seed)
+    contents = [doc.content for doc in documents if doc.content]
+    if not contents:
+        raise ValueError("Cannot sample benchmark queries from an empty collection")
+    queries = []
+    for _ in range(num_queries):
+        words = [word for word in re.findall(r"[A-Za-z]{4,}", rng.choice(contents))]
+        queries.append("How to " + " ".join(rng.sample(words, min(len(words), 6))) + "?")
+    return queries
+
+
+def summarize_latencies(latencies):
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "max_ms": round(float(latencies_ms.max()), 3),
+    }
+
+
+def summarize_throughput(seconds, num_documents, num_chunks):
+    return {
+        "seconds": round(seconds, 4),
+        "docs_per_second": round(num_documents / seconds, 3) if seconds > 0 else None,
+        "chunks_per_second": round(num_chunks / seconds, 3) if seconds > 0 else None,
+    }
+
+
+class StageTimer(object):
+    """
+    Accumulates the execution times of the pipeline components by wrapping their run methods. The times of the
+    components are aggregated into stages, and the accumulated times can be collected and reset at any moment.
+    """
+
+    def __init__(self):
+        self._durations = defaultdict(float)
+        self._lock = Lock()
+
+    def instrument(self, pipeline, component_stages):
+        for component_name, stage in component_stages.items():
+            if component_name in pipeline.graph.nodes:
+                self._wrap_run(pipeline.get_component(component_name), stage)
+
+    def _wrap_run(self, component_obj, stage):
+        original_run = component_obj.run
+
+        def timed_run(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return original_run(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._durations[stage] += time.perf_counter() - start_time
+
+        # the instance attribute shadows the class method, which is the one invoked by the pipeline wrappers
+        component_obj.run = timed_run
+
+    def collect(self):
+        with self._lock:
+            durations = dict(self._durations)
+            self._durations.clear()
+        return durations
+
+
+class Benchmark(object):
+    """
+    Measures the throughput of the indexing stages and the latency percentiles of the query stages on a synthetic
+    (or a given) corpus. The documents are indexed into a temporary Milvus Lite collection (or a temporary in-process
+    store, when vector_db_type is mmap) and the queries are answered by a local stub LLM, so that the results only
+    reflect the performance of the pipeline itself.
+    """
+
+    def __init__(self, settings):
+        self._settings = settings
+
+    def _produce_benchmark_settings(self, work_dir, llm_base_url):
+        settings = dict(self._settings)
+        settings.update({
+            "milvus_deployment_type": "lite",
+            "milvus_file_path": os.path.join(work_dir, "milvus.db"),
+            "milvus_drop_old_collection": True,
+            "mmap_store_path": os.path.join(work_dir, "vector_store"),
+            "bm25_index_path": os.path.join(work_dir, "bm25_index"),
+            "embedding_profile_path": os.path.join(work_dir, "embedding_profiles.json"),
+            "incremental_indexing": False,
+            "indexing_batch_size": None,
+            # the caches would hide the cost of the stages they skip
+            "embedding_cache_enabled": False,
+            "response_cache_enabled": False,
+            "enable_response_streaming": False,
+            "llm_base_url": llm_base_url,
+        })
+        if settings["retriever_type"] in ["sparse", "hybrid"]:
+            settings["bm25_index_enabled"] = True
+        if self._settings["bench_corpus_path"] is None:
+            # the synthetic corpus consists of Docling JSON documents to be chunked by the DoclingDocumentSplitter
+            settings.update({
+                "input_document_formats": ["json"],
+                "apply_docling": False,
+                "chunking_enabled": True,
+                "chunking_method": "docling",
+                "converted_docling_document_format": "json",
+            })
+        return settings
+
+    def _produce_environment_report(self):
+        import torch
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+        }
+
+    def _run_indexing(self, settings, corpus_path):
+        from pragmatic.pipelines.indexing import LocalFileIndexingPipelineWrapper
+
+        pipeline = LocalFileIndexingPipelineWrapper(settings, corpus_path)
+        pipeline.build_pipeline()
+
+        start_time = time.perf_counter()
+        pipeline.warm_up()
+        warm_up_seconds = time.perf_counter() - start_time
+
+        timer = StageTimer()
+        timer.instrument(pipeline.get_pipeline(), INDEXING_STAGES)
+        start_time = time.perf_counter()
+        result = pipeline.run()
+        total_seconds = time.perf_counter() - start_time
+
+        num_documents = len(pipeline.get_source_files())
+        num_chunks = result.get("writer", {}).get("documents_written", 0)
+        stage_durations = timer.collect()
+        report = {
+            "documents": num_documents,
+            "chunks": num_chunks,
+            "warm_up_seconds": round(warm_up_seconds, 4),
+            "stages": {stage: summarize_throughput(stage_durations[stage], num_documents, num_chunks)
+                       for stage in dict.fromkeys(INDEXING_STAGES.values()) if stage in stage_durations},
+            "total": summarize_throughput(total_seconds, num_documents, num_chunks),
+        }
+        if settings["indexing_num_workers"] > 1:
+            report["note"] = "the conversion stage includes the cleaning and the chunking done by the worker processes"
+        return report, pipeline.get_document_store().filter_documents()
+
+    def _run_queries(self, settings, queries):
+        from pragmatic.pipelines.rag import RagPipelineWrapper
+
+        pipeline = RagPipelineWrapper(settings)
+        pipeline.build_pipeline()
+        start_time = time.perf_counter()
+        pipeline.warm_up()
+        warm_up_seconds = time.perf_counter() - start_time
+
+        timer = StageTimer()
+        timer.instrument(pipeline.get_pipeline(), QUERY_STAGES)
+        stage_latencies = defaultdict(list)
+        total_latencies = []
+        num_warm_up_queries = settings["bench_warm_up_queries"]
+        for query_index, query in enumerate(queries):
+            start_time = time.perf_counter()
+            pipeline.run(query)
+            total_latency = time.perf_counter() - start_time
+            stage_durations = timer.collect()
+            if query_index < num_warm_up_queries:
+                continue
+            total_latencies.append(total_latency)
+            for stage, duration in stage_durations.items():
+                stage_latencies[stage].append(duration)
+
+        return {
+            "queries": len(total_latencies),
+            "warm_up_queries": min(num_warm_up_queries, len(queries)),
+            "warm_up_seconds": round(warm_up_seconds, 4),
+            "stages": {stage: summarize_latencies(stage_latencies[stage])
+                       for stage in dict.fromkeys(QUERY_STAGES.values()) if stage in stage_latencies},
+            "total": summarize_latencies(total_latencies),
+        }
+
+    def run(self):
+        """
+        Executes the benchmark and returns a JSON-serializable report. The report is also written to
+        bench_output_path if it is set.
+        """
+        work_dir = tempfile.mkdtemp(prefix="pragmatic-bench-")
+        try:
+            corpus_path = self._settings["bench_corpus_path"]
+            if corpus_path is None:
+                corpus_path = os.path.join(work_dir, "corpus")
+                generate_synthetic_corpus(corpus_path, self._settings["bench_num_documents"],
+                                          self._settings["bench_paragraphs_per_document"],
+                                          seed=self._settings["bench_seed"])
+
+            with StubLLMServer(response_tokens=self._settings["bench_stub_llm_response_tokens"],
+                               token_latency=self._settings["bench_stub_llm_token_latency"]) as llm_server:
+                settings = self._produce_benchmark_settings(work_dir, llm_server.get_base_url())
+                logger.info(f"Benchmarking the indexing of {corpus_path}")
+                indexing_report, indexed_documents = self._run_indexing(settings, corpus_path)
+
+                num_queries = settings["bench_num_queries"] + settings["bench_warm_up_queries"]
+                queries = sample_queries(indexed_documents, num_queries, seed=settings["bench_seed"])
+                logger.info(f"Benchmarking {len(queries)} queries")
+                query_report = self._run_queries(settings, queries)
+
+            report = {
+                "environment": self._produce_environment_report(),
+                "settings": {key: settings[key] for key in REPORTED_SETTINGS},
+                "corpus": {"path": self._settings["bench_corpus_path"] or "synthetic",
+                           "documents": indexing_report["documents"],
+                           "chunks": indexing_report["chunks"]},
+                "indexing": indexing_report,
+                "query": query_report,
+            }
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if self._settings["bench_output_path"] is not None:
+            with open(self._settings["bench_output_path"], "w") as output_file:
+                json.dump(report, output_file, indent=2, default=str)
+        return report
@@ -0,0 +1,143 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from pragmatic.pipelines.rag import RagPipelineWrapper
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RagQueryEngine(object):
+    """
+    A long-lived RAG query engine. The underlying pipeline is built and warmed up exactly once, so that the embedding
+    and ranking models, the document store connection and the LLM client are shared by all subsequent queries.
+
+    The engine can be used concurrently from multiple threads. Each query is executed with its own set of pipeline
+    arguments, hence per-query values (e.g., top_k or llm_temperature) never leak between concurrent queries.
+    The engine can also be used from an asyncio event loop via arun and astream.
+    """
+
+    def __init__(self, settings):
+        self._settings = settings
+        self._rag_pipeline = RagPipelineWrapper(settings, max_concurrent_runs=settings["max_concurrent_queries"])
+        self._warm_up_lock = Lock()
+        self._is_warm = False
+
+        # the blocking stages of asynchronously executed queries (embedding, retrieval, ranking) run in this executor
+        self._executor = ThreadPoolExecutor(max_workers=settings["max_concurrent_queries"],
+                                            thread_name_prefix="rag-query-engine")
+
+    def warm_up(self):
+        """
+        Builds the pipeline and loads all the models it requires. Safe to call multiple times.
+        """
+        with self._warm_up_lock:
+            if self._is_warm:
+                return
+            logger.info("Building and warming up the RAG query pipeline")
+            self._rag_pipeline.build_pipeline()
+            self._rag_pipeline.warm_up()
+            self._is_warm = True
+
+    def is_warm(self):
+        return self._is_warm
+
+    def get_settings(self):
+        return self._settings
+
+    def run(self, query, **overrides):
+        """
+            Answers a single query using the warm pipeline.
+
+            Parameters:
+                query (str): The input query string to be processed.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline, such as
+                           top_k or llm_temperature.
+
+            Returns:
+                str | StreamedResponse: A string when enable_response_streaming is False or an iterator when enable_response_streaming is True.
+        """
+        self.warm_up()
+        return self._rag_pipeline.run(query, **overrides)
+
+    def run_batch(self, queries, batch_size=None, **overrides):
+        """
+            Answers a list of queries using the warm pipeline. The queries are embedded and retrieved in batches and
+            the resulting prompts are sent to the LLM concurrently.
+
+            Parameters:
+                queries (list): The input query strings to be processed.
+                batch_size (int, optional): The number of queries to embed and retrieve at once.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                list: The responses in the order of the input queries.
+        """
+        self.warm_up()
+        return self._rag_pipeline.run_batch(queries, batch_size=batch_size, **overrides)
+
+    async def _async_warm_up(self):
+        if not self._is_warm:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.warm_up)
+
+    async def arun(self, query, **overrides):
+        """
+            Asynchronously answers a single query without blocking the event loop.
+
+            Parameters:
+                query (str): The input query string to be processed.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                str: The final response.
+        """
+        await self._async_warm_up()
+        return await self._rag_pipeline.arun(query, executor=self._executor, **overrides)
+
+    async def astream(self, query, **overrides):
+        """
+            Asynchronously answers a single query, yielding the chunks of the response as they arrive from the LLM.
+
+            Parameters:
+                query (str): The input query string to be processed.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                async generator: Yields the chunks of the response.
+        """
+        await self._async_warm_up()
+        async for chunk in self._rag_pipeline.astream(query, executor=self._executor, **overrides):
+            yield chunk
+
+    def get_last_run_metrics(self):
+        """
+        Returns the per-component measurements of the last query completed in the calling thread, if the
+        instrumentation is enabled.
+        """
+        return self._rag_pipeline.get_last_run_metrics()
+
+    def get_prefix_cache_stats(self, include_server_metrics=False):
+        """
+        Returns the share of the prompt tokens served from the prefix cache of the LLM server.
+        """
+        return self._rag_pipeline.get_prefix_cache_stats(include_server_metrics)
+
+    def clear_response_cache(self):
+        """
+        Drops the cached responses, e.g., after the collection was reindexed from another process.
+        """
+        self._rag_pipeline.clear_response_cache()
+
+    def close(self):
+        """
+        Releases the worker threads of the engine.
+        """
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
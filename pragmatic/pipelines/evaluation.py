@@ -1,28 +1,44 @@
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
 
+from pragmatic.pipelines.evaluation_cache import EvaluationScoreCache, compute_key, load_checkpoint
 from pragmatic.pipelines.indexing import LocalFileIndexingPipelineWrapper
+from pragmatic.pipelines.manifest import compute_file_hash
 from pragmatic.pipelines.pipeline import CommonPipelineWrapper
-from haystack_integrations.components.evaluators.ragas import RagasEvaluator
-
 from pragmatic.pipelines.rag import RagPipelineWrapper
 
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the prefixes of the settings that do not affect the answers of the RAG pipeline, and thus the validity of a checkpoint
+NON_ANSWER_SETTING_PREFIXES = ["eval_", "bench_", "server_", "instrumentation_", "max_concurrent_queries"]
+
 
 class RagasEvaluationPipelineWrapper(CommonPipelineWrapper):
 
-    def __init__(self, settings, eval_params):
+    def __init__(self, settings, metric_data):
         super().__init__(settings)
 
         # we assume settings["eval_ragas_metrics"] to contain a dict with two entries:
         # 1) "params" - contains a dict of static parameters for the metric;
         # 2) "required_data" - contains a list of parameters out of 'questions', 'contexts', 'responses' and 'ground truths'
         # specifying the data required for the given metric.
+        # metric_data maps the names of the metrics to evaluate to their required data, which may cover different
+        # subsets of the questions for different metrics.
         self._metric_params = {}
         self._metric_data = {}
         for metric_name, metric_settings in self._settings["eval_ragas_metrics"].items():
+            if metric_name not in metric_data:
+                continue
             self._metric_params[metric_name] = metric_settings["params"]
-            self._metric_data[metric_name] = {key: eval_params[key] for key in metric_settings["required_data"]}
+            self._metric_data[metric_name] = metric_data[metric_name]
 
     def _add_evaluators(self):
+        from haystack_integrations.components.evaluators.ragas import RagasEvaluator
+
         for metric_name in self._metric_params.keys():
             evaluator = RagasEvaluator(metric=metric_name, metric_params=self._metric_params[metric_name])
             self._add_component(f"evaluator_{metric_name}", evaluator, component_args=self._metric_data[metric_name], should_connect=False)
@@ -32,17 +48,35 @@ class RagasEvaluationPipelineWrapper(CommonPipelineWrapper):
 
 
 class Evaluator(object):
+    """
+    Evaluates the RAG pipeline on the questions of eval_questions_answers_path answered from the documents of
+    eval_documents_path.
+
+    The questions are answered by up to eval_max_concurrent_questions concurrent pipeline runs. Each answer is appended
+    to a checkpoint file under eval_checkpoint_path as soon as it is produced, so that an interrupted evaluation
+    resumes from the unanswered questions. A checkpoint is only reused by evaluations with the same settings (apart
+    from those listed in NON_ANSWER_SETTING_PREFIXES) and the same documents. The metric results are cached per item
+    in eval_score_cache_path, and with eval_reuse_index, the documents are indexed incrementally, so that an unchanged
+    document set is not reindexed.
+    """
 
     def __init__(self, settings):
         self._settings = settings
         self._questions, self._ground_truth_answers = self._load_questions_and_answers()
 
-        self._indexing_pipeline = LocalFileIndexingPipelineWrapper(settings, settings["eval_documents_path"])
-        self._rag_pipeline = RagPipelineWrapper(settings, evaluation_mode=True)
+        indexing_settings = dict(settings)
+        if settings["eval_reuse_index"]:
+            indexing_settings["incremental_indexing"] = True
+        self._indexing_pipeline = LocalFileIndexingPipelineWrapper(indexing_settings, settings["eval_documents_path"])
+        self._rag_pipeline = RagPipelineWrapper(settings, evaluation_mode=True,
+                                                max_concurrent_runs=settings["eval_max_concurrent_questions"])
 
         for pipeline in [self._indexing_pipeline, self._rag_pipeline]:
             pipeline.build_pipeline()
 
+        self._score_cache = EvaluationScoreCache(settings["eval_score_cache_path"])
+        self._checkpoint_lock = Lock()
+
     def _load_questions_and_answers(self):
         # for now, we assume the questions & answers file to have this specific format
         with open(self._settings["eval_questions_answers_path"], "r") as f:
@@ -51,15 +85,76 @@ class Evaluator(object):
             answers = data["ground_truths"]
         return questions, answers
 
+    def _get_checkpoint_path(self):
+        if self._settings["eval_checkpoint_path"] is None:
+            return None
+        answer_settings = {key: value for key, value in self._settings.items()
+                           if not any(key.startswith(prefix) for prefix in NON_ANSWER_SETTING_PREFIXES)}
+        document_hashes = {source_file: compute_file_hash(source_file)
+                           for source_file in self._indexing_pipeline.get_source_files()}
+        run_key = compute_key(settings=answer_settings, documents=document_hashes)
+        return os.path.join(self._settings["eval_checkpoint_path"], f"{run_key[:32]}.jsonl")
+
+    def _answer_question(self, question, checkpoint_path):
+        answer = self._rag_pipeline.run(question)
+        context, response = [d.content for d in answer.documents], answer.data
+        if checkpoint_path is not None:
+            with self._checkpoint_lock:
+                with open(checkpoint_path, "a") as f:
+                    f.write(json.dumps({"question": question, "context": context, "response": response}) + "\n")
+        return context, response
+
     def _run_rag_pipeline_on_eval_questions(self):
-        contexts = []
-        responses = []
-        for question in self._questions:
-            response = self._rag_pipeline.run(query=question)
-            contexts.append([d.content for d in response.documents])
-            responses.append(response.data)
+        checkpoint_path = self._get_checkpoint_path()
+        if checkpoint_path is not None:
+            os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        answers = load_checkpoint(checkpoint_path)
+
+        pending_questions = [question for question in dict.fromkeys(self._questions) if question not in answers]
+        logger.info(f"Answering {len(pending_questions)} out of {len(self._questions)} evaluation questions")
+        with ThreadPoolExecutor(max_workers=self._settings["eval_max_concurrent_questions"]) as executor:
+            futures = {executor.submit(self._answer_question, question, checkpoint_path): question
+                       for question in pending_questions}
+            for future in as_completed(futures):
+                answers[futures[future]] = future.result()
+
+        contexts = [answers[question][0] for question in self._questions]
+        responses = [answers[question][1] for question in self._questions]
         return contexts, responses
 
+    def _evaluate_metrics(self, eval_params):
+        """
+        Evaluates the configured metrics on the items whose results are not cached yet and returns the results of all
+        the items in the output format of RagasEvaluationPipelineWrapper.
+        """
+        item_keys = {}
+        missing_keys = {}
+        metric_data = {}
+        for metric_name, metric_settings in self._settings["eval_ragas_metrics"].items():
+            required_data = metric_settings["required_data"]
+            item_keys[metric_name] = [
+                compute_key(metric=metric_name, params=metric_settings["params"],
+                             data={key: eval_params[key][i] for key in required_data})
+                for i in range(len(self._questions))]
+            # the items are deduplicated, e.g., repeated questions with the same answers are only evaluated once
+            missing_items = list({item_key: i for i, item_key in enumerate(item_keys[metric_name])
+                                  if self._score_cache.get(item_key) is None}.values())
+            if missing_items:
+                missing_keys[metric_name] = [item_keys[metric_name][i] for i in missing_items]
+                metric_data[metric_name] = {key: [eval_params[key][i] for i in missing_items] for key in required_data}
+                logger.info(f"Evaluating {metric_name} on {len(missing_items)} out of {len(self._questions)} items")
+
+        if metric_data:
+            eval_pipeline = RagasEvaluationPipelineWrapper(self._settings, metric_data)
+            eval_pipeline.build_pipeline()
+            result = eval_pipeline.run()
+            for metric_name in metric_data:
+                self._score_cache.update(dict(zip(missing_keys[metric_name],
+                                                  result[f"evaluator_{metric_name}"]["results"])))
+
+        return {f"evaluator_{metric_name}": {"results": [self._score_cache.get(item_key) for item_key in keys]}
+                for metric_name, keys in item_keys.items()}
+
     def evaluate_rag_pipeline(self):
         self._indexing_pipeline.run()
 
@@ -71,7 +166,4 @@ class Evaluator(object):
             "responses": responses,
             "ground_truths": self._ground_truth_answers,
         }
-        eval_pipeline = RagasEvaluationPipelineWrapper(self._settings, eval_params)
-        eval_pipeline.build_pipeline()
-
-        return eval_pipeline.run()
+        return self._evaluate_metrics(eval_params)
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compute_key(**values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class EvaluationScoreCache(object):
+    """
+    A persistent cache of the metric results of the individual evaluated items, keyed by the hash of the metric, its
+    parameters and the data of the item (e.g., its question, contexts and response).
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._scores = {}
+        if path is not None and os.path.isfile(path):
+            with open(path, "r") as f:
+                self._scores = json.load(f)
+
+    def get(self, key):
+        return self._scores.get(key)
+
+    def update(self, scores):
+        self._scores.update(scores)
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._scores, f)
+        os.replace(tmp_path, self._path)
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Returns the (contexts, response) answers of the questions recorded in an evaluation checkpoint file, keyed by the
+    question.
+    """
+    answers = {}
+    if checkpoint_path is None or not os.path.isfile(checkpoint_path):
+        return answers
+    with open(checkpoint_path, "r+") as f:
+        lines = f.read().split("\n")
+        # the last line is incomplete if the previous evaluation was interrupted while writing it, and is dropped
+        # so that the next answer is not appended to it
+        f.seek(0)
+        f.truncate(sum(len(line.encode()) + 1 for line in lines[:-1]))
+    for line in lines[:-1]:
+        entry = json.loads(line)
+        answers[entry["question"]] = (entry["context"], entry["response"])
+    logger.info(f"Loaded {len(answers)} answers from the checkpoint {checkpoint_path}")
+    return answers
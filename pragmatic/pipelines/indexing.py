@@ -1,17 +1,48 @@
 import os
+from functools import partial
+
+import numpy as np
+
+import logging
 
-from docling.chunking import HybridChunker
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 from haystack.components.fetchers import LinkContentFetcher
 from haystack.components.converters import HTMLToDocument, TextFileToDocument
 from haystack.components.preprocessors import DocumentSplitter, DocumentCleaner
 from haystack.components.writers import DocumentWriter
 
-from docling_haystack.converter import DoclingConverter, ExportType
+from pragmatic.haystack.background_writer import BackgroundDocumentWriter
+from pragmatic.haystack.bm25_index_writer import BM25IndexWriter
+from pragmatic.haystack.embedders import SentenceTransformersChunkEmbedder, produce_embedding_backend_args, \
+    produce_embedding_cache_args, produce_embedding_dimension_args
+from pragmatic.haystack.indexed_chunk_filter import IndexedChunkFilter
+from pragmatic.haystack.parallel_converter import ParallelFileConverter
+from pragmatic.optimizations.embedding_profile import EMBEDDING_PROBE_TEXTS, load_embedding_profile, \
+    save_embedding_profile, verify_embedding_compatibility
+from pragmatic.optimizations.quantization import produce_quantization_report
+from pragmatic.optimizations.response_cache import invalidate_response_caches
+from pragmatic.optimizations.tokenizers import get_shared_tokenizer
+from pragmatic.pipelines.manifest import IndexingManifest, compute_file_hash
+from pragmatic.pipelines.pipeline import CommonPipelineWrapper, get_rescore_oversampling
+from pragmatic.pipelines.utils import produce_custom_settings
+
+logger = logging.getLogger(__name__)
 
-from pragmatic.haystack.docling_splitter import DoclingDocumentSplitter
-from pragmatic.optimizations.finetuning import finetune_embedding_model
-from pragmatic.pipelines.pipeline import CommonPipelineWrapper
+# the settings required for converting, cleaning and splitting local files in the conversion worker processes
+CONVERSION_SETTINGS = [
+    "apply_docling",
+    "docling_tokenizer_model",
+    "converted_docling_document_format",
+    "chunking_enabled",
+    "chunking_method",
+    "max_tokens_per_chunk",
+    "docling_chunk_cache_enabled",
+    "docling_chunk_cache_path",
+    "split_by",
+    "split_length",
+    "split_overlap",
+    "split_threshold",
+    "cleaner_enabled",
+]
 
 
 class IndexingPipelineWrapper(CommonPipelineWrapper):
@@ -20,8 +51,12 @@ class IndexingPipelineWrapper(CommonPipelineWrapper):
 
         # optionally fine-tune the embedding model before indexing
         if self._settings["finetune_embedding_model"]:
+            from pragmatic.optimizations.finetuning import finetune_embedding_model
             finetune_embedding_model(self._settings)
 
+        self._document_store = None
+        self._drops_old_collection = False
+
     def _add_cleaner(self):
         if not self._settings["cleaner_enabled"]:
             return
@@ -41,30 +76,151 @@ class IndexingPipelineWrapper(CommonPipelineWrapper):
             if self._settings["apply_docling"]:
                 # when docling is used, chunking is handled in the respective converter component
                 return
+            from pragmatic.haystack.docling_splitter import DoclingDocumentSplitter
             splitter = DoclingDocumentSplitter(embedding_model_id=self._settings["docling_tokenizer_model"],
                                                content_format=self._settings["converted_docling_document_format"],
-                                               max_tokens=self._settings["max_tokens_per_chunk"])
+                                               max_tokens=self._settings["max_tokens_per_chunk"],
+                                               cache_path=self._settings["docling_chunk_cache_path"]
+                                               if self._settings["docling_chunk_cache_enabled"] else None)
         else:
             raise ValueError(f"Unsupported chunking method: {splitter_type}")
 
         self._add_component("splitter", splitter)
 
+    def _add_chunk_filter(self):
+        return
+
+    def _should_drop_old_collection(self):
+        return self._settings["milvus_drop_old_collection"]
+
+    def _uses_background_writer(self):
+        return False
+
     def _add_embedder(self):
-        embedder = SentenceTransformersDocumentEmbedder(model=self._settings["embedding_model_path"])
+        embedder = SentenceTransformersChunkEmbedder(model=self._settings["embedding_model_path"],
+                                                     **produce_embedding_backend_args(
+                                                         self._settings, self._settings["indexing_embedding_batch_size"]),
+                                                     **produce_embedding_dimension_args(self._settings),
+                                                     **produce_embedding_cache_args(self._settings))
         self._add_component("embedder", embedder)
 
     def _add_writer(self):
-        document_store = self._init_document_store(retrieval_mode=False)
-        writer = DocumentWriter(document_store)
+        # the decision is made once, as the state it depends on (e.g., the manifest) changes during the run
+        self._drops_old_collection = self._should_drop_old_collection()
+        self._document_store = self._init_document_store(retrieval_mode=False, drop_old=self._drops_old_collection)
+        if self._uses_background_writer():
+            writer = BackgroundDocumentWriter(self._document_store)
+        else:
+            writer = DocumentWriter(self._document_store)
         self._add_component("writer", writer)
 
+    def _add_sparse_indexer(self):
+        if not self._settings["bm25_index_enabled"]:
+            return
+        # the BM25 index receives the same chunks as the dense collection
+        sparse_indexer = BM25IndexWriter(index_path=self._settings["bm25_index_path"],
+                                         drop_old=self._drops_old_collection)
+        self._add_component("sparse_indexer", sparse_indexer, should_connect=False)
+        self._pipeline.connect("embedder.documents", "sparse_indexer.documents")
+
+    def _get_sparse_indexer(self):
+        if "sparse_indexer" not in self._pipeline.graph.nodes:
+            return None
+        return self._pipeline.get_component("sparse_indexer")
+
+    def get_document_store(self):
+        return self._document_store
+
+    def _get_embedder(self):
+        if "embedder" not in self._pipeline.graph.nodes:
+            return None
+        return self._pipeline.get_component("embedder")
+
+    def run(self, args=None):
+        self._prepare_run()
+        result = self._run_pipeline(args)
+        self._finish_run()
+        return self._add_quantization_report(result)
+
+    def _run_pipeline(self, args=None):
+        return super().run(args)
+
+    def _prepare_run(self):
+        # new documents may only be added to an existing collection if their embeddings are comparable with its ones
+        embedder = self._get_embedder()
+        if embedder is None or self._drops_old_collection:
+            return
+        index_profile = load_embedding_profile(self._settings["embedding_profile_path"], self.get_document_store_id())
+        if index_profile is None:
+            return
+        embedder.warm_up()
+        verify_embedding_compatibility(index_profile, embedder.produce_embedding_profile(EMBEDDING_PROBE_TEXTS),
+                                       self._settings["embedding_min_probe_similarity"])
+
+    def _finish_run(self):
+        sparse_indexer = self._get_sparse_indexer()
+        if sparse_indexer is not None:
+            sparse_indexer.flush()
+
+        embedder = self._get_embedder()
+        profile_path = self._settings["embedding_profile_path"]
+        document_store_id = self.get_document_store_id()
+        if embedder is not None and (self._drops_old_collection or
+                                     load_embedding_profile(profile_path, document_store_id) is None):
+            save_embedding_profile(profile_path, document_store_id,
+                                   embedder.produce_embedding_profile(EMBEDDING_PROBE_TEXTS))
+
+        # the responses cached by the RAG pipelines of this process may rely on the replaced documents
+        invalidate_response_caches(self.get_document_store_id())
+
+    def _add_quantization_report(self, result):
+        if self._settings["vector_quantization"] is None or not self._settings["vector_quantization_report_queries"]:
+            return result
+        report = self._produce_quantization_report()
+        if report is not None:
+            logger.info(f"Vector quantization report: {report}")
+            result["quantization_report"] = report
+        return result
+
+    def _produce_quantization_report(self):
+        """
+        Reports the memory saved by the quantized vectors of the collection and the recall@top_k of the quantized
+        search relative to the exact one, using a sample of the stored vectors as the queries.
+        """
+        report_args = {
+            "top_k": self._settings["top_k"],
+            "rescore_oversampling": get_rescore_oversampling(self._settings),
+            "num_queries": self._settings["vector_quantization_report_queries"],
+        }
+        if self._settings["vector_db_type"].lower() == "mmap":
+            return self._document_store.produce_quantization_report(**report_args)
+
+        # the scalar quantization of the IVF_SQ8 index is reproduced on a sample of the stored vectors, assuming the
+        # vectors to be normalized unless the metric is the inner product
+        collection = self._document_store.col
+        if collection is None:
+            return None
+        collection.flush()
+        vector_field = self._document_store._vector_field
+        rows = collection.query(expr="", output_fields=[vector_field], consistency_level="Strong",
+                                limit=self._settings["vector_quantization_report_max_vectors"])
+        if not rows:
+            return None
+        embeddings = np.asarray([row[vector_field] for row in rows], dtype=np.float32)
+        if self._settings["milvus_metric_type"].upper() != "IP":
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return produce_quantization_report(embeddings, self._settings["vector_quantization"],
+                                           num_vectors=collection.num_entities, **report_args)
+
     def build_pipeline(self):
         self._add_fetcher()
         self._add_converter()
         self._add_cleaner()
         self._add_splitter()
+        self._add_chunk_filter()
         self._add_embedder()
         self._add_writer()
+        self._add_sparse_indexer()
 
     def _add_fetcher(self):
         raise NotImplementedError()
@@ -87,6 +243,74 @@ class RemoteHTMLIndexingPipelineWrapper(IndexingPipelineWrapper):
         self._add_component("converter", converter)
 
 
+def create_local_file_converter(settings):
+    if settings["apply_docling"]:
+        from docling.chunking import HybridChunker
+        from docling_haystack.converter import DoclingConverter, ExportType
+
+        use_docling_chunker = settings["chunking_enabled"] and settings["chunking_method"].lower() == 'docling'
+        export_type = ExportType.DOC_CHUNKS if use_docling_chunker else ExportType.MARKDOWN
+        # the tokenizer is shared with the other components using the same model
+        tokenizer = get_shared_tokenizer(settings['docling_tokenizer_model'])
+        return DoclingConverter(export_type=export_type, chunker=HybridChunker(tokenizer=tokenizer))
+    return TextFileToDocument()
+
+
+def produce_local_file_converter_args(settings, source_files):
+    if settings["apply_docling"]:
+        return {"paths": source_files}
+    return {"sources": source_files}
+
+
+class LocalFileConversionPipelineWrapper(IndexingPipelineWrapper):
+    """
+    Converts, cleans and splits local files without embedding and storing the resulting documents.
+    Used for converting the files in parallel worker processes.
+    """
+
+    def _add_fetcher(self):
+        return
+
+    def _add_converter(self):
+        self._add_component("converter", create_local_file_converter(self._settings))
+
+    def build_pipeline(self):
+        self._add_converter()
+        self._add_cleaner()
+        self._add_splitter()
+
+    def convert(self, source_file):
+        """
+        Returns the documents produced from the given file, each with the full path of the file as its file_path
+        metadata, so that the documents of several files can be told apart after being processed together.
+        """
+        result = self.run({"converter": produce_local_file_converter_args(self._settings, [source_file])})
+        # the documents are produced by the last component of the pipeline
+        documents = []
+        for component_name in ["splitter", "cleaner", "converter"]:
+            if component_name in result:
+                documents = result[component_name]["documents"]
+                break
+        for document in documents:
+            document.meta["file_path"] = source_file
+        return documents
+
+
+# the conversion pipeline of the current worker process
+_conversion_pipeline = None
+
+
+def _init_conversion_worker(conversion_settings):
+    global _conversion_pipeline
+    _conversion_pipeline = LocalFileConversionPipelineWrapper(produce_custom_settings(conversion_settings))
+    _conversion_pipeline.build_pipeline()
+    _conversion_pipeline.warm_up()
+
+
+def _convert_local_file(source_file):
+    return _conversion_pipeline.convert(source_file)
+
+
 class LocalFileIndexingPipelineWrapper(IndexingPipelineWrapper):
     def __init__(self, settings, doc_path):
         super().__init__(settings)
@@ -101,6 +325,10 @@ class LocalFileIndexingPipelineWrapper(IndexingPipelineWrapper):
             for file in os.listdir(doc_path):
                 self.__verify_and_add_input_file(doc_path, file)
 
+        self._manifest = None
+        if self._settings["incremental_indexing"]:
+            self._manifest = IndexingManifest(self._settings["indexing_manifest_path"], self._settings)
+
     def __verify_and_add_input_file(self, root_path, file_path):
         absolute_path = os.path.abspath(os.path.join(root_path, file_path))
         if not os.path.isfile(absolute_path):
@@ -112,17 +340,207 @@ class LocalFileIndexingPipelineWrapper(IndexingPipelineWrapper):
         self._source_files.append(absolute_path)
         return True
 
+    def get_source_files(self):
+        return self._source_files
+
     def _add_fetcher(self):
         return
 
+    def _uses_file_converter(self):
+        # the incremental mode needs the failures and the source file of every chunk, which are reported by the file
+        # converter even when the files are converted in the current process
+        return self._settings["indexing_num_workers"] > 1 or self._manifest is not None
+
+    def _produce_converter_args(self, source_files):
+        if self._uses_file_converter():
+            return {"sources": source_files}
+        return produce_local_file_converter_args(self._settings, source_files)
+
     def _add_converter(self):
-        if self._settings["apply_docling"]:
-            use_docling_chunker = self._settings["chunking_enabled"] and self._settings["chunking_method"].lower() == 'docling'
-            export_type = ExportType.DOC_CHUNKS if use_docling_chunker else ExportType.MARKDOWN
-            converter = DoclingConverter(export_type=export_type,
-                                         chunker=HybridChunker(tokenizer=self._settings['docling_tokenizer_model']))
-            converter_args = {"paths": self._source_files}
+        if self._uses_file_converter():
+            # the files are converted, cleaned and split file by file, in the worker processes if there are several
+            conversion_settings = {key: self._settings[key] for key in CONVERSION_SETTINGS}
+            converter = ParallelFileConverter(convert_function=_convert_local_file,
+                                              num_workers=self._settings["indexing_num_workers"],
+                                              initializer=_init_conversion_worker,
+                                              initargs=(conversion_settings,))
         else:
-            converter = TextFileToDocument()
-            converter_args = {"sources": self._source_files}
-        self._add_component("converter", converter, component_args=converter_args)
+            converter = create_local_file_converter(self._settings)
+        self._add_component("converter", converter, component_args=self._produce_converter_args(self._source_files))
+
+    def _add_cleaner(self):
+        if self._uses_file_converter():
+            return
+        super()._add_cleaner()
+
+    def _add_splitter(self):
+        if self._uses_file_converter():
+            return
+        super()._add_splitter()
+
+    def _add_chunk_filter(self):
+        if self._manifest is None:
+            return
+        self._add_component("chunk_filter", IndexedChunkFilter())
+
+    def _should_drop_old_collection(self):
+        if self._manifest is None:
+            return super()._should_drop_old_collection()
+        # in incremental mode, the collection is only rebuilt when it cannot be matched against the manifest
+        if self._manifest.is_valid():
+            return False
+        logger.warning(f"The indexing manifest {self._settings['indexing_manifest_path']} is missing or was created "
+                       f"with different indexing settings - dropping the collection {self.get_document_store_id()} "
+                       f"and reindexing everything")
+        return True
+
+    def _uses_background_writer(self):
+        # when the files are processed in several pipeline runs, each run can be overlapped with writing the
+        # documents produced by the previous one
+        return self._manifest is not None or self._settings["indexing_batch_size"] is not None
+
+    def _produce_file_run_args(self, source_files):
+        run_args = {component_name: dict(component_args) for component_name, component_args in self._args.items()}
+        run_args["converter"] = self._produce_converter_args(source_files)
+        return run_args
+
+    def _delete_documents(self, document_ids):
+        writer = self._pipeline.get_component("writer")
+        if isinstance(writer, BackgroundDocumentWriter):
+            writer.delete_documents(document_ids)
+        else:
+            self._document_store.delete_documents(document_ids)
+        sparse_indexer = self._get_sparse_indexer()
+        if sparse_indexer is not None:
+            sparse_indexer.delete_documents(document_ids)
+
+    def run(self, args=None):
+        if args is not None or (self._manifest is None and self._settings["indexing_batch_size"] is None):
+            return super().run(args)
+        self._prepare_run()
+        if self._manifest is not None:
+            result = self._run_incremental()
+        else:
+            result = self._run_in_batches()
+        # the background writer may still have been writing when the individual batches completed
+        self._finish_run()
+        return self._add_quantization_report(result)
+
+    def _run_in_batches(self):
+        """
+        Streams the source files through the pipeline in micro-batches of indexing_batch_size files, so that only a
+        bounded number of batches is held in memory at any moment regardless of the total number of files.
+        """
+        batch_size = self._settings["indexing_batch_size"]
+        failures = {}
+        for batch_start in range(0, len(self._source_files), batch_size):
+            batch_files = self._source_files[batch_start:batch_start + batch_size]
+            logger.info(f"Indexing files {batch_start + 1}-{batch_start + len(batch_files)} "
+                        f"out of {len(self._source_files)}")
+            result = self._run_pipeline(self._produce_file_run_args(batch_files))
+            failures.update(result.get("converter", {}).get("failures", {}))
+
+        result = {"writer": {"documents_written": self._pipeline.get_component("writer").flush()}}
+        if self._uses_file_converter():
+            result["converter"] = {"failures": failures}
+        return result
+
+    def _record_indexed_file(self, source_file, file_hash, chunk_ids):
+        self._manifest.update_file(source_file, file_hash, chunk_ids)
+        self._manifest.save()
+
+    def _run_incremental_batch(self, batch_files, report):
+        """
+        Indexes the given (source file, file hash) pairs in a single pipeline run and updates the manifest accordingly.
+        """
+        indexed_chunk_ids = {source_file: set(self._manifest.get_chunk_ids(source_file))
+                             for source_file, _ in batch_files}
+        run_args = self._produce_file_run_args([source_file for source_file, _ in batch_files])
+        run_args["chunk_filter"] = {"indexed_chunk_ids": list(set().union(*indexed_chunk_ids.values()))}
+        result = self._run_pipeline(run_args)
+        report["chunks_written"] += result.get("writer", {}).get("documents_written", 0)
+
+        failures = result.get("converter", {}).get("failures", {})
+        file_chunk_ids = result["chunk_filter"]["file_chunk_ids"]
+        for source_file, file_hash in batch_files:
+            chunk_ids = file_chunk_ids.get(source_file, [])
+            if source_file in failures or (not chunk_ids and os.path.getsize(source_file) > 0):
+                # e.g., TextFileToDocument skips the unreadable files - the file will be retried by the next run
+                logger.warning(f"No documents were produced from {source_file} - it will be retried by the next run")
+                report["files_failed"] += 1
+                continue
+
+            stale_chunk_ids = list(indexed_chunk_ids[source_file] - set(chunk_ids))
+            if stale_chunk_ids:
+                self._delete_documents(stale_chunk_ids)
+
+            # the manifest is persisted after the chunks of every batch are written, so an interrupted run loses at
+            # most the files whose chunks were still pending
+            self._pipeline.get_component("writer").call_when_written(
+                partial(self._record_indexed_file, source_file, file_hash, chunk_ids))
+
+            report["files_indexed"] += 1
+            report["chunks_skipped"] += len([chunk_id for chunk_id in chunk_ids
+                                             if chunk_id in indexed_chunk_ids[source_file]])
+            report["chunks_deleted"] += len(stale_chunk_ids)
+
+    def _run_incremental(self):
+        """
+        Indexes only the source files that were added or modified since the previous run and removes the chunks of the
+        modified and the deleted files that are no longer present. Unchanged files are skipped altogether.
+
+        The chunks of a modified file are only kept as they are if their IDs did not change. Since the splitters record
+        the parent document and the position of each chunk in its metadata, this is rarely the case - the chunks of a
+        modified file are generally re-embedded, unless their texts are found in the embedding cache.
+
+        A non-empty file producing no documents is considered as failed to convert, so that it is retried by the next
+        run instead of being recorded as indexed.
+
+        The added and modified files are processed together, in micro-batches of indexing_batch_size files if set, and
+        the resulting chunks are mapped back to their files through their file_path metadata.
+        """
+        report = {
+            "files_total": len(self._source_files),
+            "files_skipped": 0,
+            "files_indexed": 0,
+            "files_deleted": 0,
+            "files_failed": 0,
+            "chunks_written": 0,
+            "chunks_skipped": 0,
+            "chunks_deleted": 0,
+        }
+
+        if self._manifest.get_indexed_files() and self._document_store.count_documents() == 0:
+            logger.warning("The collection is empty although the manifest lists indexed files - reindexing everything")
+            self._manifest.reset()
+
+        source_files = set(self._source_files)
+        for deleted_file in [f for f in self._manifest.get_indexed_files() if f not in source_files]:
+            stale_chunk_ids = self._manifest.get_chunk_ids(deleted_file)
+            if stale_chunk_ids:
+                self._delete_documents(stale_chunk_ids)
+            self._manifest.remove_file(deleted_file)
+            report["files_deleted"] += 1
+            report["chunks_deleted"] += len(stale_chunk_ids)
+
+        changed_files = []
+        for source_file in self._source_files:
+            file_hash = compute_file_hash(source_file)
+            if file_hash == self._manifest.get_file_hash(source_file):
+                report["files_skipped"] += 1
+                report["chunks_skipped"] += len(self._manifest.get_chunk_ids(source_file))
+                continue
+            changed_files.append((source_file, file_hash))
+
+        batch_size = self._settings["indexing_batch_size"] or max(1, len(changed_files))
+        for batch_start in range(0, len(changed_files), batch_size):
+            batch_files = changed_files[batch_start:batch_start + batch_size]
+            logger.info(f"Indexing changed files {batch_start + 1}-{batch_start + len(batch_files)} "
+                        f"out of {len(changed_files)}")
+            self._run_incremental_batch(batch_files, report)
+
+        # the manifest is only saved once the pending writes are completed
+        self._pipeline.get_component("writer").flush()
+        self._manifest.save()
+        logger.info(f"Incremental indexing report: {report}")
+        return {"writer": {"documents_written": report["chunks_written"]}, "indexing_report": report}
@@ -0,0 +1,447 @@
+import json
+import os
+import secrets
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock, local
+
+from haystack import Document
+
+from pragmatic.optimizations.prefix_cache import get_prompt_token_usage
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# the name of the component whose time-to-first-token and generation rate are recorded
+LLM_COMPONENT_NAME = "llm"
+
+# the run record of the pipeline run executed in the current thread or task
+_current_run = ContextVar("pragmatic_current_run", default=None)
+
+
+def count_documents(value):
+    """
+    Counts the Documents in a component input or output value, looking into (nested) lists and dicts.
+    """
+    if isinstance(value, Document):
+        return 1
+    if isinstance(value, dict):
+        return sum(count_documents(item) for item in value.values())
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], (Document, list, tuple, dict)):
+        return sum(count_documents(item) for item in value)
+    return 0
+
+
+def _get_max_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ComponentMeasurement(object):
+    """
+    The measurements of a single invocation of a pipeline component. The CPU time is measured for the whole process,
+    so that the threads spawned by the component (e.g., the intra-op threads of PyTorch) are accounted for - it is
+    therefore only accurate when the pipeline runs are not executed concurrently. The same applies to the peak memory,
+    which is measured via tracemalloc and only covers the memory allocated through the Python allocator (including
+    NumPy arrays, but not the PyTorch tensors).
+    """
+
+    def __init__(self, component_name, documents_in=0, trace_memory=False):
+        self.component_name = component_name
+        self.documents_in = documents_in
+        self.documents_out = 0
+        self._trace_memory = trace_memory
+        self._first_token_time = None
+        self._num_streamed_chunks = 0
+        self._completion_tokens = None
+        self._values = {}
+
+        if trace_memory:
+            self._start_traced_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start_time = time.time()
+        self._start_perf_counter = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+
+    def on_streaming_chunk(self):
+        if self._first_token_time is None:
+            self._first_token_time = time.perf_counter()
+        self._num_streamed_chunks += 1
+
+    def set_completion_tokens(self, completion_tokens):
+        self._completion_tokens = completion_tokens
+
+    def finish(self, result=None):
+        wall_time = time.perf_counter() - self._start_perf_counter
+        self._values = {
+            "component": self.component_name,
+            "start_time": self.start_time,
+            "wall_time": wall_time,
+            "cpu_time": time.process_time() - self._start_cpu_time,
+            "documents_in": self.documents_in,
+            "documents_out": count_documents(result) if result is not None else self.documents_out,
+            "max_rss_bytes": _get_max_rss_bytes(),
+        }
+        if self._trace_memory:
+            self._values["peak_memory_bytes"] = max(tracemalloc.get_traced_memory()[1] - self._start_traced_memory, 0)
+
+        if self.component_name == LLM_COMPONENT_NAME:
+            self._finish_llm_measurement(wall_time, result)
+        return self
+
+    def _finish_llm_measurement(self, wall_time, result):
+        completion_tokens = self._completion_tokens
+        prompt_tokens, cached_prompt_tokens = None, None
+        if isinstance(result, dict):
+            usages = [meta.get("usage") or {} for meta in result.get("meta", [])]
+            if completion_tokens is None and any("completion_tokens" in usage for usage in usages):
+                completion_tokens = sum(usage.get("completion_tokens", 0) for usage in usages)
+            if usages:
+                # the choices of a single completion share the prompt
+                prompt_tokens, cached_prompt_tokens = get_prompt_token_usage(usages[0])
+        if completion_tokens is None and self._num_streamed_chunks > 0:
+            # the streamed chunks approximate the tokens when the server does not report the usage
+            completion_tokens = self._num_streamed_chunks
+
+        # without streaming, the first token arrives together with the whole reply
+        first_token_time = self._first_token_time if self._first_token_time is not None else \
+            self._start_perf_counter + wall_time
+        self._values["time_to_first_token"] = first_token_time - self._start_perf_counter
+        self._values["completion_tokens"] = completion_tokens
+        self._values["prompt_tokens"] = prompt_tokens
+        self._values["cached_prompt_tokens"] = cached_prompt_tokens
+        self._values["tokens_per_second"] = completion_tokens / wall_time if completion_tokens and wall_time > 0 \
+            else None
+
+    def to_dict(self):
+        return dict(self._values)
+
+
+class RunRecord(object):
+    """
+    The measurements of all the components invoked during a single pipeline run.
+    """
+
+    def __init__(self, pipeline_name):
+        self.pipeline_name = pipeline_name
+        self.run_id = secrets.token_hex(16)
+        self.start_time = time.time()
+        self._start_perf_counter = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+        self._wall_time = None
+        self._cpu_time = None
+        self._components = []
+        self._lock = Lock()
+
+    def add_component(self, measurement):
+        with self._lock:
+            self._components.append(measurement.to_dict())
+
+    def finish(self):
+        self._wall_time = time.perf_counter() - self._start_perf_counter
+        self._cpu_time = time.process_time() - self._start_cpu_time
+
+    def to_dict(self):
+        with self._lock:
+            components = list(self._components)
+        return {
+            "pipeline": self.pipeline_name,
+            "run_id": self.run_id,
+            "start_time": self.start_time,
+            "wall_time": self._wall_time,
+            "cpu_time": self._cpu_time,
+            "components": components,
+        }
+
+
+class PrometheusExporter(object):
+    """
+    Aggregates the run records into counters rendered in the Prometheus text exposition format. When a path is given,
+    the metrics are rewritten there after every run, e.g., for the textfile collector of the node exporter.
+    """
+
+    COMPONENT_COUNTERS = [
+        ("pragmatic_component_runs_total", "The number of component invocations", None),
+        ("pragmatic_component_wall_seconds_total", "The wall time spent in the component", "wall_time"),
+        ("pragmatic_component_cpu_seconds_total", "The process CPU time spent in the component", "cpu_time"),
+        ("pragmatic_component_documents_in_total", "The number of documents passed to the component", "documents_in"),
+        ("pragmatic_component_documents_out_total", "The number of documents produced by the component",
+         "documents_out"),
+    ]
+    LLM_COUNTERS = [
+        ("pragmatic_llm_time_to_first_token_seconds_total", "The accumulated time to the first token",
+         "time_to_first_token"),
+        ("pragmatic_llm_completion_tokens_total", "The number of generated tokens", "completion_tokens"),
+        ("pragmatic_llm_prompt_tokens_total", "The number of prompt tokens", "prompt_tokens"),
+        ("pragmatic_llm_cached_prompt_tokens_total", "The number of prompt tokens served from the prefix cache",
+         "cached_prompt_tokens"),
+    ]
+
+    def __init__(self, path=None):
+        self._path = path
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._lock = Lock()
+
+    def export(self, run_record):
+        with self._lock:
+            pipeline_name = run_record["pipeline"]
+            self._counters[("pragmatic_pipeline_runs_total", pipeline_name, None)] += 1
+            self._counters[("pragmatic_pipeline_wall_seconds_total", pipeline_name, None)] += run_record["wall_time"]
+            for component in run_record["components"]:
+                for metric_name, _, key in self.COMPONENT_COUNTERS + \
+                        (self.LLM_COUNTERS if "time_to_first_token" in component else []):
+                    value = 1 if key is None else component.get(key)
+                    if value is not None:
+                        self._counters[(metric_name, pipeline_name, component["component"])] += value
+                if component.get("peak_memory_bytes") is not None:
+                    self._gauges[("pragmatic_component_peak_memory_bytes", pipeline_name, component["component"])] = \
+                        component["peak_memory_bytes"]
+        if self._path is not None:
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, "w") as metrics_file:
+                metrics_file.write(self.render())
+            os.replace(tmp_path, self._path)
+
+    def render(self):
+        descriptions = {name: (description, "counter") for name, description, _ in
+                        self.COMPONENT_COUNTERS + self.LLM_COUNTERS}
+        descriptions["pragmatic_pipeline_runs_total"] = ("The number of pipeline runs", "counter")
+        descriptions["pragmatic_pipeline_wall_seconds_total"] = ("The wall time of the pipeline runs", "counter")
+        descriptions["pragmatic_component_peak_memory_bytes"] = (
+            "The peak traced memory of the last component invocation", "gauge")
+
+        with self._lock:
+            samples = defaultdict(list)
+            for (metric_name, pipeline_name, component_name), value in \
+                    list(self._counters.items()) + list(self._gauges.items()):
+                labels = f'pipeline="{pipeline_name}"'
+                if component_name is not None:
+                    labels += f',component="{component_name}"'
+                samples[metric_name].append(f"{metric_name}{{{labels}}} {value}")
+
+        lines = []
+        for metric_name in sorted(samples):
+            description, metric_type = descriptions[metric_name]
+            lines.append(f"# HELP {metric_name} {description}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            lines.extend(sorted(samples[metric_name]))
+        return "\n".join(lines) + "\n"
+
+
+class SpanExporter(object):
+    """
+    Converts the run records into OpenTelemetry-style spans - a root span per pipeline run with a child span per
+    component invocation - and appends them as JSON lines to the given path. The most recent spans are also kept in
+    memory.
+    """
+
+    MAX_KEPT_SPANS = 1000
+
+    def __init__(self, path=None):
+        self._path = path
+        self._spans = []
+        self._lock = Lock()
+
+    @staticmethod
+    def _to_unix_nano(timestamp):
+        return int(timestamp * 1e9)
+
+    def _produce_spans(self, run_record):
+        trace_id = run_record["run_id"]
+        root_span_id = secrets.token_hex(8)
+        spans = [{
+            "trace_id": trace_id,
+            "span_id": root_span_id,
+            "parent_span_id": None,
+            "name": f"{run_record['pipeline']}.run",
+            "start_time_unix_nano": self._to_unix_nano(run_record["start_time"]),
+            "end_time_unix_nano": self._to_unix_nano(run_record["start_time"] + run_record["wall_time"]),
+            "attributes": {"pragmatic.cpu_time": run_record["cpu_time"]},
+        }]
+        for component in run_record["components"]:
+            attributes = {f"pragmatic.{key}": value for key, value in component.items()
+                          if key not in ["component", "start_time", "wall_time"] and value is not None}
+            spans.append({
+                "trace_id": trace_id,
+                "span_id": secrets.token_hex(8),
+                "parent_span_id": root_span_id,
+                "name": component["component"],
+                "start_time_unix_nano": self._to_unix_nano(component["start_time"]),
+                "end_time_unix_nano": self._to_unix_nano(component["start_time"] + component["wall_time"]),
+                "attributes": attributes,
+            })
+        return spans
+
+    def export(self, run_record):
+        spans = self._produce_spans(run_record)
+        with self._lock:
+            self._spans = (self._spans + spans)[-self.MAX_KEPT_SPANS:]
+            if self._path is not None:
+                with open(self._path, "a") as spans_file:
+                    for span in spans:
+                        spans_file.write(json.dumps(span) + "\n")
+
+    def get_finished_spans(self):
+        with self._lock:
+            return list(self._spans)
+
+
+# the built-in exporters are shared by all the pipelines of the process, so that their metrics are aggregated
+_exporters = {}
+_exporters_lock = Lock()
+EXPORTER_CLASSES = {"prometheus": PrometheusExporter, "otel": SpanExporter}
+
+
+def get_exporter(exporter_type, path=None):
+    if exporter_type not in EXPORTER_CLASSES:
+        raise ValueError(f"Unsupported instrumentation exporter: {exporter_type}")
+    with _exporters_lock:
+        if (exporter_type, path) not in _exporters:
+            _exporters[(exporter_type, path)] = EXPORTER_CLASSES[exporter_type](path)
+        return _exporters[(exporter_type, path)]
+
+
+def render_prometheus_metrics(path=None):
+    """
+    Returns the metrics aggregated by the process-wide Prometheus exporter in the text exposition format.
+    """
+    return get_exporter("prometheus", path).render()
+
+
+class PipelineInstrumentation(object):
+    """
+    Measures the components of a pipeline. The run methods of the instrumented components are wrapped, and the
+    measurements of each invocation are added to the record of the enclosing pipeline run. Invocations outside of a
+    recorded run (e.g., during the warm-up) are not measured. Completed run records are passed to the exporters.
+
+    All the methods are no-ops when the instrumentation is disabled.
+    """
+
+    def __init__(self, pipeline_name, enabled=False, exporters=None, trace_memory=False):
+        self._pipeline_name = pipeline_name
+        self._enabled = enabled
+        self._exporters = exporters or []
+        self._trace_memory = enabled and trace_memory
+        self._last_runs = local()
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def is_enabled(self):
+        return self._enabled
+
+    def instrument(self, component_name, component_obj):
+        if not self._enabled or getattr(component_obj, "_pragmatic_instrumented", False):
+            return
+        original_run = component_obj.run
+
+        def instrumented_run(*args, **kwargs):
+            run_record = _current_run.get()
+            if run_record is None:
+                return original_run(*args, **kwargs)
+            measurement = self.start_component(component_name, documents_in=count_documents(kwargs))
+            streaming_callback = kwargs.get("streaming_callback")
+            if streaming_callback is not None:
+                def measured_streaming_callback(chunk):
+                    measurement.on_streaming_chunk()
+                    streaming_callback(chunk)
+                kwargs["streaming_callback"] = measured_streaming_callback
+            result = original_run(*args, **kwargs)
+            run_record.add_component(measurement.finish(result))
+            return result
+
+        # the instance attribute shadows the class method, which is the one invoked by Haystack and the wrappers
+        component_obj.run = instrumented_run
+        component_obj._pragmatic_instrumented = True
+
+    def start_component(self, component_name, documents_in=0):
+        if not self._enabled:
+            return None
+        return ComponentMeasurement(component_name, documents_in=documents_in, trace_memory=self._trace_memory)
+
+    def finish_component(self, run_record, measurement, result=None):
+        if run_record is not None and measurement is not None:
+            run_record.add_component(measurement.finish(result))
+
+    def start_run(self):
+        return RunRecord(self._pipeline_name) if self._enabled else None
+
+    def finish_run(self, run_record):
+        """
+        Completes the given run record, exports it and returns it as a dict (None if the instrumentation is disabled).
+        """
+        if run_record is None:
+            return None
+        run_record.finish()
+        record = run_record.to_dict()
+        self._last_runs.record = record
+        for exporter in self._exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                logger.warning(f"Failed to export the run record via {type(exporter).__name__}: {e}")
+        return record
+
+    def run_in_record(self, run_record, run_callable):
+        """
+        Invokes the given callable so that the components it runs are measured as a part of the given run record.
+        Used for executing pipeline stages in other threads.
+        """
+        if run_record is None:
+            return run_callable()
+        token = _current_run.set(run_record)
+        try:
+            return run_callable()
+        finally:
+            _current_run.reset(token)
+
+    @contextmanager
+    def record_run(self):
+        """
+        Measures the components invoked in the current thread within the block. Yields a holder whose "record" entry
+        contains the completed run record after the block exits.
+        """
+        holder = {"record": None}
+        run_record = self.start_run()
+        token = _current_run.set(run_record) if run_record is not None else None
+        try:
+            yield holder
+        finally:
+            if token is not None:
+                _current_run.reset(token)
+            holder["record"] = self.finish_run(run_record)
+
+    def get_last_run(self):
+        """
+        Returns the record of the last run completed in the current thread.
+        """
+        return getattr(self._last_runs, "record", None)
+
+
+def create_pipeline_instrumentation(settings, pipeline_name):
+    if not settings["instrumentation_enabled"]:
+        return PipelineInstrumentation(pipeline_name)
+    exporters = []
+    for exporter in settings["instrumentation_exporters"]:
+        if exporter == "prometheus":
+            exporters.append(get_exporter("prometheus", settings["instrumentation_prometheus_path"]))
+        elif exporter == "otel":
+            exporters.append(get_exporter("otel", settings["instrumentation_spans_path"]))
+        elif isinstance(exporter, str):
+            raise ValueError(f"Unsupported instrumentation exporter: {exporter}")
+        else:
+            # any object with an export(run_record) method can be plugged in
+            exporters.append(exporter)
+    return PipelineInstrumentation(pipeline_name, enabled=True, exporters=exporters,
+                                   trace_memory=settings["instrumentation_trace_memory"])
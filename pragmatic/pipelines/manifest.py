@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the settings affecting the contents of the indexed collection - changing any of them invalidates the manifest
+INDEXING_FINGERPRINT_SETTINGS = [
+    "vector_db_type",
+    "embedding_model_path",
+    "embedding_dimension",
+    "milvus_deployment_type",
+    "milvus_file_path",
+    "milvus_server_url",
+    "milvus_collection_name",
+    "mmap_store_path",
+    "mmap_store_dtype",
+    "mmap_store_similarity",
+    "vector_quantization",
+    "bm25_index_enabled",
+    "bm25_index_path",
+    "apply_docling",
+    "docling_tokenizer_model",
+    "converted_docling_document_format",
+    "chunking_enabled",
+    "chunking_method",
+    "max_tokens_per_chunk",
+    "split_by",
+    "split_length",
+    "split_overlap",
+    "split_threshold",
+    "cleaner_enabled",
+]
+
+
+def compute_file_hash(file_path, block_size=1 << 20):
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def compute_settings_fingerprint(settings):
+    fingerprint_settings = {key: settings.get(key) for key in INDEXING_FINGERPRINT_SETTINGS}
+    return hashlib.sha256(json.dumps(fingerprint_settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IndexingManifest(object):
+    """
+    A persisted record of the indexed source files. For each file, the manifest keeps the hash of its contents and
+    the IDs of the chunks it produced, so that the chunks of the modified and the deleted files can be removed.
+    """
+
+    def __init__(self, manifest_path, settings):
+        self._manifest_path = manifest_path
+        self._fingerprint = compute_settings_fingerprint(settings)
+        self._files = {}
+        self._is_valid = False
+
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, "r") as f:
+                data = json.load(f)
+            if data.get("fingerprint") == self._fingerprint:
+                self._files = data["files"]
+                self._is_valid = True
+            else:
+                logger.info("The indexing settings have changed since the last run - the manifest will be rebuilt")
+
+    def is_valid(self):
+        """
+        Returns False if the manifest could not be loaded or was created with different indexing settings, in which
+        case the whole collection has to be rebuilt.
+        """
+        return self._is_valid
+
+    def reset(self):
+        self._files = {}
+        self._is_valid = False
+
+    def get_indexed_files(self):
+        return list(self._files.keys())
+
+    def get_file_hash(self, file_path):
+        entry = self._files.get(file_path)
+        return entry["hash"] if entry is not None else None
+
+    def get_chunk_ids(self, file_path):
+        entry = self._files.get(file_path)
+        return entry["chunks"] if entry is not None else []
+
+    def update_file(self, file_path, file_hash, chunk_ids):
+        self._files[file_path] = {"hash": file_hash, "chunks": list(chunk_ids)}
+
+    def remove_file(self, file_path):
+        self._files.pop(file_path, None)
+
+    def save(self):
+        # write to a temporary file first so that an interrupted run never leaves a corrupted manifest behind
+        temp_path = f"{self._manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"fingerprint": self._fingerprint, "files": self._files}, f)
+        os.replace(temp_path, self._manifest_path)
+        self._is_valid = True
@@ -1,8 +1,12 @@
+import os
 from abc import ABC
+from threading import BoundedSemaphore
 
 from haystack import Pipeline
 # from haystack_integrations.document_stores.elasticsearch import ElasticsearchDocumentStore
-from milvus_haystack import MilvusDocumentStore
+
+from pragmatic.haystack.mmap_document_store import MemoryMappedDocumentStore
+from pragmatic.pipelines.instrumentation import PipelineInstrumentation, create_pipeline_instrumentation
 
 import logging
 
@@ -10,7 +14,15 @@ logger = logging.getLogger(__name__)
 
 
 class PipelineWrapper(object):
-    def __init__(self):
+    DEFAULT_MAX_RUNS_PER_COMPONENT = 100
+
+    def __init__(self, max_concurrent_runs=None):
+        # Haystack keeps the per-component visit counters used to detect infinite loops inside the shared pipeline graph,
+        # so concurrent runs of the same pipeline increment the same counters. When concurrent runs are allowed, the
+        # number of in-flight runs is bounded and the loop detection limit is raised accordingly.
+        self._max_concurrent_runs = max_concurrent_runs
+        self._run_slots = BoundedSemaphore(max_concurrent_runs) if max_concurrent_runs is not None else None
+        self._instrumentation = PipelineInstrumentation(type(self).__name__)
         self._reset_pipeline()
 
     def get_pipeline(self):
@@ -20,7 +32,10 @@ class PipelineWrapper(object):
         return self._args
 
     def _reset_pipeline(self):
-        self._pipeline = Pipeline()
+        max_runs_per_component = PipelineWrapper.DEFAULT_MAX_RUNS_PER_COMPONENT
+        if self._max_concurrent_runs is not None:
+            max_runs_per_component = max(max_runs_per_component, self._max_concurrent_runs)
+        self._pipeline = Pipeline(max_runs_per_component=max_runs_per_component)
         self._args = {}
         self.__last_connect_point = None
 
@@ -32,6 +47,7 @@ class PipelineWrapper(object):
                        component_from_connect_point=None, component_to_connect_point=None):
         logger.debug(f"Adding component {component_name} with the following args: {component_args}")
         self._pipeline.add_component(component_name, component_obj)
+        self._instrumentation.instrument(component_name, component_obj)
         if component_args is not None:
             self._args[component_name] = component_args
 
@@ -50,29 +66,121 @@ class PipelineWrapper(object):
     def _set_last_connect_point(self, connect_point):
         self.__last_connect_point = connect_point
 
-    def run(self):
-        logger.debug(f"Executing the pipeline with the following arguments:\n{self._args}")
-        return self._pipeline.run(self._args)
+    def warm_up(self):
+        """
+        Loads the models and opens the connections required by the pipeline components ahead of the first run.
+        """
+        self._pipeline.warm_up()
+
+    def run(self, args=None):
+        """
+        Executes the pipeline. If no explicit arguments are given, the arguments collected while building the pipeline
+        are used. If the instrumentation is enabled, the measurements of the run are added to the result under the
+        "instrumentation" key.
+        """
+        actual_args = args if args is not None else self._args
+        logger.debug(f"Executing the pipeline with the following arguments:\n{actual_args}")
+        result = self._run_in_slot(lambda: self._pipeline.run(actual_args))
+        if self._instrumentation.is_enabled():
+            result["instrumentation"] = self._instrumentation.get_last_run()
+        return result
+
+    def _run_in_slot(self, run_callable):
+        """
+        Invokes the given callable, waiting for a free run slot first if the number of concurrent runs is bounded.
+        """
+        if self._run_slots is None:
+            return self._run_recorded(run_callable)
+        with self._run_slots:
+            return self._run_recorded(run_callable)
+
+    def _run_recorded(self, run_callable):
+        """
+        Invokes the given callable as a single pipeline run, measuring the invoked components if the instrumentation is
+        enabled.
+        """
+        with self._instrumentation.record_run():
+            return run_callable()
+
+    def get_last_run_metrics(self):
+        """
+        Returns the measurements of the last pipeline run completed in the current thread (None if the instrumentation
+        is disabled).
+        """
+        return self._instrumentation.get_last_run()
 
     def build_pipeline(self):
         raise NotImplementedError()
 
 
+# the default build-time and search-time parameters of the supported Milvus index types
+MILVUS_INDEX_DEFAULTS = {
+    "FLAT": {"build": {}, "search": {}},
+    "IVF_FLAT": {"build": {"nlist": 128}, "search": {"nprobe": 10}},
+    "IVF_SQ8": {"build": {"nlist": 128}, "search": {"nprobe": 10}},
+    "IVF_PQ": {"build": {"nlist": 128, "m": 8, "nbits": 8}, "search": {"nprobe": 10}},
+    "HNSW": {"build": {"M": 8, "efConstruction": 64}, "search": {"ef": 64}},
+    "DISKANN": {"build": {}, "search": {"search_list": 100}},
+    "AUTOINDEX": {"build": {}, "search": {}},
+}
+# the index types natively supported by Milvus Lite
+MILVUS_LITE_INDEX_TYPES = ["FLAT", "IVF_FLAT", "AUTOINDEX"]
+
+
+def produce_milvus_search_params(settings, index_type):
+    """
+    Produces the search parameters for the configured metric and the given index type, overriding the default
+    search-time parameters of the index type with the configured ones.
+    """
+    params = {**MILVUS_INDEX_DEFAULTS[index_type]["search"], **(settings["milvus_search_params"] or {})}
+    return {"metric_type": settings["milvus_metric_type"], "params": params}
+
+
+def get_milvus_index_type(settings):
+    if settings["milvus_index_type"] is not None:
+        return settings["milvus_index_type"].upper()
+    if settings["vector_quantization"] == "int8":
+        return "IVF_SQ8"
+    # HNSW is not supported in Lite mode
+    return "IVF_FLAT" if settings["milvus_deployment_type"].lower() == "lite" else "HNSW"
+
+
+def get_rescore_oversampling(settings):
+    # the candidates are only rescored when searching quantized vectors
+    if settings["vector_quantization"] is None:
+        return None
+    return settings["vector_quantization_rescore_oversampling"]
+
+
 class CommonPipelineWrapper(PipelineWrapper, ABC):
-    DEFAULT_LOCAL_MILVUS_INDEX_SETTINGS = {
-        "metric_type": "L2",
-        "index_type": "IVF_FLAT",
-        "params": {"M": 8, "efConstruction": 64},
-    }
-
-    def __init__(self, settings):
-        super().__init__()
+
+    def __init__(self, settings, **kwargs):
+        super().__init__(**kwargs)
         self._settings = settings
+        self._instrumentation = create_pipeline_instrumentation(settings, type(self).__name__)
 
-    def _init_document_store(self, retrieval_mode=True):
+    def get_document_store_id(self):
+        """
+        Returns a string identifying the collection the pipeline reads from or writes to.
+        """
+        vector_db_type = self._settings["vector_db_type"]
+        if vector_db_type.lower() == "milvus":
+            if self._settings["milvus_deployment_type"].lower() == "lite":
+                location = os.path.abspath(self._settings["milvus_file_path"])
+            else:
+                location = self._settings["milvus_server_url"]
+            return f"milvus:{location}:{self._settings['milvus_collection_name']}"
+        if vector_db_type.lower() == "mmap":
+            return f"mmap:{os.path.abspath(self._settings['mmap_store_path'])}"
+
+        raise ValueError(f"Unsupported vector DB type: {vector_db_type}")
+
+    def _init_document_store(self, retrieval_mode=True, drop_old=None):
         vector_db_type = self._settings["vector_db_type"]
 
         if vector_db_type.lower() == "milvus":
+            from milvus_haystack import MilvusDocumentStore
+
             milvus_deployment_type = self._settings["milvus_deployment_type"]
             if milvus_deployment_type.lower() == "lite":
                 milvus_connection_args = {"uri": self._settings["milvus_file_path"]}
@@ -84,19 +192,44 @@ class CommonPipelineWrapper(PipelineWrapper, ABC):
             if "milvus_auth_token" in self._settings and self._settings["milvus_auth_token"] is not None:
                 milvus_connection_args["token"] = self._settings["milvus_auth_token"]
 
-            drop_old = False if retrieval_mode else self._settings["milvus_drop_old_collection"]
-
-            # This is a workaround over an issue with the milvus-haystack integration component. When no index parameters are
-            # provided, MilvusDocumentStore tries to create a HNSW index, which is not supported in Lite mode. Thus, when
-            # Lite mode is desired, we have to provide our own index parameters.
-            index_params = CommonPipelineWrapper.DEFAULT_LOCAL_MILVUS_INDEX_SETTINGS \
-                if self._settings["milvus_deployment_type"] == 'lite' else None
+            if drop_old is None:
+                drop_old = False if retrieval_mode else self._settings["milvus_drop_old_collection"]
+
+            if self._settings["vector_quantization"] not in [None, "int8"]:
+                raise ValueError(f"Milvus collections only support the int8 vector quantization (via the IVF_SQ8 "
+                                 f"index), use the mmap vector store for {self._settings['vector_quantization']}")
+
+            # The index parameters are always provided explicitly, since otherwise the milvus-haystack integration
+            # component tries to create a HNSW index, which is not supported in Lite mode. They only take effect when
+            # the collection is created, whereas the search parameters must match the index of an existing collection.
+            index_type = get_milvus_index_type(self._settings)
+            if index_type not in MILVUS_INDEX_DEFAULTS:
+                raise ValueError(f"Unsupported Milvus index type: {index_type}")
+            if milvus_deployment_type.lower() == "lite" and index_type not in MILVUS_LITE_INDEX_TYPES:
+                logger.warning(f"Milvus Lite might not support the {index_type} index type, "
+                               f"consider using one of {MILVUS_LITE_INDEX_TYPES}")
+            index_params = {
+                "metric_type": self._settings["milvus_metric_type"],
+                "index_type": index_type,
+                "params": {**MILVUS_INDEX_DEFAULTS[index_type]["build"], **(self._settings["milvus_index_params"] or {})},
+            }
 
             return MilvusDocumentStore(connection_args=milvus_connection_args,
                                        collection_name=self._settings["milvus_collection_name"],
                                        timeout=self._settings["milvus_connection_timeout"],
                                        drop_old=drop_old,
-                                       index_params=index_params)
+                                       consistency_level=self._settings["milvus_consistency_level"],
+                                       index_params=index_params,
+                                       search_params=produce_milvus_search_params(self._settings, index_type))
+
+        if vector_db_type.lower() == "mmap":
+            if drop_old is None:
+                drop_old = False if retrieval_mode else self._settings["milvus_drop_old_collection"]
+            return MemoryMappedDocumentStore(path=self._settings["mmap_store_path"],
+                                             dtype=self._settings["mmap_store_dtype"],
+                                             similarity=self._settings["mmap_store_similarity"],
+                                             quantization=self._settings["vector_quantization"],
+                                             drop_old=drop_old)
 
         # if vector_db_type.lower() == "elasticsearch":
         #    return ElasticsearchDocumentStore(hosts=self._settings["elasticsearch_host_url"],
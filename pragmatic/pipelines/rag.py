@@ -1,18 +1,37 @@
 from haystack.components.builders import PromptBuilder, AnswerBuilder
-from haystack.components.embedders import SentenceTransformersTextEmbedder
-from haystack.components.generators import OpenAIGenerator
 from haystack.components.joiners import DocumentJoiner
-from haystack.components.rankers import TransformersSimilarityRanker
+from haystack.dataclasses import StreamingChunk
 from haystack.utils import Secret
 # from haystack_integrations.components.retrievers.elasticsearch import ElasticsearchEmbeddingRetriever, \
 #    ElasticsearchBM25Retriever
-from milvus_haystack import MilvusEmbeddingRetriever
-from openai import OpenAI
-
-from pragmatic.pipelines.pipeline import CommonPipelineWrapper
+from openai import AsyncOpenAI, OpenAI
+
+from pragmatic.haystack.async_openai_generator import AsyncOpenAIGenerator
+from pragmatic.haystack.bm25_index import BM25Index
+from pragmatic.haystack.bm25_retriever import BM25IndexRetriever
+from pragmatic.haystack.context_orderer import ContextOrderer
+from pragmatic.haystack.context_packer import ContextPacker
+from pragmatic.haystack.embedders import SentenceTransformersQueryEmbedder, produce_embedding_backend_args, \
+    produce_embedding_cache_args, produce_embedding_dimension_args
+from pragmatic.haystack.mmap_retriever import MemoryMappedEmbeddingRetriever
+from pragmatic.haystack.ranker import CrossEncoderRanker
+from pragmatic.optimizations.embedding_profile import EMBEDDING_PROBE_TEXTS, load_embedding_profile, \
+    verify_embedding_compatibility
+from pragmatic.optimizations.micro_batching import MicroBatcher
+from pragmatic.optimizations.prefix_cache import PrefixCacheStats, fetch_vllm_prefix_cache_metrics
+from pragmatic.optimizations.response_cache import SemanticResponseCache, compute_context_key, \
+    register_response_cache
+from pragmatic.pipelines.pipeline import CommonPipelineWrapper, get_rescore_oversampling
 from pragmatic.pipelines.streaming import RagStreamHandler
 
-from functools import cached_property
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 BASE_RAG_PROMPT = """You are an assistant for question-answering tasks. 
@@ -34,34 +53,100 @@ BASE_RAG_PROMPT = """You are an assistant for question-answering tasks.
     Answer:
     """
 
+# the instructions precede the context and the question follows it, so that the prompts of all the queries share the
+# instructions (and the leading documents of an overlapping context) as a prefix reusable by the prefix cache of the LLM
+PREFIX_CACHE_RAG_PROMPT = """You are an assistant for question-answering tasks.
+
+    You are given a set of context passages followed by a user question. Answer the question following these rules:
+    - Use only the information contained in the context passages, never your own knowledge.
+    - Think carefully about the context passages before answering.
+    - If the context passages do not contain the answer, say that you do not know the answer.
+    - Keep the answer concise and do not repeat the question.
+    - Do not mention the context passages or these rules in the answer.
+
+    Context passages:
+
+    {% for document in documents %}
+        {{document.content}}
+    {% endfor %}
+
+    User question:
+
+    {{query}}
+
+    Answer:
+    """
+
+PROMPT_TEMPLATES = {
+    "default": BASE_RAG_PROMPT,
+    "prefix_cache": PREFIX_CACHE_RAG_PROMPT,
+}
+
+# maps the LLM-related settings to the respective generation parameters of the OpenAI API
+LLM_GENERATION_SETTINGS = {
+    "llm_response_max_tokens": "max_tokens",
+    "llm_temperature": "temperature",
+    "llm_top_p": "top_p",
+    "llm_num_completions": "n",
+    "llm_stop_sequences": "stop",
+    "llm_frequency_penalty": "frequency_penalty",
+    "llm_presence_penalty": "presence_penalty",
+    "llm_logit_bias": "logit_bias",
+}
+
+# vLLM only checks the API key when started with --api-key, but the OpenAI client refuses to work without one
+PLACEHOLDER_LLM_API_KEY = "VLLM-PLACEHOLDER-API-KEY"
+
+# the components accepting a top_k - in hybrid mode, the joiner limits the number of the fused documents
+RETRIEVER_COMPONENT_NAMES = ["retriever", "sparse_retriever", "dense_retriever", "document_joiner"]
+
+
 class RagPipelineWrapper(CommonPipelineWrapper):
-    def __init__(self, settings, query=None, evaluation_mode=False):
-        super().__init__(settings)
+    def __init__(self, settings, query=None, evaluation_mode=False, **kwargs):
+        super().__init__(settings, **kwargs)
         self._query = query
         self._evaluation_mode = evaluation_mode
-
-    @cached_property
-    def _streaming_handler(self):
-        """Lazily creates and caches a RagStreamHandler on first access."""
-        return RagStreamHandler(self._settings)
+        self._is_embedding_profile_verified = False
+        self._query_batcher = None
+        self._prefix_cache_stats = PrefixCacheStats()
+
+        self._response_cache = None
+        if self._settings["response_cache_enabled"]:
+            self._response_cache = SemanticResponseCache(
+                similarity_threshold=self._settings["response_cache_similarity_threshold"],
+                ttl=self._settings["response_cache_ttl"],
+                max_entries=self._settings["response_cache_max_entries"])
+            # the cache is cleared whenever the same collection is reindexed from this process
+            register_response_cache(self.get_document_store_id(), self._response_cache)
 
     def _add_embedder(self, query):
-        embedder = SentenceTransformersTextEmbedder(model=self._settings["embedding_model_path"])
+        embedder = SentenceTransformersQueryEmbedder(model=self._settings["embedding_model_path"],
+                                                     **produce_embedding_backend_args(
+                                                         self._settings, self._settings["query_embedding_batch_size"]),
+                                                     **produce_embedding_dimension_args(self._settings),
+                                                     **produce_embedding_cache_args(self._settings))
         self._add_component("embedder", embedder, component_args={"text": query})
 
     def __init_sparse_retriever(self):
-        vector_db_type = self._settings["vector_db_type"]
-        document_store = self._init_document_store(retrieval_mode=True)
+        # the BM25 index is maintained by the indexing pipeline next to the dense collection regardless of its type
         # if vector_db_type.lower() == "elasticsearch":
         #    return ElasticsearchBM25Retriever(document_store=document_store, top_k=self._settings["elasticsearch_top_k"])
-
-        raise ValueError(f"Unsupported vector DB type for sparse retrieval: {vector_db_type}")
+        index = BM25Index(self._settings["bm25_index_path"], k1=self._settings["bm25_k1"], b=self._settings["bm25_b"])
+        if not index.exists():
+            raise ValueError(f"No BM25 index found at {self._settings['bm25_index_path']}, "
+                             f"please index the documents with bm25_index_enabled set")
+        return BM25IndexRetriever(index=index, top_k=self._get_retrieval_top_k())
 
     def __init_dense_retriever(self):
         vector_db_type = self._settings["vector_db_type"]
         document_store = self._init_document_store(retrieval_mode=True)
         if vector_db_type.lower() == "milvus":
-            return MilvusEmbeddingRetriever(document_store=document_store, top_k=self._settings["top_k"])
+            from pragmatic.haystack.milvus_retriever import MilvusSearchRetriever
+            return MilvusSearchRetriever(document_store=document_store, top_k=self._get_retrieval_top_k(),
+                                         rescore_oversampling=get_rescore_oversampling(self._settings))
+        if vector_db_type.lower() == "mmap":
+            return MemoryMappedEmbeddingRetriever(document_store=document_store, top_k=self._get_retrieval_top_k(),
+                                                  rescore_oversampling=get_rescore_oversampling(self._settings))
         # if vector_db_type.lower() == "elasticsearch":
         #    return ElasticsearchEmbeddingRetriever(document_store=document_store, top_k=self._settings["top_k"])
 
@@ -92,7 +177,10 @@ class RagPipelineWrapper(CommonPipelineWrapper):
                                 should_connect=False)
             self._add_embedder(self._query)
             self._add_component("dense_retriever", dense_retriever, should_connect=False)
-            self._add_component("document_joiner", DocumentJoiner(), should_connect=False)
+            document_joiner = DocumentJoiner(join_mode="reciprocal_rank_fusion",
+                                             weights=self._settings["hybrid_retrieval_weights"],
+                                             top_k=self._get_retrieval_top_k())
+            self._add_component("document_joiner", document_joiner, should_connect=False)
 
             # manually connect the components to create a hybrid retrieval topology
             self._pipeline.connect("embedder.embedding", "dense_retriever.query_embedding")
@@ -100,55 +188,95 @@ class RagPipelineWrapper(CommonPipelineWrapper):
             self._pipeline.connect("dense_retriever", "document_joiner")
             self._set_last_connect_point("document_joiner")
 
+    def _uses_rerank_split(self):
+        return self._settings["ranker_enabled"] and self._settings["ranker_candidates"] is not None
+
+    def _get_retrieval_top_k(self):
+        # when reranking, a larger candidate set may be retrieved and then narrowed down to top_k by the ranker
+        return self._settings["ranker_candidates"] if self._uses_rerank_split() else self._settings["top_k"]
+
     def _add_ranker(self):
         if not self._settings["ranker_enabled"]:
             return
-        ranker = TransformersSimilarityRanker(model=self._settings["ranking_model"])
+        ranker = CrossEncoderRanker(model=self._settings["ranking_model"],
+                                    backend=self._settings["ranker_backend"],
+                                    top_k=self._settings["top_k"],
+                                    max_tokens=self._settings["ranker_max_tokens"],
+                                    batch_size=self._settings["ranker_batch_size"],
+                                    score_cache_size=self._settings["ranker_score_cache_size"])
         self._add_component("ranker", ranker, component_args={"query": self._query})
 
+    def _add_context_packer(self):
+        if not self._settings["context_packing_enabled"]:
+            return
+        tokenizer = self._settings["context_packer_tokenizer"] or self._settings["llm"]
+        context_packer = ContextPacker(tokenizer=tokenizer,
+                                       max_tokens=self._settings["context_max_tokens"],
+                                       near_duplicate_threshold=self._settings["context_near_duplicate_threshold"],
+                                       min_passage_tokens=self._settings["context_min_passage_tokens"])
+        self._add_component("context_packer", context_packer)
+
+    def get_context_packing_stats(self):
+        if "context_packer" not in self._pipeline.graph.nodes:
+            return None
+        return self._pipeline.get_component("context_packer").get_stats()
+
+    def _add_context_orderer(self):
+        if self._settings["prompt_layout"] != "prefix_cache":
+            return
+        context_orderer = ContextOrderer(order=self._settings["prompt_context_order"],
+                                         score_bucket_size=self._settings["prompt_score_bucket_size"])
+        self._add_component("context_orderer", context_orderer)
+
     def _add_prompt_builder(self):
-        prompt_builder = PromptBuilder(template=BASE_RAG_PROMPT)
+        prompt_layout = self._settings["prompt_layout"]
+        if prompt_layout not in PROMPT_TEMPLATES:
+            raise ValueError(f"Unsupported prompt layout: {prompt_layout}")
+        prompt_builder = PromptBuilder(template=PROMPT_TEMPLATES[prompt_layout])
         self._add_component("prompt_builder", prompt_builder, component_args={"query": self._query},
                             component_to_connect_point="prompt_builder.documents")
     
+    def _get_llm_api_key(self):
+        api_key = self._settings["llm_api_key"]
+        if api_key is None:
+            return Secret.from_token(PLACEHOLDER_LLM_API_KEY)
+        if isinstance(api_key, str):
+            # e.g., a key given on the command line
+            return Secret.from_token(api_key)
+        return api_key
+
     def _add_llm(self):
-        if "generator_object" in self._settings and self._settings["generator_object"] is not None:
+        if self._uses_custom_generator():
             # an object to use for communicating with the model was explicitly specified and we should use it
             self._add_component("llm", self._settings["generator_object"])
             return
         
-        custom_callback = None
-        if self._settings.get("enable_response_streaming"):
-            custom_callback = self._streaming_handler._streaming_callback
-
-        llm = OpenAIGenerator(
-            api_key=self._settings["llm_api_key"],
+        llm = AsyncOpenAIGenerator(
+            api_key=self._get_llm_api_key(),
             model=self._settings["llm"],
             api_base_url=self._settings["llm_base_url"],
             timeout=self._settings["llm_connection_timeout"],
             max_retries=self._settings["llm_connection_max_retries"],
             system_prompt=self._settings["llm_system_prompt"],
             organization=self._settings["llm_organization"],
-            streaming_callback=custom_callback,
-            generation_kwargs={
-                "max_tokens": self._settings["llm_response_max_tokens"],
-                "temperature": self._settings["llm_temperature"],
-                "top_p": self._settings["llm_top_p"],
-                "n": self._settings["llm_num_completions"],
-                "stop": self._settings["llm_stop_sequences"],
-                "frequency_penalty": self._settings["llm_frequency_penalty"],
-                "presence_penalty": self._settings["llm_presence_penalty"],
-                "logit_bias": self._settings["llm_logit_bias"],
-            }
+            generation_kwargs={arg_name: self._settings[setting_name]
+                               for setting_name, arg_name in LLM_GENERATION_SETTINGS.items()}
         )
         if "llm_http_client" in self._settings and self._settings["llm_http_client"] is not None:
             # Haystack does not support setting the HTTP client directly, so we need to redefine the OpenAI object
-            llm.client = OpenAI(api_key=self._settings["llm_api_key"],
+            llm.client = OpenAI(api_key=self._get_llm_api_key().resolve_value(),
                                 organization=self._settings["llm_organization"],
                                 base_url=self._settings["llm_base_url"],
                                 timeout=self._settings["llm_connection_timeout"],
                                 max_retries=self._settings["llm_connection_max_retries"],
                                 http_client=self._settings["llm_http_client"])
+        if "llm_async_http_client" in self._settings and self._settings["llm_async_http_client"] is not None:
+            llm.async_client = AsyncOpenAI(api_key=self._get_llm_api_key().resolve_value(),
+                                           organization=self._settings["llm_organization"],
+                                           base_url=self._settings["llm_base_url"],
+                                           timeout=self._settings["llm_connection_timeout"],
+                                           max_retries=self._settings["llm_connection_max_retries"],
+                                           http_client=self._settings["llm_async_http_client"])
         self._add_component("llm", llm)
 
     def _add_answer_builder(self):
@@ -157,14 +285,73 @@ class RagPipelineWrapper(CommonPipelineWrapper):
         self._add_component("answer_builder", AnswerBuilder(), component_args={"query": self._query},
                             should_connect=False)
         self._pipeline.connect("llm.replies", "answer_builder.replies")
-        self._pipeline.connect("retriever", "answer_builder.documents")
+        retrieval_output = "document_joiner" if self._settings["retriever_type"] == "hybrid" else "retriever"
+        self._pipeline.connect(retrieval_output, "answer_builder.documents")
+
+    def warm_up(self):
+        super().warm_up()
+        self._verify_embedding_profile()
+
+    def _verify_embedding_profile(self):
+        """
+        Fails fast if the query embeddings cannot be compared with the embeddings the collection was indexed with,
+        e.g., due to a different model or an incompatible inference backend.
+        """
+        if self._is_embedding_profile_verified or "embedder" not in self._pipeline.graph.nodes:
+            return
+        index_profile = load_embedding_profile(self._settings["embedding_profile_path"], self.get_document_store_id())
+        if index_profile is None:
+            logger.debug("No embedding profile was recorded for the collection, skipping the compatibility check")
+        else:
+            query_profile = self._pipeline.get_component("embedder").produce_embedding_profile(EMBEDDING_PROBE_TEXTS)
+            verify_embedding_compatibility(index_profile, query_profile,
+                                           self._settings["embedding_min_probe_similarity"])
+        self._is_embedding_profile_verified = True
 
     def build_pipeline(self):
         self._add_retrievers()
         self._add_ranker()
+        self._add_context_packer()
+        self._add_context_orderer()
         self._add_prompt_builder()
         self._add_llm()
         self._add_answer_builder()
+        self._init_query_batcher()
+
+    def _get_dense_retriever_name(self):
+        return "retriever" if self._settings["retriever_type"] == "dense" else "dense_retriever"
+
+    def _init_query_batcher(self):
+        if not self._settings["query_micro_batching_enabled"] or self._settings["retriever_type"] == "sparse":
+            return
+        self._query_batcher = MicroBatcher(self._embed_and_retrieve_batch,
+                                           max_batch_size=self._settings["query_micro_batching_max_batch_size"],
+                                           window=self._settings["query_micro_batching_window"],
+                                           name="rag-query-batcher")
+
+    def _embed_and_retrieve_batch(self, requests):
+        """
+        Embeds the query texts of the given (text, dense retriever arguments) requests in a single forward pass and
+        retrieves the queries sharing the same retriever arguments with a single multi-vector search request.
+        Returns the retrieved documents and the embedding of each request.
+        """
+        embeddings = self._pipeline.get_component("embedder").run_batch([text for text, _ in requests])["embeddings"]
+        requests_by_args = {}
+        for request_index, (_, retriever_args) in enumerate(requests):
+            args_key = json.dumps(retriever_args, sort_keys=True, default=str)
+            requests_by_args.setdefault(args_key, []).append(request_index)
+
+        retriever = self._pipeline.get_component(self._get_dense_retriever_name())
+        results = [None] * len(requests)
+        for request_indices in requests_by_args.values():
+            batch_documents = retriever.run_batch([embeddings[request_index] for request_index in request_indices],
+                                                  **requests[request_indices[0]][1])["documents"]
+            for request_index, documents in zip(request_indices, batch_documents):
+                results[request_index] = (documents, embeddings[request_index])
+        return results
+
+    def get_micro_batching_stats(self):
+        return self._query_batcher.get_stats() if self._query_batcher is not None else None
 
     def get_evaluation_mode(self):
         return self._evaluation_mode
@@ -175,40 +362,169 @@ class RagPipelineWrapper(CommonPipelineWrapper):
         if should_rebuild_pipeline:
             self._rebuild_pipeline()
 
-    def run(self, query=None):
+    def _uses_custom_generator(self):
+        return "generator_object" in self._settings and self._settings["generator_object"] is not None
+
+    def _produce_run_args(self, query=None, streaming_callback=None, **overrides):
+        """
+        Creates a fresh set of pipeline arguments for a single run, leaving the arguments collected during the pipeline
+        construction untouched. This way, a single pipeline can serve concurrent runs with different parameters.
+
+        Supported overrides are 'top_k', 'milvus_search_params', 'context_max_tokens' and the LLM generation settings
+        listed in LLM_GENERATION_SETTINGS.
+        """
+        run_args = {component_name: dict(component_args) for component_name, component_args in self._args.items()}
+
+        if query:
+            for component_args in run_args.values():
+                for key in ["text", "query"]:
+                    if key in component_args:
+                        component_args[key] = query
+
+        generation_kwargs = {}
+        for override_key, override_value in overrides.items():
+            if override_key == "top_k":
+                # with a rerank split, the number of the retrieved candidates does not depend on top_k
+                component_names = ["ranker"] + ([] if self._uses_rerank_split() else RETRIEVER_COMPONENT_NAMES)
+                for component_name in component_names:
+                    if component_name in self._pipeline.graph.nodes:
+                        run_args.setdefault(component_name, {})["top_k"] = override_value
+            elif override_key == "milvus_search_params" and self._settings["vector_db_type"].lower() == "milvus":
+                dense_retriever_name = "retriever" if self._settings["retriever_type"] == "dense" else "dense_retriever"
+                if dense_retriever_name in self._pipeline.graph.nodes:
+                    run_args.setdefault(dense_retriever_name, {})["search_params"] = override_value
+            elif override_key == "context_max_tokens" and "context_packer" in self._pipeline.graph.nodes:
+                run_args.setdefault("context_packer", {})["max_tokens"] = override_value
+            elif override_key in LLM_GENERATION_SETTINGS:
+                generation_kwargs[LLM_GENERATION_SETTINGS[override_key]] = override_value
+            else:
+                raise ValueError(f"Setting {override_key} cannot be overridden for a single query.")
+
+        if generation_kwargs:
+            run_args.setdefault("llm", {})["generation_kwargs"] = generation_kwargs
+        if streaming_callback is not None:
+            run_args.setdefault("llm", {})["streaming_callback"] = streaming_callback
+
+        return run_args
+
+    def run(self, query=None, **overrides):
         """
             Executes a query against the pipeline.
 
-            If response enable_response_streaming is enabled, returns a generator that yields chunks of the response.
+            If response enable_response_streaming is enabled, returns an iterator that yields chunks of the response.
+            Closing the iterator (or abandoning it) cancels the generation, and its get_metrics method reports the time
+            to the first token, the number of tokens and whether the stream was cancelled.
             Otherwise, returns a string with the final response.
 
             If evaluation mode is enabled, the response is retrieved from the answer builder instead of the standard pipeline output.
 
             Parameters:
                 query (str, optional): The input query string to be processed.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline, such as
+                           top_k or llm_temperature.
 
             Returns:
-                str | generator: A string when enable_response_streaming is False or a generator when enable_response_streaming is True.
+                str | StreamedResponse: A string when enable_response_streaming is False or an iterator when enable_response_streaming is True.
         """
-        # If a query is provided, update the relevant keys in the pipeline arguments
-        if query:
-            for config_dict in self._args.values():
-                for key in ["text", "query"]:
-                    if key in config_dict:
-                        config_dict[key] = query
-
         # Handle incompatible settings 
         if self._settings.get("enable_response_streaming", False) and self._evaluation_mode:
             raise ValueError("Evaluation mode does not support streaming replies.")
 
-        # If streaming is enabled, use the streaming_handler property
+        # If streaming is enabled, a dedicated stream handler is created for every query
         if self._settings.get("enable_response_streaming", False):
-            self._streaming_handler.start_stream(lambda: super(RagPipelineWrapper, self).run())
-            return self._streaming_handler.stream_chunks()
+            streaming_handler = RagStreamHandler(self._settings)
+
+            # Haystack deep-copies the run arguments - unlike bound methods, plain functions are copied by reference
+            def streaming_callback(chunk):
+                streaming_handler._streaming_callback(chunk)
 
+            if self._uses_staged_execution():
+                streaming_handler.start_stream(
+                    partial(self._run_stages, query, streaming_callback=streaming_callback, **overrides))
+            else:
+                run_args = self._produce_run_args(
+                    query, streaming_callback=None if self._uses_custom_generator() else streaming_callback,
+                    **overrides)
+                streaming_handler.start_stream(lambda: super(RagPipelineWrapper, self).run(run_args))
+            return streaming_handler.stream_chunks()
+
+        if self._uses_staged_execution():
+            return self._run_stages(query, **overrides)
 
         # Otherwise, execute a normal pipeline run 
-        result = super().run()
+        result = super().run(self._produce_run_args(query, **overrides))
+        return self._extract_response(result)
+
+    def _uses_response_cache(self):
+        # the evaluation must measure the actual pipeline responses
+        return self._response_cache is not None and not self._evaluation_mode
+
+    def clear_response_cache(self):
+        if self._response_cache is not None:
+            self._response_cache.clear()
+
+    def get_response_cache_stats(self):
+        return self._response_cache.get_stats() if self._response_cache is not None else None
+
+    def _produce_response_cache_key(self, query, query_embedding, documents, overrides):
+        """
+        Returns the arguments identifying the cached response of the given query, or None if the cache is not in use.
+        """
+        if not self._uses_response_cache():
+            return None
+        context_key = compute_context_key(
+            document_ids=[doc.id for doc in documents],
+            run_overrides=overrides,
+            query=(query or self._query) if query_embedding is None else None)
+        return context_key, query_embedding
+
+    def _uses_staged_execution(self):
+        # the response cache and the query micro-batching take over the control flow of the pipeline
+        return self._uses_response_cache() or self._query_batcher is not None
+
+    def _run_stages(self, query, streaming_callback=None, **overrides):
+        """
+        Executes the pipeline stages one by one rather than via the Haystack pipeline, so that the query can be
+        embedded and retrieved together with the concurrent ones and the LLM is only invoked when no cached response
+        matches the query embedding and the retrieved context. A cached response is streamed as a single chunk.
+        """
+        def run_stages():
+            documents, prompt, run_args, response_cache_key = self._prepare_prompt(query, **overrides)
+            response = self._response_cache.lookup(*response_cache_key) if response_cache_key is not None else None
+            if response is not None:
+                if streaming_callback is not None:
+                    streaming_callback(StreamingChunk(content=response))
+                return response
+
+            llm_args = dict(run_args.get("llm", {}))
+            if streaming_callback is not None and not self._uses_custom_generator():
+                llm_args["streaming_callback"] = streaming_callback
+            llm_result = self._pipeline.get_component("llm").run(prompt=prompt, **llm_args)
+            response = self._extract_response(self._run_answer_stage(documents, llm_result, run_args))
+            if streaming_callback is not None and self._uses_custom_generator():
+                streaming_callback(StreamingChunk(content=response))
+
+            if response_cache_key is not None:
+                self._response_cache.store(*response_cache_key, response)
+            return response
+
+        # the components are invoked directly rather than via the Haystack pipeline, which warms them up on its own
+        self.warm_up()
+        return self._run_in_slot(run_stages)
+
+    def get_prefix_cache_stats(self, include_server_metrics=False):
+        """
+        Returns the share of the prompt tokens served from the prefix cache of the LLM server, accumulated over the
+        completions whose usage reports the cached tokens. If include_server_metrics is set, the prefix cache metrics
+        of the whole vLLM server are read from its metrics endpoint as well.
+        """
+        stats = self._prefix_cache_stats.get_stats()
+        if include_server_metrics:
+            stats["server"] = fetch_vllm_prefix_cache_metrics(self._settings["llm_base_url"])
+        return stats
+
+    def _extract_response(self, result):
+        self._prefix_cache_stats.record(result.get("llm", {}))
 
         #  # In evaluation mode, return the answer from the answer builder in string format
         if self._evaluation_mode:
@@ -217,3 +533,223 @@ class RagPipelineWrapper(CommonPipelineWrapper):
         # Return the final LLM reply in string format
         return result.get("llm", {}).get("replies", [""])[0]
 
+    def _run_retrieval_stages(self, run_args):
+        """
+        Executes the retrieval stages of the pipeline for a single query. Returns the retrieved documents and the query
+        embedding (None in sparse retrieval mode).
+        """
+        retriever_type = self._settings["retriever_type"]
+        if retriever_type == "sparse":
+            return self._pipeline.get_component("retriever").run(**run_args["retriever"])["documents"], None
+
+        dense_retriever_name = self._get_dense_retriever_name()
+        dense_retriever_args = run_args.get(dense_retriever_name, {})
+        if self._query_batcher is not None:
+            # the query is embedded and searched together with the queries of the concurrent runs
+            dense_documents, embedding = self._query_batcher.submit((run_args["embedder"]["text"],
+                                                                     dense_retriever_args))
+        else:
+            embedding = self._pipeline.get_component("embedder").run(**run_args["embedder"])["embedding"]
+            dense_documents = self._pipeline.get_component(dense_retriever_name).run(
+                query_embedding=embedding, **dense_retriever_args)["documents"]
+        if retriever_type == "dense":
+            return dense_documents, embedding
+
+        # retriever_type == "hybrid"
+        sparse_documents = self._pipeline.get_component("sparse_retriever").run(
+            **run_args["sparse_retriever"])["documents"]
+        return self._pipeline.get_component("document_joiner").run(
+            documents=[sparse_documents, dense_documents], **run_args.get("document_joiner", {}))["documents"], embedding
+
+    def _run_prompt_stages(self, documents, run_args):
+        """
+        Executes the ranking and the prompt building stages of the pipeline for a single query whose documents were
+        already retrieved. Returns the documents placed in the prompt and the prompt itself.
+        """
+        if "ranker" in self._pipeline.graph.nodes:
+            documents = self._pipeline.get_component("ranker").run(documents=documents,
+                                                                   **run_args["ranker"])["documents"]
+        if "context_packer" in self._pipeline.graph.nodes:
+            documents = self._pipeline.get_component("context_packer").run(
+                documents=documents, **run_args.get("context_packer", {}))["documents"]
+        if "context_orderer" in self._pipeline.graph.nodes:
+            documents = self._pipeline.get_component("context_orderer").run(documents=documents)["documents"]
+        return documents, self._pipeline.get_component("prompt_builder").run(documents=documents,
+                                                                             **run_args["prompt_builder"])["prompt"]
+
+    def _run_answer_stage(self, documents, llm_result, run_args):
+        result = {"llm": llm_result}
+        if self._evaluation_mode:
+            result["answer_builder"] = self._pipeline.get_component("answer_builder").run(
+                replies=llm_result["replies"], documents=documents, **run_args["answer_builder"])
+        return result
+
+    def _run_generation_stages(self, query, documents, query_embedding=None, **overrides):
+        """
+        Executes the pipeline stages following the retrieval (ranking, prompt building, generation and answer building)
+        for a single query whose documents were already retrieved. Returns the final response.
+        """
+        run_args = self._produce_run_args(query, **overrides)
+        prompt_documents, prompt = self._run_prompt_stages(documents, run_args)
+        response_cache_key = self._produce_response_cache_key(query, query_embedding, prompt_documents, overrides)
+        if response_cache_key is not None:
+            response = self._response_cache.lookup(*response_cache_key)
+            if response is not None:
+                return response
+
+        llm_result = self._pipeline.get_component("llm").run(prompt=prompt, **run_args.get("llm", {}))
+        response = self._extract_response(self._run_answer_stage(documents, llm_result, run_args))
+        if response_cache_key is not None:
+            self._response_cache.store(*response_cache_key, response)
+        return response
+
+    def _prepare_prompt(self, query, **overrides):
+        """
+        Executes all the blocking pipeline stages preceding the generation for a single query.
+        Returns the retrieved documents, the final prompt, the arguments of the current run and the key of the cached
+        response (None if the response cache is not in use).
+        """
+        run_args = self._produce_run_args(query, **overrides)
+        documents, query_embedding = self._run_retrieval_stages(run_args)
+        prompt_documents, prompt = self._run_prompt_stages(documents, run_args)
+        response_cache_key = self._produce_response_cache_key(query, query_embedding, prompt_documents, overrides)
+        return documents, prompt, run_args, response_cache_key
+
+    async def arun(self, query, executor=None, **overrides):
+        """
+            Asynchronously executes a query against the pipeline without blocking the event loop.
+
+            The embedding, retrieval, ranking and prompt building stages are offloaded to the given executor (or the
+            default executor of the event loop), while the LLM is invoked via a non-blocking client.
+
+            Parameters:
+                query (str): The input query string to be processed.
+                executor (concurrent.futures.Executor, optional): The executor for the blocking stages.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                str: The final response (or the generated answer object in evaluation mode).
+        """
+        loop = asyncio.get_running_loop()
+        run_record = self._instrumentation.start_run()
+        try:
+            documents, prompt, run_args, response_cache_key = await loop.run_in_executor(
+                executor, partial(self._instrumentation.run_in_record, run_record,
+                                  partial(self._prepare_prompt, query, **overrides)))
+            if response_cache_key is not None:
+                response = self._response_cache.lookup(*response_cache_key)
+                if response is not None:
+                    return response
+
+            llm = self._pipeline.get_component("llm")
+            generation_kwargs = run_args.get("llm", {}).get("generation_kwargs")
+            measurement = self._instrumentation.start_component("llm")
+            if isinstance(llm, AsyncOpenAIGenerator):
+                llm_result = await llm.generate_async(prompt, generation_kwargs=generation_kwargs)
+            else:
+                # a custom generator object without asynchronous support is invoked in the executor
+                llm_result = await loop.run_in_executor(executor,
+                                                        partial(llm.run, prompt=prompt, **run_args.get("llm", {})))
+            self._instrumentation.finish_component(run_record, measurement, llm_result)
+
+            response = self._extract_response(self._run_answer_stage(documents, llm_result, run_args))
+            if response_cache_key is not None:
+                self._response_cache.store(*response_cache_key, response)
+            return response
+        finally:
+            self._instrumentation.finish_run(run_record)
+
+    async def astream(self, query, executor=None, **overrides):
+        """
+            Asynchronously executes a query against the pipeline, yielding the chunks of the response as they arrive.
+
+            Parameters:
+                query (str): The input query string to be processed.
+                executor (concurrent.futures.Executor, optional): The executor for the blocking stages.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                async generator: Yields the chunks of the response.
+        """
+        if self._evaluation_mode:
+            raise ValueError("Evaluation mode does not support streaming replies.")
+
+        loop = asyncio.get_running_loop()
+        run_record = self._instrumentation.start_run()
+        try:
+            _, prompt, run_args, response_cache_key = await loop.run_in_executor(
+                executor, partial(self._instrumentation.run_in_record, run_record,
+                                  partial(self._prepare_prompt, query, **overrides)))
+            if response_cache_key is not None:
+                response = self._response_cache.lookup(*response_cache_key)
+                if response is not None:
+                    yield response
+                    return
+
+            llm = self._pipeline.get_component("llm")
+            measurement = self._instrumentation.start_component("llm")
+            if not isinstance(llm, AsyncOpenAIGenerator):
+                # a custom generator object without asynchronous support produces its response at once
+                llm_result = await loop.run_in_executor(executor,
+                                                        partial(llm.run, prompt=prompt, **run_args.get("llm", {})))
+                self._instrumentation.finish_component(run_record, measurement, llm_result)
+                chunks = [llm_result["replies"][0]]
+                yield chunks[0]
+            else:
+                chunks = []
+                async for chunk in llm.stream_async(prompt,
+                                                    generation_kwargs=run_args.get("llm", {}).get("generation_kwargs")):
+                    if measurement is not None:
+                        measurement.on_streaming_chunk()
+                    chunks.append(chunk)
+                    yield chunk
+                self._instrumentation.finish_component(run_record, measurement)
+
+            # only a completely streamed response is cached
+            if response_cache_key is not None:
+                self._response_cache.store(*response_cache_key, "".join(chunks))
+        finally:
+            self._instrumentation.finish_run(run_record)
+
+    def run_batch(self, queries, batch_size=None, **overrides):
+        """
+            Executes a list of queries against the pipeline.
+
+            In dense retrieval mode, the queries are embedded in batched forward passes and each batch is retrieved with
+            a single multi-vector search request. The prompts are then sent to the LLM concurrently.
+            In the other retrieval modes, the queries are executed as concurrent pipeline runs.
+
+            Parameters:
+                queries (list): The input query strings to be processed.
+                batch_size (int, optional): The number of queries to embed and retrieve at once.
+                overrides: Per-query values for the settings that do not require rebuilding the pipeline.
+
+            Returns:
+                list: The responses in the order of the input queries.
+        """
+        if self._settings.get("enable_response_streaming", False):
+            raise ValueError("Batched execution does not support streaming replies.")
+
+        # the pipeline components are invoked directly below, so they have to be warmed up explicitly
+        self.warm_up()
+
+        queries = list(queries)
+        actual_batch_size = batch_size if batch_size is not None else self._settings["query_batch_size"]
+        retriever_args = self._produce_run_args(**overrides).get("retriever", {})
+
+        with ThreadPoolExecutor(max_workers=self._settings["max_concurrent_queries"]) as executor:
+            if self._settings["retriever_type"] != "dense":
+                return list(executor.map(lambda query: self.run(query, **overrides), queries))
+
+            embedder = self._pipeline.get_component("embedder")
+            retriever = self._pipeline.get_component("retriever")
+            futures = []
+            for batch_start in range(0, len(queries), actual_batch_size):
+                batch_queries = queries[batch_start:batch_start + actual_batch_size]
+                embeddings = embedder.run_batch(batch_queries)["embeddings"]
+                batch_documents = retriever.run_batch(embeddings, **retriever_args)["documents"]
+                for query, embedding, documents in zip(batch_queries, embeddings, batch_documents):
+                    futures.append(executor.submit(self._run_recorded, partial(
+                        self._run_generation_stages, query, documents, embedding, **overrides)))
+
+            return [future.result() for future in futures]
@@ -0,0 +1,395 @@
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from threading import Lock, Thread
+
+from pragmatic.pipelines.engine import RagQueryEngine
+from pragmatic.pipelines.instrumentation import render_prometheus_metrics
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """
+    An error reported to the client with the given HTTP status.
+    """
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+
+class AdmissionController(object):
+    """
+    Bounds the number of requests executed at once. Up to max_queued_requests further requests wait for a free slot
+    for at most queue_timeout seconds, and the requests beyond that are rejected with 429, so that an overloaded server
+    sheds load instead of accumulating an unbounded backlog. Must only be used from the event loop thread.
+    """
+
+    def __init__(self, max_concurrent_requests, max_queued_requests, queue_timeout=None):
+        self._max_concurrent_requests = max_concurrent_requests
+        self._max_queued_requests = max_queued_requests
+        self._queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._in_flight = 0
+        self._queued = 0
+        self._rejected = 0
+
+    def _reject(self, reason):
+        self._rejected += 1
+        raise RequestError(429, reason, headers=[(b"retry-after", b"1")])
+
+    @asynccontextmanager
+    async def admit(self):
+        if not self._semaphore.locked():
+            # a free slot is taken without suspending, so that the counters stay consistent with the semaphore
+            await self._semaphore.acquire()
+        else:
+            if self._queued >= self._max_queued_requests:
+                self._reject("Too many concurrent requests, retry later.")
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self._queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("Timed out waiting for a free request slot, retry later.")
+            finally:
+                self._queued -= 1
+
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def get_stats(self):
+        return {"in_flight": self._in_flight, "queued": self._queued, "rejected": self._rejected,
+                "max_concurrent": self._max_concurrent_requests, "max_queued": self._max_queued_requests}
+
+
+class RagServer(object):
+    """
+    An ASGI application serving a warm RAG query engine over HTTP:
+
+        GET  /health         - liveness, always 200 once the process serves requests
+        GET  /ready          - 200 once the query pipeline is warmed up, 503 while warming up or if the warm-up failed
+        POST /query          - {"query": str, "stream": bool, "overrides": dict}, streamed as server-sent events if
+                               stream is true
+        POST /batch-query    - {"queries": [str], "batch_size": int, "overrides": dict}
+        POST /index          - {"path": str} triggers the indexing of a directory under server_index_path in the
+                               background, the returned job can be polled via GET /index/<job_id>
+        GET  /metrics        - the Prometheus metrics, if the prometheus instrumentation exporter is enabled
+
+    The warm-up starts in the background when the ASGI lifespan starts (or with the first request if the server does
+    not support lifespan events), so that the health endpoint responds while the models are being loaded.
+    """
+
+    MAX_KEPT_INDEXING_JOBS = 100
+
+    def __init__(self, settings):
+        self._settings = settings
+        self._engine = RagQueryEngine(settings)
+        self._admission_controller = None
+        self._warm_up_lock = Lock()
+        self._warm_up_state = {"status": "pending", "error": None, "duration": None}
+
+        # indexing jobs are executed one at a time, in the order they were triggered
+        self._indexing_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-server-indexing")
+        self._indexing_jobs = OrderedDict()
+
+        self._routes = {
+            ("GET", "/health"): self._handle_health,
+            ("GET", "/ready"): self._handle_ready,
+            ("POST", "/query"): self._handle_query,
+            ("POST", "/batch-query"): self._handle_batch_query,
+            ("POST", "/index"): self._handle_index,
+            ("GET", "/metrics"): self._handle_metrics,
+        }
+
+    def get_engine(self):
+        return self._engine
+
+    def start_warm_up(self):
+        """
+        Warms up the query engine in a background thread. Safe to call multiple times.
+        """
+        with self._warm_up_lock:
+            if self._warm_up_state["status"] != "pending":
+                return
+            self._warm_up_state["status"] = "warming_up"
+        Thread(target=self._warm_up, name="rag-server-warm-up", daemon=True).start()
+
+    def _warm_up(self):
+        start_time = time.perf_counter()
+        try:
+            self._engine.warm_up()
+            self._warm_up_state["status"] = "ready"
+        except Exception as e:
+            logger.exception("Failed to warm up the RAG query engine")
+            self._warm_up_state.update(status="failed", error=str(e))
+        self._warm_up_state["duration"] = time.perf_counter() - start_time
+
+    def is_ready(self):
+        return self._warm_up_state["status"] == "ready"
+
+    def close(self):
+        self._indexing_executor.shutdown(wait=False)
+        self._engine.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        self.start_warm_up()
+        if self._admission_controller is None:
+            # the controller is created within the running event loop
+            self._admission_controller = AdmissionController(self._settings["server_max_concurrent_requests"],
+                                                             self._settings["server_max_queued_requests"],
+                                                             self._settings["server_queue_timeout"])
+        try:
+            await self._dispatch(scope, receive, send)
+        except RequestError as e:
+            await self._send_json(send, e.status, {"error": e.message}, headers=e.headers)
+        except Exception as e:
+            logger.exception(f"Failed to handle {scope['method']} {scope['path']}")
+            await self._send_json(send, 500, {"error": str(e)})
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start_warm_up()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if method == "GET" and path.startswith("/index/"):
+            await self._handle_index_status(path[len("/index/"):], send)
+            return
+        handler = self._routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self._routes):
+                raise RequestError(405, f"Method {method} is not allowed for {path}.")
+            raise RequestError(404, f"Unknown endpoint: {path}")
+        await handler(scope, receive, send)
+
+    @staticmethod
+    async def _read_json(receive):
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise RequestError(400, "The client disconnected before sending the request body.")
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        if not body:
+            return {}
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestError(400, f"Invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise RequestError(400, "The request body must be a JSON object.")
+        return payload
+
+    @staticmethod
+    async def _send_response(send, status, body, content_type, headers=None):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] +
+                               (headers or [])})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send, status, payload, headers=None):
+        await self._send_response(send, status, json.dumps(payload, default=str).encode(), b"application/json",
+                                  headers=headers)
+
+    def _ensure_ready(self):
+        if self._warm_up_state["status"] == "failed":
+            raise RequestError(503, f"The query pipeline failed to warm up: {self._warm_up_state['error']}")
+        if not self.is_ready():
+            raise RequestError(503, "The query pipeline is warming up, retry later.",
+                               headers=[(b"retry-after", b"5")])
+
+    async def _handle_health(self, scope, receive, send):
+        await self._send_json(send, 200, {"status": "ok"})
+
+    async def _handle_ready(self, scope, receive, send):
+        await self._send_json(send, 200 if self.is_ready() else 503, {
+            "ready": self.is_ready(),
+            "warm_up": dict(self._warm_up_state),
+            "requests": self._admission_controller.get_stats(),
+            "indexing_jobs": {job_id: job["status"] for job_id, job in self._indexing_jobs.items()},
+        })
+
+    @staticmethod
+    def _get_overrides(payload):
+        overrides = payload.get("overrides") or {}
+        if not isinstance(overrides, dict):
+            raise RequestError(400, "The overrides must be a JSON object.")
+        return overrides
+
+    async def _handle_query(self, scope, receive, send):
+        payload = await self._read_json(receive)
+        query = payload.get("query")
+        if not isinstance(query, str) or not query:
+            raise RequestError(400, "A non-empty query string is required.")
+        overrides = self._get_overrides(payload)
+        stream = payload.get("stream", self._settings["enable_response_streaming"])
+
+        self._ensure_ready()
+        async with self._admission_controller.admit():
+            if stream:
+                await self._stream_query(query, overrides, receive, send)
+                return
+            try:
+                answer = await self._engine.arun(query, **overrides)
+            except ValueError as e:
+                raise RequestError(400, str(e))
+            await self._send_json(send, 200, {"query": query, "answer": answer})
+
+    @staticmethod
+    def _produce_event(data, event=None):
+        prefix = f"event: {event}\n" if event is not None else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n".encode()
+
+    async def _stream_query(self, query, overrides, receive, send):
+        """
+        Streams the response chunks as server-sent events, followed by a "done" event. The generation is abandoned as
+        soon as the client disconnects.
+        """
+        chunks = self._engine.astream(query, **overrides)
+        try:
+            # the first chunk is awaited before the response starts, so that invalid requests still produce a 400
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except Exception as e:
+            await chunks.aclose()
+            if isinstance(e, ValueError):
+                raise RequestError(400, str(e))
+            raise
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                                (b"x-accel-buffering", b"no")]})
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        disconnect_watcher = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            if first_chunk is not None:
+                await send({"type": "http.response.body", "body": self._produce_event({"text": first_chunk}),
+                            "more_body": True})
+                async for chunk in chunks:
+                    if disconnect_watcher.done():
+                        logger.debug("The client disconnected, abandoning the streamed response")
+                        return
+                    await send({"type": "http.response.body", "body": self._produce_event({"text": chunk}),
+                                "more_body": True})
+            final_event = self._produce_event({}, event="done")
+        except Exception as e:
+            logger.exception("Failed to stream the response")
+            final_event = self._produce_event({"error": str(e)}, event="error")
+        finally:
+            disconnect_watcher.cancel()
+            await chunks.aclose()
+
+        await send({"type": "http.response.body", "body": final_event, "more_body": False})
+
+    async def _handle_batch_query(self, scope, receive, send):
+        payload = await self._read_json(receive)
+        queries = payload.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(query, str) and query for query in queries):
+            raise RequestError(400, "A list of non-empty query strings is required.")
+        overrides = self._get_overrides(payload)
+
+        self._ensure_ready()
+        async with self._admission_controller.admit():
+            try:
+                answers = await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self._engine.run_batch(queries, batch_size=payload.get("batch_size"), **overrides))
+            except ValueError as e:
+                raise RequestError(400, str(e))
+        await self._send_json(send, 200, {"answers": answers})
+
+    def _resolve_index_path(self, relative_path):
+        index_root = self._settings["server_index_path"]
+        if index_root is None:
+            raise RequestError(403, "Indexing via the API is disabled, set server_index_path to enable it.")
+        index_root = os.path.realpath(index_root)
+        path = os.path.realpath(os.path.join(index_root, relative_path or ""))
+        if os.path.commonpath([index_root, path]) != index_root:
+            raise RequestError(400, "The path must be located under the configured server_index_path.")
+        if not os.path.isdir(path):
+            raise RequestError(404, f"No such directory: {relative_path}")
+        return path
+
+    def _run_indexing_job(self, job_id, path):
+        from pragmatic.pipelines.indexing import LocalFileIndexingPipelineWrapper
+
+        job = self._indexing_jobs[job_id]
+        job.update(status="running", start_time=time.time())
+        try:
+            # the embedding models are shared with the warm query pipeline via the process-wide model registries
+            pipeline = LocalFileIndexingPipelineWrapper(self._settings, path)
+            pipeline.build_pipeline()
+            result = pipeline.run()
+            job["result"] = {key: result[key] for key in ["writer", "indexing_report"] if key in result}
+            job["status"] = "completed"
+        except Exception as e:
+            logger.exception(f"Indexing job {job_id} failed")
+            job.update(status="failed", error=str(e))
+        job["end_time"] = time.time()
+
+    async def _handle_index(self, scope, receive, send):
+        payload = await self._read_json(receive)
+        path = self._resolve_index_path(payload.get("path"))
+
+        job_id = secrets.token_hex(8)
+        self._indexing_jobs[job_id] = {"job_id": job_id, "path": path, "status": "queued", "submit_time": time.time()}
+        while len(self._indexing_jobs) > RagServer.MAX_KEPT_INDEXING_JOBS:
+            self._indexing_jobs.popitem(last=False)
+        self._indexing_executor.submit(self._run_indexing_job, job_id, path)
+        await self._send_json(send, 202, self._indexing_jobs[job_id])
+
+    async def _handle_index_status(self, job_id, send):
+        if job_id not in self._indexing_jobs:
+            raise RequestError(404, f"Unknown indexing job: {job_id}")
+        await self._send_json(send, 200, self._indexing_jobs[job_id])
+
+    async def _handle_metrics(self, scope, receive, send):
+        if not self._settings["instrumentation_enabled"] or \
+                "prometheus" not in self._settings["instrumentation_exporters"]:
+            raise RequestError(404, "The prometheus instrumentation exporter is not enabled.")
+        metrics = render_prometheus_metrics(self._settings["instrumentation_prometheus_path"])
+        await self._send_response(send, 200, metrics.encode(), b"text/plain; version=0.0.4")
+
+
+def serve(settings):
+    """
+    Serves the RAG API on server_host:server_port until interrupted. Requires uvicorn.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("Serving the RAG API requires uvicorn, install it via 'pip install uvicorn'") from None
+    uvicorn.run(RagServer(settings), host=settings["server_host"], port=settings["server_port"], lifespan="on")
@@ -1,12 +1,86 @@
+import time
 from threading import Thread, Event
-from queue import Queue
+from queue import Queue, Empty, Full
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# placed into the queue once the pipeline run is over
+_END_OF_STREAM = object()
+
+
+class StreamCancelledError(Exception):
+    """
+    Raised from the streaming callback once the consumer of the stream went away, aborting the pipeline run.
+    """
+
+
+def _is_stream_cancellation(error):
+    """
+    Returns True if the given exception is a StreamCancelledError or was caused by one - Pipeline.run wraps the
+    exceptions raised by the components (and thus by the streaming callback) in a PipelineRuntimeError.
+    """
+    while error is not None:
+        if isinstance(error, StreamCancelledError):
+            return True
+        error = error.__cause__
+    return False
+
+
+class StreamedResponse:
+    """
+    An iterator over the chunks of a streamed response. Closing it (explicitly, by leaving its with block or by
+    abandoning it, once the object is garbage collected) cancels the generation, even if no chunk was consumed yet.
+    The handler cannot rely on its own finalizer for that, since the producer thread keeps it alive.
+    """
+
+    def __init__(self, stream_handler):
+        self._stream_handler = stream_handler
+        self._chunks = stream_handler._iterate_chunks()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        # closing a generator that was never started does not execute its finally block
+        self._stream_handler.stop_stream()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def get_metrics(self):
+        return self._stream_handler.get_metrics()
+
 
 class RagStreamHandler:
+    # the interval at which a producer blocked on a full buffer checks whether the stream was cancelled
+    CANCELLATION_CHECK_INTERVAL = 0.1
+
     def __init__(self, settings):
         self._timeout = settings.get("streaming_timeout", 60)  # seconds
+        self._buffer_size = settings.get("streaming_buffer_size", 64)
         self._stream_queue = None
         self._stream_thread = None
         self._stop_event = Event()
+        self._error = None
+
+        self._start_time = None
+        self._first_chunk_time = None
+        self._end_time = None
+        self._num_chunks = 0
+        self._cancelled = False
+        self._timed_out = False
 
     def __del__(self):
         """
@@ -14,47 +88,105 @@ class RagStreamHandler:
         """
         self.stop_stream()
 
+    def _put(self, item):
+        """
+        Places the given item into the bounded queue, blocking while the queue is full. Returns False if the stream
+        was cancelled in the meantime.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._stream_queue.put(item, timeout=RagStreamHandler.CANCELLATION_CHECK_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
     def _streaming_callback(self, chunk):
         """
-        Callback to be passed to the LLM, which places streamed tokens into the queue.
+        Callback to be passed to the LLM, which places streamed tokens into the queue. Raises StreamCancelledError
+        once the stream was cancelled, which aborts the generation.
         """
-        if self._stream_queue:
-            self._stream_queue.put(chunk.content)
+        if chunk.content:
+            if self._first_chunk_time is None:
+                self._first_chunk_time = time.perf_counter()
+            self._num_chunks += 1
+        if not self._put(chunk.content):
+            raise StreamCancelledError()
 
     def _run_streaming_in_thread(self, run_callable):
         """
         Invokes the provided callable (the pipeline's run method),
-        then signals the end of streaming by putting None in the queue.
+        then signals the end of streaming by putting the end marker in the queue.
         """
-        run_callable()
-        if self._stream_queue:
-            self._stream_queue.put(None)
+        try:
+            run_callable()
+        except Exception as e:
+            if _is_stream_cancellation(e):
+                logger.debug("The stream was cancelled, the generation was aborted")
+            else:
+                # re-raised in the consumer thread
+                self._error = e
+        self._end_time = time.perf_counter()
+        self._put(_END_OF_STREAM)
 
     def start_stream(self, run_callable):
         """
         Initializes the queue and the background thread that executes `run_callable`.
         """
-        self._stream_queue = Queue()
-        self._stream_thread = Thread(target=self._run_streaming_in_thread, args=(run_callable,))
+        self._stream_queue = Queue(maxsize=self._buffer_size)
+        self._start_time = time.perf_counter()
+        self._stream_thread = Thread(target=self._run_streaming_in_thread, args=(run_callable,), name="rag-stream",
+                                     daemon=True)
         self._stream_thread.start()
 
     def stop_stream(self):
         """
-        Gracefully stops the streaming thread if it is running.
+        Cancels the stream if it is still running. The generation is aborted once the LLM produces its next chunk,
+        without waiting for the background thread to finish.
         """
-        if self._stream_thread and self._stream_thread.is_alive():
-            self._stop_event.set()  # Signal the thread to stop
-            self._stream_thread.join()  # Wait for the thread to finish
-        self._stream_queue = None  # Clean up the queue
-        self._stop_event.clear()  # Reset the flag for future use
+        if self._stream_thread is not None and self._end_time is None:
+            # the pipeline run is still in progress
+            self._cancelled = True
+        self._stop_event.set()
 
-    def stream_chunks(self):
+    def _iterate_chunks(self):
         """
-        Yields streamed chunks from the queue. 
-        Terminates when `None` is retrieved from the queue.
+        Yields streamed chunks from the queue until the end marker is retrieved. Raises TimeoutError if no chunk
+        arrives within streaming_timeout seconds.
         """
         try:
-            for chunk in iter(lambda: self._stream_queue.get(timeout=self._timeout), None):
+            while True:
+                try:
+                    chunk = self._stream_queue.get(timeout=self._timeout)
+                except Empty:
+                    self._timed_out = True
+                    raise TimeoutError(f"No response chunk was received within {self._timeout} seconds")
+                if chunk is _END_OF_STREAM:
+                    break
                 yield chunk
+            if self._error is not None:
+                raise self._error
         finally:
             self.stop_stream()
+            logger.debug(f"Stream metrics: {self.get_metrics()}")
+
+    def stream_chunks(self):
+        """
+        Returns an iterator over the streamed chunks.
+        """
+        return StreamedResponse(self)
+
+    def get_metrics(self):
+        """
+        Returns the time to the first chunk and the total duration (in seconds), the number of the streamed chunks
+        (tokens) and whether the stream was cancelled or timed out.
+        """
+        end_time = self._end_time if self._end_time is not None else time.perf_counter()
+        return {
+            "time_to_first_token": self._first_chunk_time - self._start_time
+            if self._first_chunk_time is not None else None,
+            "duration": end_time - self._start_time if self._start_time is not None else None,
+            "tokens": self._num_chunks,
+            "cancelled": self._cancelled,
+            "timed_out": self._timed_out,
+        }
@@ -0,0 +1,143 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StubLLMServer(object):
+    """
+    A minimal OpenAI-compatible chat completions endpoint returning canned replies, so that the RAG pipeline can be
+    benchmarked and tested without a real LLM. Both regular and streaming (server-sent events) requests are supported.
+    Each reply consists of response_tokens words, and each word takes token_latency seconds to "generate".
+
+    The usage reports the prompt words as the prompt tokens and simulates a prefix cache: the words of the longest
+    common prefix with one of the last PREFIX_CACHE_SIZE prompts are reported as cached tokens.
+    """
+
+    PREFIX_CACHE_SIZE = 256
+
+    def __init__(self, response_tokens=20, token_latency=0.0, host="127.0.0.1", port=0):
+        self._response_tokens = response_tokens
+        self._token_latency = token_latency
+        self._server = ThreadingHTTPServer((host, port), self._produce_handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+        self._prefix_cache_lock = Lock()
+        self._cached_prompts = []
+
+    def get_base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever, name="stub-llm-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Started a stub LLM server at {self.get_base_url()}")
+        return self.get_base_url()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _produce_reply_tokens(self, request_body):
+        max_tokens = request_body.get("max_tokens") or self._response_tokens
+        return [f"token{i} " for i in range(min(self._response_tokens, max_tokens))]
+
+    def _count_cached_tokens(self, prompt_words):
+        with self._prefix_cache_lock:
+            cached_tokens = 0
+            for cached_words in self._cached_prompts:
+                common_length = 0
+                for word, cached_word in zip(prompt_words, cached_words):
+                    if word != cached_word:
+                        break
+                    common_length += 1
+                cached_tokens = max(cached_tokens, common_length)
+            self._cached_prompts.append(prompt_words)
+            del self._cached_prompts[:-self.PREFIX_CACHE_SIZE]
+        return cached_tokens
+
+    def _produce_usage(self, request_body, completion_tokens):
+        prompt_words = [word for message in request_body["messages"]
+                        for word in str(message.get("content", "")).split()]
+        prompt_tokens = len(prompt_words)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": self._count_cached_tokens(prompt_words)}}
+
+    def _produce_handler_class(self):
+        server = self
+
+        class StubLLMRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # the headers and the body are written separately, which would otherwise delay each reply by the
+            # delayed ACK timeout of the client
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                return
+
+            def _send_json(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_event(self, data):
+                event = f"data: {data}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+
+            def _produce_chunk(self, request_body, delta, finish_reason=None, usage=None):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": request_body["model"],
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                if usage is not None:
+                    chunk["usage"] = usage
+                return json.dumps(chunk)
+
+            def do_POST(self):
+                request_body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                tokens = server._produce_reply_tokens(request_body)
+                usage = server._produce_usage(request_body, len(tokens))
+
+                if not request_body.get("stream"):
+                    time.sleep(server._token_latency * len(tokens))
+                    self._send_json({"id": "stub", "object": "chat.completion", "created": int(time.time()),
+                                     "model": request_body["model"],
+                                     "choices": [{"index": 0, "finish_reason": "stop",
+                                                  "message": {"role": "assistant", "content": "".join(tokens)}}],
+                                     "usage": usage})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(server._token_latency)
+                        self._send_event(self._produce_chunk(request_body, {"content": token}))
+                    self._send_event(self._produce_chunk(request_body, {}, finish_reason="stop", usage=usage))
+                    self._send_event("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stopped reading the stream
+                    return
+
+        return StubLLMRequestHandler
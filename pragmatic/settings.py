@@ -1,10 +1,11 @@
 # from haystack_integrations.components.evaluators.ragas import RagasMetric
-from haystack.utils import Secret
-from sentence_transformers.training_args import BatchSamplers
+
+# the settings module is imported by every entry point of the tool, including bin/pragmatic, so it must not import
+# any heavy dependency - the values below are therefore plain Python objects resolved by the components using them
 
 DEFAULT_SETTINGS = {
     # basic settings
-    "vector_db_type": "milvus",
+    "vector_db_type": "milvus",  # milvus or mmap (an in-process store for small corpora, see below)
     "retriever_type": "dense",
     "embedding_model_path": "sentence-transformers/all-MiniLM-L12-v2", #"./cache/finetuned_embedding-final",
 
@@ -22,11 +23,38 @@ DEFAULT_SETTINGS = {
     "milvus_drop_old_collection": True,
     "milvus_connection_timeout": None,
     "milvus_collection_name": "PragmaticCollection",
+    # the index type - FLAT, IVF_FLAT, IVF_SQ8, IVF_PQ, HNSW, DISKANN or AUTOINDEX; None selects IVF_FLAT in Lite mode
+    # and HNSW otherwise. Milvus Lite only supports FLAT, IVF_FLAT and AUTOINDEX natively.
+    "milvus_index_type": None,
+    "milvus_metric_type": "L2",  # L2, IP or COSINE
+    "milvus_index_params": None,  # the build parameters overriding the defaults, e.g., {"M": 16, "efConstruction": 200}
+    "milvus_search_params": None,  # the search parameters overriding the defaults, e.g., {"ef": 128} or {"nprobe": 32}
+    "milvus_consistency_level": "Session",  # Strong, Bounded, Session or Eventually
+
+    # in-process memory-mapped vector store settings - the store performs an exact search and requires no server,
+    # which makes it suitable for small corpora, tests and laptops; milvus_drop_old_collection applies to it as well
+    "mmap_store_path": "./vector_store",
+    "mmap_store_dtype": "float32",  # float32 or float16 (halves the size of the matrix, but searches it more slowly)
+    "mmap_store_similarity": "cosine",  # cosine or dot_product
+
+    # vector quantization settings - with int8 or binary, the search scans compressed vectors (4 or 32 times smaller
+    # than float32) and rescores an oversampled set of candidates with the full-precision vectors kept on disk. Milvus
+    # only supports int8 (with an IVF_SQ8 index, unless milvus_index_type is set), the mmap store supports both.
+    "vector_quantization": None,  # None, int8 or binary
+    "vector_quantization_rescore_oversampling": 4,  # top_k * this many candidates are rescored, None disables rescoring
+    # the indexing result reports the memory saved and the recall@top_k relative to the exact search, measured with
+    # this many stored vectors as queries (out of at most vector_quantization_report_max_vectors for Milvus), 0 disables
+    "vector_quantization_report_queries": 100,
+    "vector_quantization_report_max_vectors": 10000,
 
     # chunking options
     "chunking_enabled": True,
     "chunking_method": "docling",
     "max_tokens_per_chunk": 512,
+    # when enabled, the chunks of each converted Docling document are cached on disk keyed by the hash of its content,
+    # the tokenizer and max_tokens_per_chunk, so that unchanged documents are not parsed and chunked again
+    "docling_chunk_cache_enabled": False,
+    "docling_chunk_cache_path": "./cache/docling_chunks",
     "split_by": "word",
     "split_length": 200,
     "split_overlap": 20,
@@ -34,13 +62,46 @@ DEFAULT_SETTINGS = {
 
     # other indexing-related settings
     "process_input_recursively": True,
+    # when set, the files are converted, embedded and written in micro-batches of this many files to bound memory usage
+    "indexing_batch_size": None,
+    "indexing_num_workers": 1,  # when greater than 1, the files are converted and split by a pool of worker processes
+    # when enabled, only the added and modified files are indexed and the chunks of the deleted files are removed;
+    # milvus_drop_old_collection is then ignored and the collection is dropped and rebuilt (with a logged warning)
+    # whenever the manifest at indexing_manifest_path is missing, unreadable or was created with different indexing
+    # settings - so the manifest has to be kept next to an incrementally indexed collection
+    "incremental_indexing": False,
+    "indexing_manifest_path": "./indexing_manifest.json",
+    # when enabled, the chunk and query embeddings are stored in a persistent on-disk cache keyed by the embedding model
+    # and the normalized text, so that unchanged chunks and repeated queries are not embedded again - a cache directory is
+    # used by a single process at a time, the other processes sharing the same path proceed without the cache
+    "embedding_cache_enabled": False,
+    "embedding_cache_path": "./cache/embeddings",
+    "embedding_cache_max_size_mb": 1024,  # the least recently used embeddings are evicted beyond this size
+
+    # embedding inference settings, applied both to indexing and to queries
+    "embedding_backend": "torch",  # torch, onnx or openvino (the latter two require optimum[onnxruntime] / optimum[openvino])
+    # float32, bfloat16 (torch only) or int8 (dynamically quantized for torch and onnx, pre-quantized for openvino)
+    "embedding_model_precision": "float32",
+    "indexing_embedding_batch_size": 32,
+    "query_embedding_batch_size": 32,
+    # the chunk and query embeddings are truncated to their leading embedding_dimension components and renormalized,
+    # which requires a Matryoshka model (see embedding_model_finetuning_matryoshka_dimensions), full-size if None
+    "embedding_dimension": None,
+    # the profile of the embedder used for indexing each collection is stored here, and the RAG pipeline refuses to
+    # start if its query embeddings are incompatible with it
+    "embedding_profile_path": "./embedding_profiles.json",
+    "embedding_min_probe_similarity": 0.95,  # the minimal cosine similarity of the probe embeddings of both sides
+    # when enabled, the indexing pipeline also maintains a BM25 index of the chunks, which is required by the sparse
+    # and the hybrid retrieval modes
+    "bm25_index_enabled": False,
+    "bm25_index_path": "./bm25_index",
     # this parameter is a hack to enable docling-based chunking of documents converted via docling externally
     "converted_docling_document_format": "json",
 
     # LLM-related settings
     "llm": "mistralai/Mistral-7B-Instruct-v0.2",
     "llm_base_url": "http://vllm-service:8000/v1",
-    "llm_api_key": Secret.from_token("VLLM-PLACEHOLDER-API-KEY"),  # use Secret.from_env_var("API_KEY_ENV_VAR_NAME") to enable authentication
+    "llm_api_key": None,  # a placeholder key is used if None, use Secret.from_env_var("API_KEY_ENV_VAR_NAME") to enable authentication
     "llm_connection_timeout": 30,
     "llm_connection_max_retries": 3,
     "llm_system_prompt": None,
@@ -54,15 +115,81 @@ DEFAULT_SETTINGS = {
     "llm_presence_penalty": 0.0,
     "llm_logit_bias": None,
     "llm_http_client": None,
+    "llm_async_http_client": None,  # an httpx.AsyncClient instance to be used by the asynchronous query execution
     "generator_object": None,  # an instance of a Haystack-compatible generator object
 
     "enable_response_streaming": False,
     'streaming_timeout': 30, # Default timeout is 60 seconds if not specified
+    "streaming_buffer_size": 64,  # the number of buffered chunks, the generation is paused while the buffer is full
+
+    # query engine settings
+    "max_concurrent_queries": 16,  # the maximal number of queries a single warm query engine executes simultaneously
+    "query_batch_size": 32,  # the number of queries embedded and retrieved together in batched query execution
+    # when enabled, the queries of concurrent runs arriving within query_micro_batching_window seconds (up to
+    # query_micro_batching_max_batch_size queries) are embedded in one forward pass and retrieved in one search request
+    "query_micro_batching_enabled": False,
+    "query_micro_batching_window": 0.005,
+    "query_micro_batching_max_batch_size": 32,
+
+    # REST API server settings (see bin/pragmatic --serve)
+    "server_host": "0.0.0.0",
+    "server_port": 8000,
+    "server_max_concurrent_requests": 16,  # the maximal number of query requests executed at once
+    "server_max_queued_requests": 64,  # further requests are rejected with 429 once this many are waiting for a slot
+    "server_queue_timeout": 30,  # in seconds, a queued request is rejected with 429 after waiting this long
+    "server_index_path": None,  # the directory the index endpoint may index (sub)directories of, disabled if None
+
+    # semantic response cache settings - when enabled, the LLM response of a previous query is reused for a query whose
+    # embedding is similar enough and whose retrieved context is identical; reindexing clears the cache
+    "response_cache_enabled": False,
+    "response_cache_similarity_threshold": 0.95,  # the minimal cosine similarity of the query embeddings
+    "response_cache_ttl": 3600,  # in seconds, None disables the expiration
+    "response_cache_max_entries": 1024,  # the least recently used responses are evicted beyond this number
 
     # advanced RAG options
     "top_k": 1,
+    "bm25_k1": 1.2,  # the term frequency saturation parameter of BM25
+    "bm25_b": 0.75,  # the document length normalization parameter of BM25
+    "hybrid_retrieval_weights": None,  # the [sparse, dense] weights of the reciprocal rank fusion, equal if None
     "cleaner_enabled": False,
     "ranker_enabled": False,
+    "ranker_backend": "torch",  # torch, int8 (dynamically quantized linear layers) or onnx (requires optimum[onnxruntime])
+    "ranker_candidates": None,  # the number of documents retrieved for reranking down to top_k, top_k if None
+    "ranker_max_tokens": 512,  # the token budget of a (query, document) pair - longer documents are truncated
+    "ranker_batch_size": None,  # the number of pairs per forward pass, all the pairs are scored at once if None
+    "ranker_score_cache_size": 10000,  # the number of cached (query, document) scores, 0 disables the cache
+    # context packing settings - when enabled, duplicate documents are dropped and the rest are fitted into a token
+    # budget (counted with the tokenizer of the LLM) before being placed in the prompt
+    "context_packing_enabled": False,
+    "context_max_tokens": 2048,  # the token budget of the documents placed in the prompt
+    "context_packer_tokenizer": None,  # the Hugging Face model whose tokenizer counts the tokens, the llm if None
+    "context_near_duplicate_threshold": 0.8,  # the word 3-gram Jaccard similarity of near duplicates, None disables
+    "context_min_passage_tokens": 32,  # a document is only truncated to fit the budget if this many tokens of it fit
+    # prompt layout settings - the prefix_cache layout places fixed instructions first, the documents in a deterministic
+    # order next and the question last, so that the prefix cache of the LLM server (e.g., vLLM started with
+    # --enable-prefix-caching) can reuse the computation of the common prompt prefix of repeated and overlapping queries
+    "prompt_layout": "default",  # default or prefix_cache
+    "prompt_context_order": "id",  # id or score_bucket (by score bucket, then by id), used by the prefix_cache layout
+    "prompt_score_bucket_size": 0.1,  # the width of the score ranges of the score_bucket order
+
+    # instrumentation settings - when enabled, the wall time, the CPU time, the numbers of input and output documents
+    # (and optionally the peak memory) of every pipeline component are measured in each run
+    "instrumentation_enabled": False,
+    "instrumentation_exporters": [],  # "prometheus", "otel" or objects implementing export(run_record)
+    "instrumentation_trace_memory": False,  # measures the peak Python heap usage via tracemalloc, slows down the runs
+    "instrumentation_prometheus_path": None,  # the Prometheus metrics are rewritten to this file after every run if set
+    "instrumentation_spans_path": None,  # the OpenTelemetry-style spans are appended to this JSON lines file if set
+
+    # benchmark settings (see bin/pragmatic --bench)
+    "bench_corpus_path": None,  # a directory with the documents to index, a synthetic corpus is generated if None
+    "bench_num_documents": 50,  # the size of the synthetic corpus
+    "bench_paragraphs_per_document": 20,
+    "bench_num_queries": 100,
+    "bench_warm_up_queries": 5,  # executed before the measured queries and excluded from the results
+    "bench_stub_llm_response_tokens": 20,
+    "bench_stub_llm_token_latency": 0.0,  # the simulated generation time per token, in seconds
+    "bench_seed": 0,
+    "bench_output_path": None,  # the JSON report is also written to this file if set
 
     # embedding model fine-tuning settings
     "finetune_embedding_model": False,
@@ -76,16 +203,29 @@ DEFAULT_SETTINGS = {
         "learning_rate": 2e-5,
         "lr_scheduler_type": "cosine",
         "optim": "adamw_torch_fused",
-        "batch_sampler": BatchSamplers.NO_DUPLICATES,
+        "batch_sampler": "no_duplicates",  # a value of sentence_transformers.training_args.BatchSamplers
         "save_strategy": "epoch",
         "save_total_limit": 2,
         "logging_steps": 100,
     },
+    # when set (e.g., to [384, 256, 128, 64]), the model is trained with a Matryoshka loss, i.e., its embeddings
+    # truncated to each of these dimensions are trained as well, so that embedding_dimension can be reduced
+    "embedding_model_finetuning_matryoshka_dimensions": None,
+    # with the Matryoshka dimensions set, this fraction of the dataset is held out of the training to measure the recall
+    # of each of the dimensions of the fine-tuned model, which is stored as dimension_report.json next to it, 0 disables
+    # the report (the other fine-tuning runs always train on the whole dataset)
+    "embedding_model_finetuning_held_out_fraction": 0.01,
 
 
     # evaluation metrics
     "eval_documents_path": "./docs",
     "eval_questions_answers_path": "./qa.txt",
+    "eval_max_concurrent_questions": 4,  # the number of evaluation questions answered concurrently
+    # the answers are checkpointed here, so that an interrupted evaluation with the same settings and documents resumes
+    # from the unanswered questions, disabled if None
+    "eval_checkpoint_path": "./cache/eval_checkpoints",
+    "eval_score_cache_path": "./cache/eval_scores.json",  # the cached metric results of the evaluated items, disabled if None
+    "eval_reuse_index": True,  # index the evaluation documents incrementally, skipping the unchanged ones
     "eval_ragas_metrics": {
         #RagasMetric.FAITHFULNESS: {
         #    "params": None,
@@ -0,0 +1,50 @@
+from pragmatic.haystack.bm25_index import BM25Index, tokenize
+
+RECORDS = [
+    {"id": "install", "content": "Install the oc CLI with dnf install openshift-clients", "meta": {"page": 1}},
+    {"id": "namespaces", "content": "List the pods with oc get pods --all-namespaces", "meta": {"page": 2}},
+    {"id": "version", "content": "MicroShift 4.12.1 ships with the oc binary", "meta": {"page": 3}},
+    {"id": "unrelated", "content": "The weather is nice today", "meta": {}},
+]
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts():
+    assert tokenize("oc get --all-namespaces v4.12.1") == ["oc", "get", "all-namespaces", "all", "namespaces",
+                                                           "v4.12.1", "v4", "12", "1"]
+
+
+def test_search_ranks_by_bm25(tmp_path):
+    index = BM25Index(str(tmp_path))
+    assert not index.exists()
+    assert index.search(["oc"], top_k=3) == [[]]
+
+    index.save(RECORDS)
+    results = index.search(["all-namespaces", "install", "kubernetes"], top_k=3)
+
+    assert [doc.id for doc in results[0]] == ["namespaces"]
+    assert results[1][0].id == "install"
+    assert results[1][0].meta == {"page": 1}
+    assert results[2] == []
+    scores = [doc.score for doc in index.search(["oc install"], top_k=3)[0]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_rare_terms_weigh_more(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.save(RECORDS)
+    # "oc" occurs in three documents, "microshift" in one
+    assert index.search(["oc microshift"], top_k=1)[0][0].id == "version"
+
+
+def test_other_instances_reload_new_generations(tmp_path):
+    writer = BM25Index(str(tmp_path))
+    writer.save(RECORDS[:2])
+    reader = BM25Index(str(tmp_path))
+    assert reader.count_documents() == 2
+
+    writer.save(RECORDS)
+    assert reader.count_documents() == 4
+    assert [record["id"] for record in reader.get_documents()] == [record["id"] for record in RECORDS]
+    # the files of the previous generation are removed
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["documents.2.jsonl", "index.json",
+                                                                 "postings.2.npz", "vocabulary.2.json"]
@@ -0,0 +1,29 @@
+from pragmatic.optimizations.chunk_cache import ChunkCache, compute_chunk_cache_key
+
+
+def test_key_depends_on_content_and_parameters():
+    key = compute_chunk_cache_key("content", tokenizer="model", max_tokens=512)
+    assert key == compute_chunk_cache_key("content", max_tokens=512, tokenizer="model")
+    assert key != compute_chunk_cache_key("other content", tokenizer="model", max_tokens=512)
+    assert key != compute_chunk_cache_key("content", tokenizer="model", max_tokens=256)
+
+
+def test_store_and_load(tmp_path):
+    cache = ChunkCache(str(tmp_path))
+    key = compute_chunk_cache_key("content")
+    assert cache.load(key) is None
+
+    chunks = [{"content": "first", "meta": {"page": 1}}, {"content": "second", "meta": {"page": 2}}]
+    cache.store(key, chunks)
+    assert cache.load(key) == chunks
+    assert ChunkCache(str(tmp_path)).load(key) == chunks
+    assert cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+    cache = ChunkCache(str(tmp_path))
+    key = compute_chunk_cache_key("content")
+    cache.store(key, [])
+    with open(tmp_path / key[:2] / f"{key}.json", "w") as cache_file:
+        cache_file.write("{not json")
+    assert cache.load(key) is None
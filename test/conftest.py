@@ -0,0 +1,5 @@
+import os
+import sys
+
+# addressing the issue where the project structure causes pragmatic to not be on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
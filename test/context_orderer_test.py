@@ -0,0 +1,20 @@
+import logging
+
+from haystack import Document
+
+from pragmatic.haystack.context_orderer import ContextOrderer
+
+
+def test_score_buckets_keep_the_most_relevant_documents_first():
+    documents = [Document(id="c", content="c", score=0.51), Document(id="a", content="a", score=0.55),
+                 Document(id="b", content="b", score=0.91), Document(id="d", content="d")]
+    result = ContextOrderer(order="score_bucket", score_bucket_size=0.1).run(documents)
+    assert [doc.id for doc in result["documents"]] == ["b", "a", "c", "d"]
+
+
+def test_missing_scores_are_reported(caplog):
+    documents = [Document(id="b", content="b"), Document(id="a", content="a")]
+    with caplog.at_level(logging.WARNING):
+        result = ContextOrderer(order="score_bucket").run(documents)
+    assert [doc.id for doc in result["documents"]] == ["a", "b"]
+    assert "None of the documents has a score" in caplog.text
@@ -0,0 +1,44 @@
+from haystack import Document
+
+from pragmatic.haystack.context_packer import ContextPacker
+
+
+def create_packer(tmp_path, **kwargs):
+    # the tokenizer cannot be loaded, so the tokens are approximated as four characters each
+    return ContextPacker(tokenizer=str(tmp_path / "missing-tokenizer"), **kwargs)
+
+
+def test_duplicates_are_removed(tmp_path):
+    packer = create_packer(tmp_path, max_tokens=1000, near_duplicate_threshold=0.8)
+    documents = [
+        Document(content="The oc CLI lists the pods of all the namespaces", score=0.9),
+        Document(content="the  OC cli lists the pods of all the namespaces", score=0.8),
+        Document(content="The oc CLI lists the pods of all the namespaces.", score=0.7),
+        Document(content="MicroShift is a lightweight Kubernetes distribution", score=0.6),
+    ]
+    result = packer.run(documents)
+
+    assert [doc.content for doc in result["documents"]] == [documents[0].content, documents[3].content]
+    assert result["report"]["duplicates_removed"] == 2
+
+
+def test_budget_truncates_and_drops(tmp_path):
+    packer = create_packer(tmp_path, max_tokens=30, near_duplicate_threshold=None, min_passage_tokens=8)
+    documents = [
+        Document(content="a" * 80, score=0.5),   # 20 tokens
+        Document(content="b" * 80, score=0.9),   # 20 tokens
+        Document(content="c" * 200, score=0.1),  # 50 tokens
+    ]
+    result = packer.run(documents)
+
+    # the highest scored document is packed first, the second one is truncated to the remaining 10 tokens and the
+    # last one no longer fits at all, while the packed documents keep their input order
+    assert [doc.content for doc in result["documents"]] == ["a" * 40, "b" * 80]
+    assert result["documents"][0].meta["truncated"]
+    assert result["documents"][0].id == documents[0].id
+    assert result["report"]["documents_truncated"] == 1
+    assert result["report"]["documents_dropped"] == 1
+    assert result["report"]["tokens_out"] == 30
+
+    # a budget below min_passage_tokens for the remainder skips the document instead of truncating it
+    assert [doc.content for doc in packer.run(documents, max_tokens=25)["documents"]] == ["b" * 80]
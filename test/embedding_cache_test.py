@@ -0,0 +1,57 @@
+import numpy as np
+
+from pragmatic.optimizations.embedding_cache import EmbeddingCache, compute_text_key
+
+DIMENSION = 4
+
+
+def make_embedding(index):
+    return [float(index), float(index + 1), float(index + 2), float(index + 3)]
+
+
+def test_all_keys_survive_reopen(tmp_path):
+    # about one sha256 digest in 256 ends with a zero byte, which a fixed-size bytes dtype would strip
+    texts = [f"text {i}" for i in range(2000)]
+    assert any(compute_text_key(text).endswith(b"\x00") for text in texts)
+
+    cache = EmbeddingCache(str(tmp_path), max_size_mb=1)
+    cache.put_many(texts, [make_embedding(i) for i in range(len(texts))])
+    del cache
+
+    reopened = EmbeddingCache(str(tmp_path), max_size_mb=1)
+    assert reopened.get_many(texts) == [make_embedding(i) for i in range(len(texts))]
+
+
+def test_eviction_after_reopen(tmp_path):
+    max_size_mb = 100 * (DIMENSION * 4 + 32 + 8) / (1 << 20)  # room for 100 entries
+    texts = [f"text {i}" for i in range(100)]
+    cache = EmbeddingCache(str(tmp_path), max_size_mb)
+    cache.put_many(texts, [make_embedding(i) for i in range(len(texts))])
+    del cache
+
+    reopened = EmbeddingCache(str(tmp_path), max_size_mb)
+    reopened.get_many(texts[50:])
+    new_texts = [f"new text {i}" for i in range(20)]
+    reopened.put_many(new_texts, [make_embedding(i) for i in range(len(new_texts))])
+
+    assert all(embedding is not None for embedding in reopened.get_many(new_texts))
+    assert all(embedding is not None for embedding in reopened.get_many(texts[50:]))
+    assert reopened.get_many(texts[:10]) == [None] * 10
+
+
+def test_normalized_texts_share_entry(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_size_mb=1)
+    cache.put_many(["hello   world"], [make_embedding(1)])
+    assert cache.get_many(["hello world", "hello\nworld", "other"]) == [make_embedding(1), make_embedding(1), None]
+
+
+def test_second_process_is_locked_out(tmp_path):
+    owner = EmbeddingCache(str(tmp_path), max_size_mb=1)
+    owner.put_many(["text"], [make_embedding(1)])
+
+    # a separate open file description behaves as another process with respect to flock
+    other = EmbeddingCache(str(tmp_path), max_size_mb=1)
+    assert other.get_many(["text"]) == [None]
+    other.put_many(["another text"], [make_embedding(2)])
+    assert owner.get_many(["another text"]) == [None]
+    assert np.allclose(owner.get_many(["text"])[0], make_embedding(1))
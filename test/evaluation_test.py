@@ -0,0 +1,28 @@
+import json
+
+from pragmatic.pipelines.evaluation_cache import EvaluationScoreCache, load_checkpoint
+
+
+def test_score_cache_persists(tmp_path):
+    path = str(tmp_path / "scores" / "cache.json")
+    cache = EvaluationScoreCache(path)
+    assert cache.get("key") is None
+
+    cache.update({"key": 0.5})
+    assert cache.get("key") == 0.5
+    assert EvaluationScoreCache(path).get("key") == 0.5
+    assert EvaluationScoreCache(None).get("key") is None
+
+
+def test_interrupted_checkpoint_is_resumed(tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.jsonl"
+    entries = [{"question": f"question {i}", "context": [f"context {i}"], "response": f"response {i}"}
+               for i in range(2)]
+    # the second line was interrupted while being written
+    checkpoint_path.write_text(json.dumps(entries[0]) + "\n" + json.dumps(entries[1])[:20])
+
+    answers = load_checkpoint(str(checkpoint_path))
+
+    assert answers == {"question 0": (["context 0"], "response 0")}
+    assert checkpoint_path.read_text() == json.dumps(entries[0]) + "\n"
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
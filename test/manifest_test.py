@@ -0,0 +1,30 @@
+from pragmatic.pipelines.manifest import IndexingManifest, compute_file_hash
+from pragmatic.pipelines.utils import produce_custom_settings
+
+
+def test_manifest_roundtrip_and_invalidation(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    settings = produce_custom_settings()
+    manifest = IndexingManifest(manifest_path, settings)
+    assert not manifest.is_valid()
+
+    manifest.update_file("/docs/a.txt", "hash", ["chunk 1", "chunk 2"])
+    manifest.save()
+
+    reloaded = IndexingManifest(manifest_path, settings)
+    assert reloaded.is_valid()
+    assert reloaded.get_file_hash("/docs/a.txt") == "hash"
+    assert reloaded.get_chunk_ids("/docs/a.txt") == ["chunk 1", "chunk 2"]
+    assert reloaded.get_chunk_ids("/docs/b.txt") == []
+
+    changed = IndexingManifest(manifest_path, produce_custom_settings({"split_length": settings["split_length"] + 1}))
+    assert not changed.is_valid()
+    assert changed.get_indexed_files() == []
+
+
+def test_file_hash(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("content")
+    first_hash = compute_file_hash(str(path))
+    path.write_text("content!")
+    assert compute_file_hash(str(path)) != first_hash
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import pytest
+
+from pragmatic.optimizations.micro_batching import MicroBatcher
+
+
+def test_concurrent_items_are_batched():
+    batch_sizes = []
+    lock = Lock()
+
+    def process_batch(items):
+        with lock:
+            batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process_batch, max_batch_size=8, window=0.05)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(batcher.submit, range(32)))
+
+    assert results == [item * 2 for item in range(32)]
+    assert sum(batch_sizes) == 32
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 32
+    stats = batcher.get_stats()
+    assert stats["items"] == 32
+    assert stats["batches"] == len(batch_sizes)
+
+
+def test_batch_failure_is_raised_in_submitting_threads():
+    def process_batch(items):
+        if any(item < 0 for item in items):
+            raise ValueError("negative item")
+        return items
+
+    batcher = MicroBatcher(process_batch, window=0.0)
+    with pytest.raises(ValueError, match="negative item"):
+        batcher.submit(-1)
+    # the dispatching thread survives the failure
+    assert batcher.submit(1) == 1
+
+
+def test_wrong_number_of_results_fails_the_batch():
+    batcher = MicroBatcher(lambda items: [], window=0.0)
+    with pytest.raises(ValueError, match="Expected 1 results"):
+        batcher.submit("item")
@@ -0,0 +1,30 @@
+import pytest
+from haystack import Document
+
+pytest.importorskip("milvus_haystack")
+
+from pragmatic.haystack.context_packer import ContextPacker
+from pragmatic.haystack.milvus_retriever import MilvusSearchRetriever
+
+
+def test_rescored_l2_results_keep_the_nearest_passages_under_a_budget(tmp_path):
+    query_embedding = [0.0, 0.0]
+    documents = [Document(id="far", content="f" * 80, embedding=[3.0, 0.0]),
+                 Document(id="near", content="n" * 80, embedding=[0.1, 0.0]),
+                 Document(id="middle", content="m" * 80, embedding=[1.0, 0.0])]
+
+    rescored = MilvusSearchRetriever._rescore(query_embedding, documents, top_k=3, metric_type="L2")
+    assert [doc.id for doc in rescored] == ["near", "middle", "far"]
+    assert rescored[0].score > rescored[1].score > rescored[2].score
+
+    # the tokenizer cannot be loaded, so the tokens are approximated as four characters each: room for one passage
+    packer = ContextPacker(tokenizer=str(tmp_path / "missing-tokenizer"), max_tokens=20,
+                           near_duplicate_threshold=None)
+    assert [doc.id for doc in packer.run(rescored)["documents"]] == ["near"]
+
+
+def test_milvus_distances_become_scores():
+    assert MilvusSearchRetriever._produce_score(2.5, "L2") == -2.5
+    assert MilvusSearchRetriever._produce_score(2.5, None) == -2.5
+    assert MilvusSearchRetriever._produce_score(0.8, "IP") == 0.8
+    assert MilvusSearchRetriever._produce_score(0.8, "cosine") == 0.8
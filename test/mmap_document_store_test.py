@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from haystack import Document
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.types import DuplicatePolicy
+
+from pragmatic.haystack.mmap_document_store import MemoryMappedDocumentStore
+
+
+def make_documents(count, dimension=8, seed=0, prefix="doc"):
+    embeddings = np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+    return [Document(id=f"{prefix} {i}", content=f"content {i}", meta={"index": i, "even": i % 2 == 0},
+                     embedding=embedding.tolist()) for i, embedding in enumerate(embeddings)]
+
+
+def test_write_and_retrieve(tmp_path):
+    store = MemoryMappedDocumentStore(str(tmp_path))
+    documents = make_documents(20)
+    assert store.write_documents(documents) == 20
+    assert store.count_documents() == 20
+
+    results = store.embedding_retrieval([doc.embedding for doc in documents[:3]], top_k=2)
+    assert [result[0].id for result in results] == ["doc 0", "doc 1", "doc 2"]
+    assert results[0][0].score == pytest.approx(1.0, abs=1e-5)
+    assert results[0][0].meta == {"index": 0, "even": True}
+
+    filtered = store.embedding_retrieval([documents[1].embedding], top_k=5,
+                                         filters={"field": "meta.even", "operator": "==", "value": True})[0]
+    assert len(filtered) == 5
+    assert all(doc.meta["even"] for doc in filtered)
+
+
+def test_reopen_grow_and_delete(tmp_path):
+    store = MemoryMappedDocumentStore(str(tmp_path))
+    store.write_documents(make_documents(10))
+    # exceeds the preallocated rows, so the matrix is rewritten
+    store.write_documents(make_documents(1500, seed=1, prefix="more"))
+    store.delete_documents(["doc 3", "more 7"])
+
+    reopened = MemoryMappedDocumentStore(str(tmp_path))
+    assert reopened.count_documents() == 1508
+    ids = {doc.id for doc in reopened.filter_documents()}
+    assert "doc 3" not in ids and "more 7" not in ids and "doc 4" in ids
+
+    document = make_documents(10)[4]
+    assert reopened.embedding_retrieval([document.embedding], top_k=1)[0][0].id == "doc 4"
+
+
+def test_other_instances_see_writes(tmp_path):
+    writer = MemoryMappedDocumentStore(str(tmp_path))
+    reader = MemoryMappedDocumentStore(str(tmp_path))
+    writer.write_documents(make_documents(5))
+    assert reader.count_documents() == 5
+
+
+def test_duplicate_policies(tmp_path):
+    store = MemoryMappedDocumentStore(str(tmp_path))
+    documents = make_documents(3)
+    store.write_documents(documents)
+
+    with pytest.raises(DuplicateDocumentError):
+        store.write_documents(documents[:1], policy=DuplicatePolicy.FAIL)
+    assert store.write_documents(documents[:1], policy=DuplicatePolicy.SKIP) == 0
+
+    replacement = Document(id="doc 0", content="replaced", embedding=documents[0].embedding)
+    assert store.write_documents([replacement]) == 1
+    assert store.count_documents() == 3
+    assert {doc.id: doc.content for doc in store.filter_documents()}["doc 0"] == "replaced"
+
+
+def test_mismatching_settings_are_rejected(tmp_path):
+    MemoryMappedDocumentStore(str(tmp_path)).write_documents(make_documents(2))
+    with pytest.raises(ValueError):
+        MemoryMappedDocumentStore(str(tmp_path), dtype="float16")
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_is_rescored(tmp_path, quantization):
+    store = MemoryMappedDocumentStore(str(tmp_path), quantization=quantization)
+    documents = make_documents(200, dimension=32)
+    store.write_documents(documents)
+
+    results = store.embedding_retrieval([doc.embedding for doc in documents[:10]], top_k=1, rescore_oversampling=20)
+    assert [result[0].id for result in results] == [doc.id for doc in documents[:10]]
+    assert results[0][0].score == pytest.approx(1.0, abs=1e-5)
+
+    report = store.produce_quantization_report(top_k=5, num_queries=10)
+    assert report["precision"] == quantization
+    assert report["memory_saved_bytes"] > 0
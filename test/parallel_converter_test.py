@@ -0,0 +1,29 @@
+from haystack import Document
+
+from pragmatic.haystack.indexed_chunk_filter import IndexedChunkFilter
+from pragmatic.haystack.parallel_converter import ParallelFileConverter
+
+
+def test_chunk_filter_groups_chunks_by_file():
+    documents = [Document(content="first", meta={"file_path": "/docs/a.txt"}),
+                 Document(content="second", meta={"file_path": "/docs/a.txt"}),
+                 Document(content="third", meta={"file_path": "/docs/b.txt"})]
+    result = IndexedChunkFilter().run(documents, indexed_chunk_ids=[documents[1].id])
+
+    assert [doc.id for doc in result["documents"]] == [documents[0].id, documents[2].id]
+    assert result["file_chunk_ids"] == {"/docs/a.txt": [documents[0].id, documents[1].id],
+                                        "/docs/b.txt": [documents[2].id]}
+
+
+def _convert(source):
+    if source.endswith("bad.txt"):
+        raise ValueError("unreadable")
+    return [Document(content=source, meta={"file_path": source})]
+
+
+def test_single_worker_converts_in_process():
+    converter = ParallelFileConverter(convert_function=_convert, num_workers=1)
+    result = converter.run(sources=["a.txt", "bad.txt", "b.txt"])
+
+    assert [doc.content for doc in result["documents"]] == ["a.txt", "b.txt"]
+    assert result["failures"] == {"bad.txt": "ValueError: unreadable"}
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from pragmatic.optimizations.quantization import compute_exact_scores, compute_quantization_ranges, \
+    compute_quantized_scores, estimate_quantization_memory, get_quantized_dimension, measure_quantization_recall, \
+    quantize_embeddings, rescore_top_rows, select_top_rows
+
+
+def make_embeddings(count=500, dimension=64, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def test_quantized_dimension():
+    assert get_quantized_dimension(384, "int8") == 384
+    assert get_quantized_dimension(384, "binary") == 48
+    assert get_quantized_dimension(385, "binary") == 49
+    with pytest.raises(ValueError):
+        get_quantized_dimension(384, "int4")
+
+
+def test_int8_scores_approximate_exact_scores():
+    embeddings = make_embeddings()
+    queries = embeddings[:5]
+    ranges = compute_quantization_ranges(embeddings, "int8")
+    quantized = quantize_embeddings(embeddings, "int8", ranges)
+
+    assert quantized.dtype == np.int8
+    approximate_scores = compute_quantized_scores(quantized, queries, "int8", ranges)
+    assert np.abs(approximate_scores - compute_exact_scores(embeddings, queries)).max() < 0.05
+
+
+def test_binary_scores_are_sign_agreements():
+    embeddings = np.array([[1.0, -1.0, 1.0, -1.0], [-1.0, -1.0, -1.0, -1.0]], dtype=np.float32)
+    quantized = quantize_embeddings(embeddings, "binary")
+    assert quantized.shape == (2, 1)
+    scores = compute_quantized_scores(quantized, np.array([[0.5, -0.5, 0.5, -0.5]]), "binary")
+    # the padding bits of both sides agree, so a perfect match scores all 8 bits
+    assert scores[:, 0].tolist() == [8.0, 4.0]
+
+
+def test_select_and_rescore_top_rows():
+    scores = np.array([0.1, 0.9, -np.inf, 0.5, 0.7], dtype=np.float32)
+    assert select_top_rows(scores, 3).tolist() == [1, 4, 3]
+    assert select_top_rows(scores, 0).tolist() == []
+
+    embeddings = np.eye(5, dtype=np.float32)
+    query = np.array([0.0, 0.0, 0.0, 1.0, 0.0], dtype=np.float32)
+    rows, exact_scores = rescore_top_rows(embeddings, scores, query, top_k=1, rescore_oversampling=3)
+    assert rows.tolist() == [3]
+    assert exact_scores.tolist() == [1.0]
+    # the excluded rows are never returned
+    rows, _ = rescore_top_rows(embeddings, scores, query, top_k=10, rescore_oversampling=None)
+    assert sorted(rows.tolist()) == [0, 1, 3, 4]
+
+
+@pytest.mark.parametrize("precision, min_recall", [("int8", 0.95), ("binary", 0.5)])
+def test_rescoring_recovers_the_recall(precision, min_recall):
+    report = measure_quantization_recall(make_embeddings(), precision, top_k=10, rescore_oversampling=8,
+                                         num_queries=20)
+    assert report["rescored_recall@10"] >= report["coarse_recall@10"]
+    assert report["rescored_recall@10"] > min_recall
+    assert report["recall@10_delta"] == pytest.approx(report["rescored_recall@10"] - 1.0)
+
+
+def test_memory_estimate():
+    estimate = estimate_quantization_memory(1000, 384, "binary")
+    assert estimate["full_precision_bytes"] == 1000 * 384 * 4
+    assert estimate["quantized_bytes"] == 1000 * 48
+    assert estimate["memory_saved_fraction"] == pytest.approx(1 - 1 / 32)
@@ -0,0 +1,34 @@
+from pragmatic.optimizations.response_cache import SemanticResponseCache, compute_context_key
+
+
+def test_context_key_depends_on_run_overrides():
+    document_ids = ["a", "b"]
+    assert compute_context_key(document_ids) == compute_context_key(document_ids, run_overrides={})
+    assert compute_context_key(document_ids, run_overrides={"context_max_tokens": 512}) != \
+        compute_context_key(document_ids, run_overrides={"context_max_tokens": 1024})
+    assert compute_context_key(document_ids, run_overrides={"temperature": 0.0}) != compute_context_key(document_ids)
+    assert compute_context_key(document_ids, query="what  is RAG") == compute_context_key(document_ids,
+                                                                                            query="what is RAG")
+
+
+def test_lookup_by_similarity():
+    cache = SemanticResponseCache(similarity_threshold=0.9, ttl=None, max_entries=10)
+    context_key = compute_context_key(["a"])
+    cache.store(context_key, [1.0, 0.0], "answer")
+
+    assert cache.lookup(context_key, [0.99, 0.05]) == "answer"
+    assert cache.lookup(context_key, [0.0, 1.0]) is None
+    assert cache.lookup(compute_context_key(["b"]), [1.0, 0.0]) is None
+    assert cache.get_stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_expiration_and_eviction():
+    cache = SemanticResponseCache(similarity_threshold=0.9, ttl=0, max_entries=10)
+    cache.store("context", [1.0, 0.0], "answer")
+    assert cache.lookup("context", [1.0, 0.0]) is None
+
+    cache = SemanticResponseCache(similarity_threshold=0.9, ttl=None, max_entries=2)
+    for i in range(3):
+        cache.store(f"context {i}", None, f"answer {i}")
+    assert cache.lookup("context 0") is None
+    assert cache.lookup("context 2") == "answer 2"
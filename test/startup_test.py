@@ -0,0 +1,91 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# addressing the issue where the project structure causes pragmatic to not be on the path
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+# the heavy dependencies that must only be imported by the features requiring them
+HEAVY_MODULES = ["haystack", "sentence_transformers", "transformers", "torch", "docling", "docling_core",
+                 "docling_haystack", "datasets", "milvus_haystack", "pymilvus", "ragas", "haystack_integrations"]
+
+# the modules only required by the optional features
+FEATURE_MODULES = ["docling", "docling_core", "docling_haystack", "milvus_haystack", "pymilvus", "ragas",
+                   "pragmatic.optimizations.finetuning", "pragmatic.haystack.docling_splitter",
+                   "pragmatic.haystack.milvus_retriever"]
+
+# (the statements to execute, the heavy modules they must not import, the import time budget in seconds)
+STARTUP_CHECKS = [
+    # what bin/pragmatic imports before parsing its arguments
+    ("import pragmatic; from pragmatic.settings import DEFAULT_SETTINGS", HEAVY_MODULES, 0.5),
+    # neither a query nor the indexing without docling need docling, the fine-tuning code or the Milvus client (when
+    # another vector DB is used) - Haystack itself already imports sentence_transformers, torch and datasets though
+    ("import pragmatic.pipelines.engine", FEATURE_MODULES, None),
+    ("import pragmatic.pipelines.indexing", FEATURE_MODULES, None),
+]
+NUM_REPORTED_MODULES = 5
+
+
+def measure_imports(statements):
+    """
+    Executes the given statements in a fresh interpreter with -X importtime. Returns the cumulative import time of
+    every imported module (in seconds) and the total import time of the top-level modules.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statements], capture_output=True, text=True,
+                            cwd=REPO_ROOT, env={**os.environ, "HAYSTACK_TELEMETRY_ENABLED": "False"})
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to execute '{statements}': {result.stderr[-2000:]}")
+
+    module_times = {}
+    total_time = 0.0
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match is None:
+            continue
+        cumulative_time = int(match.group(1)) / 1e6
+        module_times[match.group(3)] = cumulative_time
+        if len(match.group(2)) == 1:
+            # the modules imported directly by the statements
+            total_time += cumulative_time
+    return module_times, total_time
+
+
+def _check_startup(statements, forbidden_modules, time_budget):
+    module_times, total_time = measure_imports(statements)
+    slowest_modules = sorted(module_times.items(), key=lambda item: item[1], reverse=True)[:NUM_REPORTED_MODULES]
+    print(f"{statements}: {total_time:.3f}s, {len(module_times)} modules, slowest: "
+          + ", ".join(f"{module_name} ({module_time:.3f}s)" for module_name, module_time in slowest_modules))
+
+    failures = []
+    loaded_modules = [forbidden_module for forbidden_module in forbidden_modules
+                      if any(module_name == forbidden_module or module_name.startswith(f"{forbidden_module}.")
+                             for module_name in module_times)]
+    if loaded_modules:
+        failures.append(f"'{statements}' imported {', '.join(loaded_modules)}")
+    if time_budget is not None and total_time > time_budget:
+        failures.append(f"'{statements}' took {total_time:.3f}s, exceeding the budget of {time_budget}s")
+    return failures
+
+
+@pytest.mark.parametrize("statements, forbidden_modules, time_budget", STARTUP_CHECKS,
+                         ids=["cli", "engine", "indexing"])
+def test_startup(statements, forbidden_modules, time_budget):
+    assert _check_startup(statements, forbidden_modules, time_budget) == []
+
+
+def main():
+    failures = []
+    for statements, forbidden_modules, time_budget in STARTUP_CHECKS:
+        failures.extend(_check_startup(statements, forbidden_modules, time_budget))
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
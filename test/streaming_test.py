@@ -0,0 +1,61 @@
+import gc
+
+from haystack.core.errors import PipelineRuntimeError
+from haystack.dataclasses import StreamingChunk
+
+from pragmatic.pipelines.streaming import RagStreamHandler, StreamCancelledError, _is_stream_cancellation
+
+
+def test_cancellation_wrapped_by_pipeline_is_detected():
+    try:
+        try:
+            raise StreamCancelledError()
+        except StreamCancelledError as e:
+            raise PipelineRuntimeError("llm", type(object), "failed") from e
+    except PipelineRuntimeError as e:
+        assert _is_stream_cancellation(e)
+
+
+def test_other_errors_are_not_cancellations():
+    assert not _is_stream_cancellation(ValueError("boom"))
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError as e:
+            raise PipelineRuntimeError("llm", type(object), "failed") from e
+    except PipelineRuntimeError as e:
+        assert not _is_stream_cancellation(e)
+
+
+def _start_endless_stream(buffer_size=4):
+    stream_handler = RagStreamHandler({"streaming_buffer_size": buffer_size, "streaming_timeout": 5})
+
+    def produce_chunks():
+        while True:
+            stream_handler._streaming_callback(StreamingChunk(content="token"))
+
+    stream_handler.start_stream(produce_chunks)
+    return stream_handler
+
+
+def _wait_for_thread_exit(stream_handler):
+    stream_handler._stream_thread.join(timeout=5 * RagStreamHandler.CANCELLATION_CHECK_INTERVAL + 1)
+    return not stream_handler._stream_thread.is_alive()
+
+
+def test_abandoned_unstarted_response_stops_the_producer():
+    stream_handler = _start_endless_stream()
+    response = stream_handler.stream_chunks()
+    del response
+    gc.collect()
+
+    assert _wait_for_thread_exit(stream_handler)
+    assert stream_handler.get_metrics()["cancelled"]
+
+
+def test_closed_response_stops_the_producer():
+    stream_handler = _start_endless_stream()
+    with stream_handler.stream_chunks() as response:
+        assert next(response) == "token"
+
+    assert _wait_for_thread_exit(stream_handler)